@@ -0,0 +1,293 @@
+"""
+Метрики запросов без DEBUG: middleware + connection.execute_wrapper
+
+Для каждого view (MovieViewSet.list, ActorModelViewSet.example, ...)
+в гистограммы процесса пишутся: кол-во SQL-запросов, время SQL, время
+сериализации (работа view без SQL + рендер ответа), размер ответа и общее
+время. Отдаются в текстовом формате Prometheus (urlpatterns, рядом с
+доками yasg). Гистограммы у каждого процесса свои - Prometheus собирает
+их с каждого воркера. Медленные запросы пишутся в лог с SQL и стеком.
+
+SQL учитывается обёрткой всех соединений (record_query) через метрики
+текущего контекста: под ASGI запросы асинхронных views идут из потоков
+sync_to_async со своими соединениями, контекст копируется в поток
+
+METRICS_* - см. settings_extra
+"""
+import logging
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.urls import path
+
+from .middleware import HybridMiddleware
+
+slow_query_logger = logging.getLogger('django_movie_rest.slow_query')
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Гистограмма Prometheus с меткой view (потокобезопасная)"""
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.values = {}  # view -> [счётчики корзин..., +Inf, сумма]
+        self.lock = threading.Lock()
+
+    def observe(self, view, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(view)
+            if counts is None:
+                counts = self.values[view] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def expose(self):
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self.lock:
+            values = {view: list(counts) for view, counts in self.values.items()}
+        for view, counts in sorted(values.items()):
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                total += count
+                lines.append(
+                    f'{self.name}_bucket{{view="{label}",le="{bound}"}} {total}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {counts[-1]}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {total}')
+        return '\n'.join(lines)
+
+
+REQUEST_SECONDS = Histogram(
+    'django_view_request_seconds', 'Полное время обработки запроса',
+    DURATION_BUCKETS)
+QUERIES = Histogram(
+    'django_view_queries', 'Кол-во SQL-запросов на запрос', QUERY_BUCKETS)
+SQL_SECONDS = Histogram(
+    'django_view_sql_seconds', 'Суммарное время SQL на запрос',
+    DURATION_BUCKETS)
+SERIALIZE_SECONDS = Histogram(
+    'django_view_serialize_seconds',
+    'Время view без SQL и рендер ответа (сериализация)', DURATION_BUCKETS)
+RESPONSE_BYTES = Histogram(
+    'django_view_response_bytes', 'Размер тела ответа', SIZE_BUCKETS)
+
+HISTOGRAMS = (
+    REQUEST_SECONDS, QUERIES, SQL_SECONDS, SERIALIZE_SECONDS, RESPONSE_BYTES)
+
+
+def get_view_name(request):
+    """
+    Имя view по resolver_match: Класс.действие для ViewSet
+    (по методу запроса), Класс для APIView/CBV, имя функции иначе
+    """
+    match = request.resolver_match
+    if match is None:
+        return None
+    func = match.func
+    cls = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    if cls is None:
+        return match.view_name or getattr(func, '__name__', repr(func))
+    actions = getattr(func, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower())
+        if action:
+            return f'{cls.__name__}.{action}'
+    return cls.__name__
+
+
+def get_query_stack():
+    """
+    Стек вызова SQL: кадры кода проекта (без site-packages и этого модуля),
+    не более METRICS_SLOW_QUERY_STACK_LIMIT последних
+    """
+    root = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(root) and frame.filename != __file__
+        and 'site-packages' not in frame.filename
+    ]
+    limit = settings.METRICS_SLOW_QUERY_STACK_LIMIT
+    return ''.join(traceback.format_list(frames[-limit:]))
+
+
+# Метрики запроса, который обрабатывается в текущем контексте
+_request_metrics = ContextVar('request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper соединений: SQL - в метрики текущего запроса"""
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_wrapper(connection, **kwargs):
+    """Добавить соединению record_query (и при connection_created)"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetrics:
+    """
+    Счётчики одного запроса. SQL может выполняться параллельно в
+    нескольких потоках (asyncio.gather в movies.views_async)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.view_start = None
+        self.view_sql_seconds = 0.0
+        self.view_seconds = None
+        self.render_start = None
+        self.render_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                self.queries += 1
+                self.sql_seconds += duration
+            threshold = settings.METRICS_SLOW_QUERY_SECONDS
+            if threshold is not None and duration >= threshold:
+                slow_query_logger.warning(
+                    'Медленный SQL-запрос (%.3f c, %s): %s\nparams: %r\n%s',
+                    duration, context['connection'].alias, sql, params,
+                    get_query_stack())
+
+    def get_serialize_seconds(self):
+        if self.view_seconds is None:
+            return None
+        view_python = self.view_seconds - self.view_sql_seconds
+        return max(view_python, 0.0) + self.render_seconds
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Замер запроса. Ставится первым в MIDDLEWARE, чтобы учитывать
+    остальные middleware (сессии, аутентификацию и их SQL).
+    Работает и в асинхронной цепочке (ASGI) без перехода в общий поток
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        connection_created.connect(
+            install_query_wrapper, dispatch_uid='django_movie_rest.metrics')
+        if self.is_async:
+            # Хуки без ввода-вывода: синхронные Django выполнил бы
+            # через sync_to_async в общем потоке
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def call(self, request):
+        # Соединения потока, открытые до подключения сигнала
+        for connection in connections.all():
+            install_query_wrapper(connection)
+        metrics = request._metrics = RequestMetrics()
+        token = _request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        self.finish(request, metrics, response, time.perf_counter() - start)
+        return response
+
+    async def acall(self, request):
+        metrics = request._metrics = RequestMetrics()
+        token = _request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        self.finish(request, metrics, response, time.perf_counter() - start)
+        return response
+
+    def finish(self, request, metrics, response, duration):
+        view = get_view_name(request)
+        if view is not None:
+            self.record(view, metrics, response, duration)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = request._metrics
+        metrics.view_start = time.perf_counter()
+        metrics.view_sql_seconds = -metrics.sql_seconds
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return type(self).process_view(
+            self, request, view_func, view_args, view_kwargs)
+
+    def process_template_response(self, request, response):
+        # Вызывается сразу после view, до рендера (Response DRF)
+        metrics = request._metrics
+        self.finish_view(metrics)
+        metrics.render_start = time.perf_counter()
+
+        def rendered(response):
+            metrics.render_seconds = time.perf_counter() - metrics.render_start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return type(self).process_template_response(self, request, response)
+
+    @staticmethod
+    def finish_view(metrics):
+        if metrics.view_start is not None and metrics.view_seconds is None:
+            metrics.view_seconds = time.perf_counter() - metrics.view_start
+            metrics.view_sql_seconds += metrics.sql_seconds
+
+    def record(self, view, metrics, response, duration):
+        # Ответы без рендера (HttpResponse, 304) - время view до конца
+        self.finish_view(metrics)
+        REQUEST_SECONDS.observe(view, duration)
+        QUERIES.observe(view, metrics.queries)
+        SQL_SECONDS.observe(view, metrics.sql_seconds)
+        serialize_seconds = metrics.get_serialize_seconds()
+        if serialize_seconds is not None:
+            SERIALIZE_SECONDS.observe(view, serialize_seconds)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(view, len(response.content))
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus"""
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        raise PermissionDenied
+    body = '\n'.join(histogram.expose() for histogram in HISTOGRAMS) + '\n'
+    return HttpResponse(
+        body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+urlpatterns = [
+    path('metrics/', metrics_view, name='metrics'),
+]
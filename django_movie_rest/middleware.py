@@ -0,0 +1,43 @@
+"""
+Основа middleware проекта для WSGI и ASGI
+
+Синхронный middleware в асинхронной цепочке Django оборачивает в
+sync_to_async(thread_sensitive=True): весь запрос, включая асинхронные
+views (movies.views_async), выполняется в одном общем потоке процесса.
+HybridMiddleware работает в режиме цепочки: синхронно - call(request),
+асинхронно - acall(request) без перехода в общий поток
+"""
+import asyncio
+from abc import ABC, abstractmethod
+
+try:
+    from asgiref.sync import markcoroutinefunction
+except ImportError:  # asgiref < 3.6
+    def markcoroutinefunction(func):
+        func._is_coroutine = asyncio.coroutines._is_coroutine
+        return func
+
+
+class HybridMiddleware(ABC):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Django определяет асинхронный middleware по __call__
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        return self.call(request)
+
+    @abstractmethod
+    def call(self, request):
+        """Обработка запроса в синхронной цепочке (WSGI)"""
+
+    @abstractmethod
+    async def acall(self, request):
+        """Обработка запроса в асинхронной цепочке (ASGI)"""
@@ -0,0 +1,131 @@
+"""
+Чтение из реплик: ReplicaRouter + ReplicaRoutingMiddleware
+
+Запись - всегда в default. Чтение идёт в случайную реплику из
+DATABASE_REPLICAS только внутри GET/HEAD/OPTIONS запросов к
+DATABASE_REPLICA_PATHS (API каталога); админка, аутентификация, команды
+и фоновые потоки читают из default.
+
+Чтение своих записей: после успешного изменяющего запроса клиент
+DATABASE_REPLICA_PIN_SECONDS секунд читает из default. Признак - cookie
+(браузеры) и ключ в кэше по ip клиента (клиенты API без cookie).
+
+Локально реплику заменяет копия файла SQLite: см. закомментированную
+базу replica в settings.DATABASES и команду sync_sqlite_replicas
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+from movies.service import get_client_ip
+
+from .middleware import HybridMiddleware
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Разрешено ли чтение из реплик в текущем контексте (запросе)
+_use_replicas = contextvars.ContextVar('use_replicas', default=False)
+
+
+def replicas_enabled():
+    """Идёт ли чтение в текущем контексте из реплик"""
+    return bool(settings.DATABASE_REPLICAS) and _use_replicas.get()
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    token = _use_replicas.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+def get_pin_key(request):
+    return f'replica:pin:{get_client_ip(request)}'
+
+
+class ReplicaRouter:
+    """Роутер DATABASE_ROUTERS для default и DATABASE_REPLICAS"""
+
+    def db_for_read(self, model, **hints):
+        if replicas_enabled():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default: объекты из разных баз связаны
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит вместе с данными
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """
+    Включает чтение из реплик для запроса и закрепляет клиента за
+    default после изменяющего запроса. Ставится до middleware, которые
+    обращаются к БД. В асинхронной цепочке (ASGI) обращения к кэшу -
+    в пуле потоков
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @staticmethod
+    def may_use_replicas(request):
+        return (request.method in SAFE_METHODS
+                and request.path.startswith(settings.DATABASE_REPLICA_PATHS))
+
+    @staticmethod
+    def should_pin(request, response):
+        return (request.method not in SAFE_METHODS
+                and response.status_code < 400)
+
+    def call(self, request):
+        enabled = (self.may_use_replicas(request)
+                   and not self.is_pinned(request))
+        with use_replicas(enabled):
+            response = self.get_response(request)
+        if self.should_pin(request, response):
+            self.pin(request, response)
+        return response
+
+    async def acall(self, request):
+        enabled = self.may_use_replicas(request) and not (
+            await sync_to_async(self.is_pinned, thread_sensitive=False)(
+                request))
+        with use_replicas(enabled):
+            response = await self.get_response(request)
+        if self.should_pin(request, response):
+            await sync_to_async(self.pin, thread_sensitive=False)(
+                request, response)
+        return response
+
+    @staticmethod
+    def is_pinned(request):
+        return (settings.DATABASE_REPLICA_PIN_COOKIE in request.COOKIES
+                or cache.get(get_pin_key(request)) is not None)
+
+    @staticmethod
+    def pin(request, response):
+        seconds = settings.DATABASE_REPLICA_PIN_SECONDS
+        response.set_cookie(
+            settings.DATABASE_REPLICA_PIN_COOKIE, '1', max_age=seconds,
+            httponly=True, samesite='Lax')
+        cache.set(get_pin_key(request), True, seconds)
@@ -10,10 +10,26 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
-from .settings_extra import CKEDITOR_UPLOAD_PATH, CKEDITOR_CONFIGS
+from .settings_extra import (
+    CKEDITOR_UPLOAD_PATH, CKEDITOR_CONFIGS,
+    REVIEW_TREE_MAX_DEPTH, REVIEW_TREE_MAX_NODES, ASSERT_MAX_QUERIES,
+    MOVIES_CACHE_ALIAS, MOVIES_CACHE_TIMEOUT,
+    RATING_BUFFER_ENABLED, RATING_BUFFER_MAX_SIZE, RATING_BUFFER_FLUSH_INTERVAL,
+    BULK_CREATE_MAX_ITEMS, BULK_CREATE_BATCH_SIZE,
+    METRICS_ENABLED, METRICS_ALLOWED_IPS, METRICS_SLOW_QUERY_SECONDS,
+    METRICS_SLOW_QUERY_STACK_LIMIT,
+    IMAGE_VARIANTS, IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANT_WORKERS, FAST_LIST_SERIALIZATION,
+    AUTH_CACHE_MAX_SIZE, AUTH_CACHE_TTL,
+    PURGE_BATCH_SIZE, PURGE_BATCH_PAUSE, PURGE_NONCE_MAX_AGE,
+    SQLITE_PRAGMAS, SQLITE_LOCK_RETRIES, SQLITE_LOCK_BACKOFF,
+    DATABASE_REPLICAS, DATABASE_REPLICA_PATHS, DATABASE_REPLICA_PIN_SECONDS,
+    DATABASE_REPLICA_PIN_COOKIE, DATABASE_REPLICA_CACHE_TIMEOUT,
+)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -62,6 +78,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым - замер всего запроса, включая остальные middleware
+    'django_movie_rest.metrics.MetricsMiddleware',
+    # Чтение из реплик (DATABASE_REPLICAS) - до middleware, читающих из БД
+    'django_movie_rest.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -95,11 +115,26 @@ WSGI_APPLICATION = 'django_movie_rest.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Рабочий профиль SQLite (WAL, BEGIN IMMEDIATE и PRAGMA из SQLITE_PRAGMAS) -
+# переменная окружения SQLITE_PRODUCTION=1. WAL записывается в файл базы и
+# оставляет рядом файлы -wal и -shm: для разработки и тестов - обычный sqlite3
+if os.environ.get('SQLITE_PRODUCTION') == '1':
+    SQLITE_ENGINE = 'django_movie_rest.sqlite'
+else:
+    SQLITE_ENGINE = 'django.db.backends.sqlite3'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': SQLITE_ENGINE,
         'NAME': BASE_DIR / 'db.sqlite3',
     },
+    # Реплика для чтения - добавить в DATABASE_REPLICAS. Локально -
+    # копия файла default, обновляется командой sync_sqlite_replicas
+    # 'replica': {
+    #     'ENGINE': SQLITE_ENGINE,
+    #     'NAME': BASE_DIR / 'db_replica.sqlite3',
+    #     'TEST': {'MIRROR': 'default'},
+    # },
     # 'default': {
     #     'ENGINE': 'django.db.backends.postgresql_psycopg2',
     #     'NAME': 'movie',
@@ -110,6 +145,36 @@ DATABASES = {
     # },
 }
 
+# Запись - в default, чтение API каталога - из DATABASE_REPLICAS
+DATABASE_ROUTERS = ['django_movie_rest.routers.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# locmem - свой кэш у каждого процесса; при нескольких воркерах нужен общий
+# кэш (file/Redis), иначе сброс по сигналам увидит только один процесс
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'django-movie',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # 'default': {
+    #     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    #     'LOCATION': BASE_DIR / 'cache',
+    # },
+    # 'default': {
+    #     # Django 4.0+, для 3.2 - пакет django-redis
+    #     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    #     'LOCATION': 'redis://127.0.0.1:6379',
+    # },
+}
+
+# Сессии (админка, browsable API, SessionAuthentication): чтение из кэша,
+# запись - в кэш и в БД. Истёкшие сессии удаляет команда purge_expired
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'default'
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -176,15 +241,16 @@ AUTHENTICATION_BACKENDS = (
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        # Обычная аутентификация
-        'rest_framework.authentication.BasicAuthentication',
+        # Обычная аутентификация (Basic, токены и JWT - с кэшем проверки,
+        # см. movies.authentication)
+        'movies.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
 
         # Обычные токены - записываются в БД (всегда активны)
-        'rest_framework.authentication.TokenAuthentication',
+        'movies.authentication.CachedTokenAuthentication',
 
         # Временные из библиотеки Simple JWT
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'movies.authentication.CachedJWTAuthentication',
 
         # Подключение социальной авторизации
         # 'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
@@ -218,6 +284,16 @@ DJOSER = {
     'SERIALIZERS': {},
 }
 
+# Документация API (django_movie_rest.yasg): готовые файлы схемы
+# (команда build_schema), UI загружает схему с /swagger.json
+OPENAPI_SCHEMA_DIR = BASE_DIR / 'openapi'
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
 SIMPLE_JWT = {
     # Время жизни токенов (ACCESS - доступа к ресурсу, REFRESH - обновления)
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
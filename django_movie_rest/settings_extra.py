@@ -2,9 +2,105 @@
 Файл с дополнительными настройками, для разгрузки settings
 
 CKEDITOR_CONFIGS - шаблон настроек редактора CKEditor
+REVIEW_TREE_* - ограничения дерева отзывов в MovieDetailSerializer
+ASSERT_MAX_QUERIES - проверка max_queries у API views (включать в тестах)
+MOVIES_CACHE_* - кэш ответов каталога (movies.cache)
+RATING_BUFFER_* - буферизованный приём голосов (movies.rating_buffer)
+BULK_CREATE_* - пакетное создание отзывов и голосов (review/bulk/, rating/bulk/)
+METRICS_* - метрики запросов и лог медленных SQL (django_movie_rest.metrics)
+IMAGE_VARIANT* - уменьшенные копии изображений (movies.images)
+FAST_LIST_SERIALIZATION - быстрый вывод списков (mixins.FastListMixin)
+AUTH_CACHE_* - кэш проверки учётных данных (movies.authentication)
+PURGE_* - удаление истёкших сессий и токенов (команда purge_expired)
+SQLITE_* - рабочий профиль SQLite (django_movie_rest.sqlite)
+DATABASE_REPLICA* - чтение из реплик (django_movie_rest.routers)
 """
 CKEDITOR_UPLOAD_PATH = "uploads/"  # путь для загружаемых файлов, через CKEditor
 
+# Дерево отзывов фильма: макс. глубина вложенности и макс. кол-во отзывов,
+# загружаемых для одного фильма (None - без ограничения)
+REVIEW_TREE_MAX_DEPTH = 20
+REVIEW_TREE_MAX_NODES = 2000
+
+# Превышение views.max_queries вызывает AssertionError (см. QueryBudgetMixin)
+ASSERT_MAX_QUERIES = False
+
+# Кэш ответов каталога: алиас из CACHES и время жизни ответа (секунды).
+# Сброс - по сигналам моделей, время жизни - страховка
+MOVIES_CACHE_ALIAS = 'default'
+MOVIES_CACHE_TIMEOUT = 60 * 60
+
+# Голоса рейтинга через буфер процесса: ответ 202, запись пачкой раз в
+# RATING_BUFFER_FLUSH_INTERVAL секунд. RATING_BUFFER_MAX_SIZE - макс. кол-во
+# голосов в буфере, сверх него голос записывается сразу
+RATING_BUFFER_ENABLED = False
+RATING_BUFFER_MAX_SIZE = 10000
+RATING_BUFFER_FLUSH_INTERVAL = 1.0
+
+# Пакетное создание: макс. кол-во объектов в запросе и размер пачки INSERT
+BULK_CREATE_MAX_ITEMS = 5000
+BULK_CREATE_BATCH_SIZE = 500
+
+# Метрики запросов по view (MetricsMiddleware) и адреса, которым доступен
+# /metrics/ (None - всем). Запросы дольше METRICS_SLOW_QUERY_SECONDS пишутся
+# в лог django_movie_rest.slow_query со стеком (None - не писать)
+METRICS_ENABLED = True
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+METRICS_SLOW_QUERY_SECONDS = None
+METRICS_SLOW_QUERY_STACK_LIMIT = 15
+
+# Копии изображений: имя -> макс. сторона в px, форматы и качество.
+# IMAGE_VARIANT_WORKERS - потоки фонового создания (0 - сразу при сохранении)
+IMAGE_VARIANTS = {'small': 160, 'medium': 480}
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_WORKERS = 2
+
+# Списки фильмов и актёров из строк .values() без полей DRF, JSON через
+# orjson, если установлен (вывод тот же)
+FAST_LIST_SERIALIZATION = True
+
+# Кэш проверки учётных данных Basic, токенов и пользователей JWT в памяти
+# процесса: макс. кол-во записей и время жизни записи (секунды). Сброс при
+# смене пароля - через версии в MOVIES_CACHE_ALIAS: при нескольких
+# процессах кэш должен быть общим (Redis, Memcached), не locmem
+AUTH_CACHE_MAX_SIZE = 10000
+AUTH_CACHE_TTL = 5 * 60
+
+# purge_expired: записей в одном DELETE, пауза между пачками (секунды) и
+# возраст, после которого nonce social_django удаляются (больше допуска
+# расхождения времени nonce OpenID - 5 часов)
+PURGE_BATCH_SIZE = 500
+PURGE_BATCH_PAUSE = 0.05
+PURGE_NONCE_MAX_AGE = 6 * 60 * 60
+
+# PRAGMA каждого подключения к SQLite (ENGINE django_movie_rest.sqlite,
+# включается в settings переменной окружения SQLITE_PRODUCTION=1):
+# WAL, fsync только на контрольных точках, mmap 256 МБ, кэш страниц 64 МБ
+# (отрицательное значение - в КБ), ожидание блокировки записи 5 с.
+# Запись при "database is locked" повторяется SQLITE_LOCK_RETRIES раз,
+# задержка - от SQLITE_LOCK_BACKOFF секунд с удвоением
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+SQLITE_LOCK_RETRIES = 5
+SQLITE_LOCK_BACKOFF = 0.05
+
+# Алиасы DATABASES для чтения (пусто - всё в default), пути запросов,
+# которые читают из реплик, время чтения из default после изменяющего
+# запроса клиента (cookie DATABASE_REPLICA_PIN_COOKIE и ключ в кэше по ip)
+# и макс. время жизни в кэше ответа, прочитанного из реплики
+DATABASE_REPLICAS = ()
+DATABASE_REPLICA_PATHS = ('/api/v1/',)
+DATABASE_REPLICA_PIN_SECONDS = 10
+DATABASE_REPLICA_PIN_COOKIE = 'primary_pin'
+DATABASE_REPLICA_CACHE_TIMEOUT = 30
+
 CKEDITOR_CONFIGS = {
     'default': {
         'skin': 'moono',
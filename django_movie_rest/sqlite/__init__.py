@@ -0,0 +1,73 @@
+"""
+Рабочий профиль SQLite: ENGINE = 'django_movie_rest.sqlite' (в settings -
+при переменной окружения SQLITE_PRODUCTION=1)
+
+- PRAGMA из SQLITE_PRAGMAS при каждом подключении (сигнал
+  connection_created): WAL - читатели не ждут писателя,
+  synchronous=NORMAL, mmap, размер кэша страниц, busy_timeout;
+- транзакции (transaction.atomic) начинаются с BEGIN IMMEDIATE:
+  блокировка записи берётся сразу и ожидается по busy_timeout.
+  При обычном BEGIN две транзакции, которые сначала читают, а потом
+  пишут, получают "database is locked" без ожидания;
+- retry_on_locked - повтор записи при "database is locked" с
+  экспоненциальной задержкой (SQLITE_LOCK_RETRIES, SQLITE_LOCK_BACKOFF).
+
+Замер под нагрузкой нескольких процессов - команда stress_sqlite
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик connection_created"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked_error(exc):
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_locked(func=None, *, using=DEFAULT_DB_ALIAS):
+    """
+    Повторить func при "database is locked". Внутри внешней транзакции
+    повтор невозможен (её блокировки и изменения уже отменены) - ошибка
+    передаётся дальше. func должна начинать свою транзакцию заново
+    """
+    if func is None:
+        return functools.partial(retry_on_locked, using=using)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        connection = connections[using]
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if (connection.vendor != 'sqlite'
+                        or connection.in_atomic_block
+                        or not is_locked_error(exc)
+                        or attempt >= settings.SQLITE_LOCK_RETRIES):
+                    raise
+            # Случайная доля задержки: повторы процессов не совпадают
+            delay = settings.SQLITE_LOCK_BACKOFF * 2 ** attempt
+            delay *= random.uniform(0.5, 1.5)
+            attempt += 1
+            logger.warning(
+                '%s: база заблокирована, повтор %d через %.3f с',
+                func.__qualname__, attempt, delay)
+            time.sleep(delay)
+
+    return wrapper
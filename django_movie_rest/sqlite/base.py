@@ -0,0 +1,16 @@
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3 import base
+
+from . import apply_pragmas
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд django.db.backends.sqlite3 с BEGIN IMMEDIATE"""
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
+
+
+connection_created.connect(
+    apply_pragmas, sender=DatabaseWrapper,
+    dispatch_uid='django_movie_rest.sqlite.apply_pragmas')
@@ -22,6 +22,7 @@ from django.urls import path, include
 from rest_framework_simplejwt.views import (
     TokenObtainPairView, TokenRefreshView, TokenVerifyView, )
 
+from .metrics import urlpatterns as metrics_urls
 from .yasg import urlpatterns as doc_urls
 
 urlpatterns = [
@@ -46,6 +47,7 @@ urlpatterns = [
 ]
 
 urlpatterns += doc_urls
+urlpatterns += metrics_urls
 
 if settings.DEBUG:
     urlpatterns += static(
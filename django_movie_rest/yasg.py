@@ -1,35 +1,180 @@
+"""
+Документация API (drf-yasg)
+
+Схема OpenAPI не строится в запросе: /swagger.json и /swagger.yaml
+отдают готовые байты с ETag. Источник - файлы OPENAPI_SCHEMA_DIR
+(команда build_schema при сборке/деплое), а без них - схема, один раз
+на процесс построенная в фоновом потоке (до готовности - 503 с
+Retry-After). Swagger UI и ReDoc загружают схему с /swagger.json
+(SPEC_URL в SWAGGER_SETTINGS/REDOC_SETTINGS), сами страницы строятся
+без обхода views
+"""
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
 from django.urls import path, re_path
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
 from rest_framework import permissions
-from drf_yasg.views import get_schema_view
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.views import UI_RENDERERS, get_schema_view
 from drf_yasg import openapi
 
+logger = logging.getLogger(__name__)
+
+info = openapi.Info(
+    title='Django Movie',
+    default_version='v1',
+    description='Test description',
+    license=openapi.License(name='BSD License'),
+)
+
 # Настройка доки
 schema_view = get_schema_view(
-    openapi.Info(
-        title='Django Movie',
-        default_version='v1',
-        description='Test description',
-        license=openapi.License(name='BSD License'),
-    ),
+    info,
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
 
+# Расширение файла -> (кодек drf-yasg, Content-Type)
+SCHEMA_FORMATS = {
+    '.json': (OpenAPICodecJson, 'application/json'),
+    '.yaml': (OpenAPICodecYaml, 'application/yaml; charset=utf-8'),
+}
+SCHEMA_FILENAME = 'swagger'
+SCHEMA_RETRY_AFTER = 5
+
+
+def generate_schema():
+    """
+    {расширение: байты} схемы всех views. Без запроса - как для
+    анонимного клиента (public=True), без host: UI подставит свой
+    """
+    generator = schema_view.generator_class(info)
+    schema = generator.get_schema(request=None, public=True)
+    return {
+        extension: codec(validators=[]).encode(schema)
+        for extension, (codec, _) in SCHEMA_FORMATS.items()
+    }
+
+
+def get_schema_path(extension, directory=None):
+    directory = directory or settings.OPENAPI_SCHEMA_DIR
+    return directory / f'{SCHEMA_FILENAME}{extension}'
+
+
+class SchemaStore:
+    """Готовые документы схемы процесса: {расширение: (байты, ETag)}"""
+
+    def __init__(self):
+        self.documents = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Документы или None, пока схема строится в фоне"""
+        if self.documents is None:
+            with self.lock:
+                if self.documents is None and self.thread is None:
+                    self.prepare()
+        return self.documents
+
+    def prepare(self):
+        documents = self.read_files()
+        if documents is not None:
+            self.set(documents)
+            return
+        logger.warning(
+            'Нет файлов схемы в %s (build_schema) - схема строится в фоне',
+            settings.OPENAPI_SCHEMA_DIR)
+        self.thread = threading.Thread(
+            target=self.generate, name='openapi-schema', daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def read_files():
+        if not settings.OPENAPI_SCHEMA_DIR:
+            return None
+        documents = {}
+        for extension in SCHEMA_FORMATS:
+            try:
+                documents[extension] = get_schema_path(
+                    extension).read_bytes()
+            except FileNotFoundError:
+                return None
+        return documents
+
+    def generate(self):
+        try:
+            self.set(generate_schema())
+        except Exception:
+            logger.exception('Не удалось построить схему OpenAPI')
+            # Следующий запрос попробует снова
+            self.thread = None
+        finally:
+            connections.close_all()
+
+    def set(self, documents):
+        self.documents = {
+            extension: (
+                content,
+                quote_etag(hashlib.sha256(content).hexdigest()[:32]))
+            for extension, content in documents.items()
+        }
+
+
+schema_store = SchemaStore()
+
+
+def ui_view(renderer):
+    """
+    Страница UI: только HTML-рендерер - запрос ?format=openapi к странице
+    не строит схему (её UI загружает с SPEC_URL)
+    """
+    return schema_view.as_view(renderer_classes=UI_RENDERERS[renderer])
+
+
+@require_safe
+def schema_file_view(request, format):
+    documents = schema_store.get()
+    if documents is None:
+        response = HttpResponse(
+            'Схема API строится, повторите запрос позже', status=503,
+            content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(SCHEMA_RETRY_AFTER)
+        return response
+
+    content, etag = documents[format]
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(
+            content, content_type=SCHEMA_FORMATS[format][1])
+    response['ETag'] = etag
+    # Кэшировать можно, но с проверкой по ETag (ответ 304)
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
 # Как отображать доку
 urlpatterns = [
     re_path(
         r'^swagger(?P<format>\.json|\.yaml)$',
-        schema_view.without_ui(cache_timeout=0),
+        schema_file_view,
         name='schema-json'
     ),
     re_path(
         r'^swagger/$',
-        schema_view.with_ui('swagger', cache_timeout=0),
+        ui_view('swagger'),
         name='schema-swagger-ui'
     ),
     re_path(
         r'^redoc/$',
-        schema_view.with_ui('redoc', cache_timeout=0),
+        ui_view('redoc'),
         name='schema-redoc'
     ),
 ]
@@ -1,9 +1,12 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
+from . import cache, search
 from .forms import MovieAdminForm
 from .models import (
-    Category, Actor, Genre, Movie, MovieShots, RatingStar, Rating, Review)
+    Category, Actor, Genre, Movie, MovieShots, RatingStar, Rating, Review,
+    MovieRating)
 
 
 class ReviewInLines(admin.TabularInline):
@@ -97,8 +100,16 @@ class MovieAdmin(admin.ModelAdmin):
 
     def publish(self, request, queryset):
         """Опубликовать"""
+        # pk - до update(): выборка списка изменений может зависеть от
+        # draft (фильтр "черновик"), после обновления она пуста
+        pks = list(queryset.values_list('pk', flat=True))
         # Обновлем все выбранные записи с 'draft=False'
-        row_update = queryset.update(draft=False)
+        row_update = Movie.objects.filter(pk__in=pks).update(
+            draft=False, updated_at=timezone.now())
+        # update() не вызывает сигналы - сброс кэша каталога и
+        # обновление поискового индекса вручную
+        cache.invalidate(cache.MOVIES, pks)
+        search.update_index(Movie, pks)
         if row_update == 1:
             message_bit = '1 запись была обновлена'
         else:
@@ -107,7 +118,11 @@ class MovieAdmin(admin.ModelAdmin):
 
     def unpublished(self, request, queryset):
         """Снять с публикации"""
-        row_update = queryset.update(draft=True)
+        pks = list(queryset.values_list('pk', flat=True))
+        row_update = Movie.objects.filter(pk__in=pks).update(
+            draft=True, updated_at=timezone.now())
+        cache.invalidate(cache.MOVIES, pks)
+        search.update_index(Movie, pks)
         if row_update == 1:
             message_bit = '1 запись была обновлена'
         else:
@@ -140,6 +155,30 @@ class RatingAdmin(admin.ModelAdmin):
     """Рейтинг"""
     list_display = ('star', 'movie', 'ip')
 
+    def save_model(self, request, obj, form, change):
+        """Смена звезды/фильма голоса - пересчёт агрегатов обоих фильмов"""
+        movie_ids = {obj.movie_id}
+        if change and 'movie' in form.changed_data:
+            movie_ids.add(form.initial['movie'])
+        with MovieRating.deferred(movie_ids):
+            super().save_model(request, obj, form, change)
+        # rebuild пишет bulk_create - сигналы не вызываются
+        cache.invalidate(cache.MOVIES)
+
+    def delete_queryset(self, request, queryset):
+        """Удаление выбранных голосов: один пересчёт затронутых фильмов"""
+        movie_ids = set(queryset.values_list('movie_id', flat=True))
+        with MovieRating.deferred(movie_ids):
+            super().delete_queryset(request, queryset)
+        cache.invalidate(cache.MOVIES)
+
+
+@admin.register(MovieRating)
+class MovieRatingAdmin(admin.ModelAdmin):
+    """Агрегированный рейтинг (пересчёт - manage.py rebuild_ratings)"""
+    list_display = ('movie', 'votes', 'middle_star')
+    readonly_fields = ('movie', 'votes', 'star_sum', 'middle_star', 'histogram')
+
 
 @admin.register(Review)
 class ReviewsAdmin(admin.ModelAdmin):
@@ -7,33 +7,64 @@ from rest_framework.response import Response
 from rest_framework.viewsets import (
     ViewSet, ReadOnlyModelViewSet, ModelViewSet, )
 
+from . import cache
+from .conditional import ConditionalGetMixin
+from .mixins import (
+    optimize_queryset, OptimizedQuerysetMixin, QueryBudgetMixin,
+    FastListMixin, SparseFieldsetMixin, )
 from .models import Actor
-from .serializers import (ActorListSerializer, ActorDetailSerializer, )
+from .serializers import (
+    ActorListSerializer, ActorDetailSerializer, ActorFastListSerializer, )
+from .service import PaginationActors
 
 
-class ActorViewSet(ViewSet):
+class ActorViewSet(QueryBudgetMixin, ViewSet):
+    max_queries = {'list': 1, 'retrieve': 1}
+
     def list(self, request):
         """Все актёры и режиссёры"""
-        queryset = Actor.objects.all()
+        queryset = optimize_queryset(Actor.objects.all(), ActorListSerializer)
         serializer = ActorListSerializer(queryset, many=True)
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
         """Детально об актёре или режиссёре"""
-        queryset = Actor.objects.all()
+        queryset = optimize_queryset(
+            Actor.objects.all(), ActorDetailSerializer)
         actor = get_object_or_404(queryset, pk=pk)
         serializer = ActorDetailSerializer(actor)
         return Response(serializer.data)
 
 
-class ActorReadOnly(ReadOnlyModelViewSet):
+class ActorReadOnly(OptimizedQuerysetMixin, QueryBudgetMixin,
+                    ReadOnlyModelViewSet):
     queryset = Actor.objects.all()
     serializer_class = ActorListSerializer
+    pagination_class = PaginationActors
+    max_queries = {'list': 2, 'retrieve': 1}
 
 
-class ActorModelViewSet(ModelViewSet):
+class ActorModelViewSet(ConditionalGetMixin, SparseFieldsetMixin,
+                        cache.CachedResponseMixin, FastListMixin,
+                        OptimizedQuerysetMixin, QueryBudgetMixin,
+                        ModelViewSet):
     queryset = Actor.objects.all()
     serializer_class = ActorListSerializer
+    pagination_class = PaginationActors
+    fast_list_serializer_class = ActorFastListSerializer
+    fast_list_actions = ('list', 'my_list')
+    max_queries = {'list': 3, 'my_list': 3, 'retrieve': 2, 'example': 2}
+    # ETag / Last-Modified для GET (list, my_list, retrieve, example).
+    # list и retrieve доступны только авторизованным, ответ от пользователя
+    # не зависит - кэш общий
+    cache_namespace = cache.ACTORS
+    shared_cached_actions = ('list', 'retrieve')
+    conditional_models = {
+        'list': (Actor,),
+        'my_list': (Actor,),
+        'retrieve': ((Actor, 'pk'),),
+        'example': ((Actor, 'pk'),),
+    }
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def my_list(self, request, *args, **kwargs):
@@ -42,6 +73,10 @@ class ActorModelViewSet(ModelViewSet):
     @action(detail=True, methods=['get', 'put'], renderer_classes=[AdminRenderer])
     def example(self, request, *args, **kwargs):
         """Пример добавления своего метода"""
+        return self.conditional_response(
+            self._example, request, *args, **kwargs)
+
+    def _example(self, request, *args, **kwargs):
         actor = self.get_object()
         serializer = ActorDetailSerializer(actor)
         return Response(serializer.data)
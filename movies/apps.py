@@ -8,3 +8,7 @@ class MoviesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movies'
     verbose_name = 'Фильмы'
+
+    def ready(self):
+        # Подключение сигналов (сброс кэша ответов) и проверок настроек
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,174 @@
+"""
+Аутентификация с кэшем проверки учётных данных
+
+BasicAuthentication на каждый запрос проверяет пароль (PBKDF2, сотни
+тысяч итераций), TokenAuthentication и JWTAuthentication читают
+пользователя из БД. Здесь результат проверки хранится в кэше процесса
+(VerificationCache: LRU с временем жизни записей, AUTH_CACHE_*):
+HMAC учётных данных Basic / ключа токена / user_id из JWT -> снимок
+полей пользователя (и токена). Неудачные проверки не кэшируются.
+
+Сброс - версия пользователя в кэше каталога (movies.cache, пространство
+имён USERS): сигналы movies.signals увеличивают её при сохранении и
+удалении пользователя (смена пароля, is_active) и удалении токена.
+Запись кэша процесса действительна, пока версия не изменилась. Сброс
+виден всем процессам только при общем бэкенде MOVIES_CACHE_ALIAS (Redis,
+Memcached); с LocMemCache - только процессу, где изменён пользователь
+(предупреждение movies.W001 в check --deploy). Изменения в обход
+сигналов (QuerySet.update) действуют не позже AUTH_CACHE_TTL
+"""
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import router
+
+from rest_framework.authentication import (
+    BasicAuthentication, TokenAuthentication, )
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import cache
+
+USERS = 'users'
+
+_verification_cache = None
+_verification_cache_lock = threading.Lock()
+
+
+class VerificationCache:
+    """Потокобезопасный LRU-кэш: не больше max_size записей, ttl секунд"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (time.monotonic() + self.ttl, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+def get_verification_cache():
+    global _verification_cache
+    with _verification_cache_lock:
+        if _verification_cache is None:
+            _verification_cache = VerificationCache(
+                settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL)
+        return _verification_cache
+
+
+def credentials_key(scheme, *parts):
+    """HMAC учётных данных: пароли и ключи не хранятся в памяти как есть"""
+    message = '\0'.join(str(part) for part in parts).encode()
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+    return f'{scheme}:{digest}'
+
+
+def invalidate_user(pk):
+    """Сбросить проверки пользователя pk во всех процессах"""
+    cache.invalidate_objects(USERS, [pk])
+
+
+def snapshot(instance):
+    """(модель, имена полей, значения) - без обращения к связям"""
+    fields = instance._meta.concrete_fields
+    return (
+        type(instance),
+        tuple(field.attname for field in fields),
+        tuple(getattr(instance, field.attname) for field in fields),
+    )
+
+
+def restore(data):
+    """Новый объект из снимка на каждый запрос: запросы не делят объект"""
+    model, names, values = data
+    return model.from_db(router.db_for_read(model), names, values)
+
+
+class CachedVerificationMixin:
+    """
+    verify(key, check) - результат check() (пользователь, auth) из кэша
+    проверок, если версия пользователя не изменилась
+    """
+
+    def verify(self, key, check):
+        verification_cache = get_verification_cache()
+        entry = verification_cache.get(key)
+        if entry is not None:
+            user_id, version, user_data, auth_data = entry
+            if cache.get_versions(USERS, user_id) == version:
+                auth = restore(auth_data) if auth_data else auth_data
+                return restore(user_data), auth
+
+        user, auth = check()
+        # id пользователя известен только после проверки: изменение,
+        # зафиксированное между check() и чтением версии, действует
+        # не позже AUTH_CACHE_TTL
+        version = cache.get_versions(USERS, user.pk)
+        auth_data = snapshot(auth) if hasattr(auth, '_meta') else auth
+        verification_cache.set(
+            key, (user.pk, version, snapshot(user), auth_data))
+        return user, auth
+
+
+class CachedBasicAuthentication(CachedVerificationMixin, BasicAuthentication):
+    """BasicAuthentication без PBKDF2 для уже проверенной пары логин/пароль"""
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = credentials_key('basic', userid, password)
+        return self.verify(key, lambda: super(
+            CachedBasicAuthentication, self).authenticate_credentials(
+                userid, password, request))
+
+
+class CachedTokenAuthentication(CachedVerificationMixin, TokenAuthentication):
+    """TokenAuthentication без запроса токена и пользователя к БД"""
+
+    def authenticate_credentials(self, key):
+        return self.verify(
+            credentials_key('token', key),
+            lambda: super(
+                CachedTokenAuthentication, self).authenticate_credentials(key))
+
+
+class CachedJWTAuthentication(CachedVerificationMixin, JWTAuthentication):
+    """
+    JWTAuthentication без запроса пользователя к БД. Подпись и срок
+    действия токена проверяются на каждый запрос
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            # Ошибку формирует JWTAuthentication
+            return super().get_user(validated_token)
+        user, _ = self.verify(
+            f'jwt:{user_id}',
+            lambda: (super(CachedJWTAuthentication, self).get_user(
+                validated_token), None))
+        return user
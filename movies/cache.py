@@ -0,0 +1,196 @@
+"""
+Кэш ответов публичного каталога (фильмы, актёры)
+
+Ключ ответа: версия (списков пространства имён или объекта для
+детального вывода) + хост, путь и нормализованные параметры фильтрации и
+пагинации. Сигналы (movies.signals) увеличивают версии при изменении
+данных, поэтому устаревшие ответы просто перестают находиться в кэше.
+Версия списков не входит в ключи детального вывода: изменение одного
+фильма или средней оценки не сбрасывает ответы остальных фильмов.
+Бэкенд - любой кэш Django (locmem/file/Redis), см. MOVIES_CACHE_ALIAS
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from rest_framework.response import Response
+
+from django_movie_rest import routers
+
+MOVIES = 'movies'
+ACTORS = 'actors'
+
+# Параметры пагинации, которые могут быть у pagination_class
+PAGINATION_PARAMS = (
+    'page_query_param', 'page_size_query_param', 'limit_query_param',
+    'offset_query_param', 'cursor_query_param', 'count_query_param',
+)
+
+
+def get_cache():
+    return caches[settings.MOVIES_CACHE_ALIAS]
+
+
+def get_timeout():
+    """
+    Время жизни ответа. Реплика может отставать от версии, под которой
+    сохраняется ответ, - прочитанное из реплики живёт не дольше
+    DATABASE_REPLICA_CACHE_TIMEOUT
+    """
+    if routers.replicas_enabled():
+        return min(settings.MOVIES_CACHE_TIMEOUT,
+                   settings.DATABASE_REPLICA_CACHE_TIMEOUT)
+    return settings.MOVIES_CACHE_TIMEOUT
+
+
+def _version_key(namespace, pk=None):
+    if pk is None:
+        return f'movies:version:{namespace}'
+    return f'movies:version:{namespace}:{pk}'
+
+
+def get_versions(namespace, pk=None):
+    """
+    Версия списков пространства имён (pk=None) или объекта pk.
+    Начальное значение - время, чтобы после вытеснения ключа из кэша
+    версия не повторилась
+    """
+    cache = get_cache()
+    key = _version_key(namespace, pk)
+    version = cache.get(key)
+    if version is None:
+        version = cache.get_or_set(key, time.time_ns(), None)
+    return (version,)
+
+
+def _bump(keys):
+    """
+    Увеличить версии после фиксации транзакции, чтобы конкурентный запрос
+    не закэшировал данные, которые ещё не записаны
+    """
+    def bump():
+        cache = get_cache()
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def invalidate(namespace, pks=None):
+    """
+    Сбросить кэш списков (и фасетов) пространства имён и детальные ответы
+    объектов pks (pks=None - только списки)
+    """
+    keys = [_version_key(namespace)]
+    keys += [_version_key(namespace, pk) for pk in pks or ()]
+    _bump(keys)
+
+
+def invalidate_objects(namespace, pks):
+    """Сбросить только детальные ответы объектов pks"""
+    _bump([_version_key(namespace, pk) for pk in pks])
+
+
+def get_response_key(namespace, request, params, pk=None):
+    """
+    Ключ ответа: версия объекта pk (детальный вывод) или списков
+    пространства имён (pk=None), хост, путь
+    """
+    versions = get_versions(namespace, pk)
+    raw = repr((request.get_host(), request.path, params))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    version = '.'.join(str(value) for value in versions)
+    return f'movies:response:{namespace}:{version}:{digest}'
+
+
+class CachedResponseMixin:
+    """
+    Кэширование ответов list/retrieve для анонимных GET-запросов.
+    Поля, зависящие от клиента, заполняются после чтения из кэша
+    в stitch_response_data. shared_cached_actions - действия, ответ
+    которых не зависит от пользователя (кэшируются и для авторизованных)
+    """
+    cache_namespace = None
+    cached_actions = ('list', 'retrieve')
+    shared_cached_actions = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is not None:
+            return Response(self.stitch_response_data(request, data))
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, get_timeout())
+        return response
+
+    def stitch_response_data(self, request, data):
+        """Дополнить закэшированный ответ полями конкретного клиента"""
+        return data
+
+    def get_cache_key(self, request):
+        if (self.action not in self.cached_actions
+                or request.method != 'GET'
+                or (request.user.is_authenticated
+                    and self.action not in self.shared_cached_actions)):
+            return None
+        params = self.get_cache_params(request)
+        if params is None:
+            return None
+
+        pk = None
+        if self.action == 'retrieve':
+            pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        return get_response_key(self.cache_namespace, request, params, pk)
+
+    def get_cache_params(self, request):
+        """
+        Нормализованные параметры запроса: очищенные данные формы
+        фильтра и параметры пагинации. None - не кэшировать.
+        Формат ответа не учитывается: в кэше данные, а не отрендеренный ответ
+        """
+        params = {}
+        filterset_class = getattr(self, 'filterset_class', None)
+        if filterset_class is not None:
+            filterset = filterset_class(
+                request.query_params, queryset=self.get_queryset(),
+                request=request)
+            if not filterset.is_valid():
+                return None
+            for name, value in filterset.form.cleaned_data.items():
+                if value in (None, '', [], ()):
+                    continue
+                if isinstance(value, (list, tuple)):
+                    value = tuple(sorted(value))
+                elif isinstance(value, slice):
+                    value = (value.start, value.stop)
+                params[name] = value
+
+        names = []
+        paginator = self.paginator
+        if paginator is not None:
+            names += [
+                getattr(paginator, attr) for attr in PAGINATION_PARAMS
+                if getattr(paginator, attr, None)]
+        for name in names:
+            if name in request.query_params:
+                params[name] = request.query_params[name]
+        return tuple(sorted(params.items()))
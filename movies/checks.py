@@ -0,0 +1,28 @@
+"""
+Проверки настроек (manage.py check --deploy)
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версии в кэше MOVIES_CACHE_ALIAS сбрасывают ответы каталога
+    (movies.cache) и проверки учётных данных (movies.authentication) во всех
+    процессах, только если кэш общий. С LocMemCache у каждого процесса свои
+    версии: смена пароля, is_active и удаление токена в другом процессе
+    действуют не раньше AUTH_CACHE_TTL
+    """
+    alias = settings.MOVIES_CACHE_ALIAS
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    if not backend.endswith('.LocMemCache'):
+        return []
+    return [Warning(
+        f'MOVIES_CACHE_ALIAS = {alias!r} - кэш в памяти процесса',
+        hint='При нескольких процессах (gunicorn, uvicorn --workers) '
+             'укажите общий кэш (Redis, Memcached): иначе сброс кэша '
+             'каталога и проверок учётных данных виден только процессу, '
+             'в котором изменены данные',
+        id='movies.W001',
+    )]
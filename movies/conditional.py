@@ -0,0 +1,121 @@
+"""
+Условные GET-запросы (ETag / Last-Modified): ответ 304 без сериализации
+
+Свежесть ответа - MAX(updated_at) по моделям, влияющим на ответ
+(индексированное поле, один запрос на все модели; для одного объекта -
+только его запись и связанные с ним), и версии кэша каталога (movies.cache),
+которые учитывают удаления и изменения жанров/категорий
+"""
+import hashlib
+
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+
+from . import cache
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для list/retrieve (и действий, вызывающих их).
+    conditional_models - модели с полем updated_at, данные которых выводятся
+    (кортеж или словарь {action: кортеж}). Элемент - модель (вся таблица)
+    или (модель, lookup) - записи, связанные с объектом запроса: lookup=pk
+    """
+    conditional_models = ()
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return handler(request, *args, **kwargs)
+
+        last_modified = self.get_last_modified()
+        etag = self.get_etag(request, last_modified)
+        not_modified = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_conditional_models(self):
+        """conditional_models - кортеж или словарь {action: кортеж}"""
+        if isinstance(self.conditional_models, dict):
+            return self.conditional_models.get(getattr(self, 'action', None))
+        return self.conditional_models
+
+    def get_last_modified(self):
+        """Время последнего изменения (timestamp) данных ответа"""
+        models = self.get_conditional_models()
+        if not models:
+            return None
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        return get_last_modified(models, pk)
+
+    def get_etag_extra(self, request):
+        """Данные клиента, от которых зависит ответ"""
+        return ''
+
+    def get_etag(self, request, last_modified):
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        versions = ()
+        if self.cache_namespace is not None:
+            versions = cache.get_versions(self.cache_namespace, pk)
+        raw = repr((
+            type(self).__name__, getattr(self, 'action', None),
+            request.get_full_path(), request.accepted_media_type,
+            last_modified, versions, self.get_etag_extra(request),
+        ))
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def get_last_modified(models, pk=None):
+    """
+    MAX(updated_at) по нескольким моделям одним запросом:
+    SELECT (SELECT updated_at ... ORDER BY updated_at DESC LIMIT 1), ...
+    Для элементов (модель, lookup) - только записи с lookup=pk
+    """
+    parts, params = [], []
+    for entry in models:
+        model, lookup = entry if isinstance(entry, tuple) else (entry, None)
+        queryset = model._default_manager.all()
+        if lookup is not None:
+            queryset = queryset.filter(**{lookup: pk})
+        queryset = queryset.order_by('-updated_at').values('updated_at')[:1]
+        sql, query_params = queryset.query.sql_with_params()
+        parts.append(f'({sql})')
+        params.extend(query_params)
+
+    using = router.db_for_read(model)
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(parts), params)
+        row = cursor.fetchone()
+
+    timestamps = []
+    for value in row:
+        if value is None:
+            continue
+        # SQLite возвращает строку, в БД время хранится в UTC
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.utc)
+        timestamps.append(value)
+    if not timestamps:
+        return None
+    return int(max(timestamps).timestamp())
@@ -0,0 +1,111 @@
+"""
+Выгрузка опубликованных фильмов каталога в NDJSON или CSV
+
+Фильмы читаются порциями по pk (keyset) с догрузкой жанров, актёров и
+режиссёров на каждую порцию - память не зависит от размера каталога,
+первая строка отдаётся сразу. prefetch_related не работает с
+QuerySet.iterator() в Django 3.2, поэтому порции выбираются вручную.
+Формат записи совместим с командой import_catalogue
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Actor, Genre, Movie
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Поля фильма, выгружаемые как есть
+MOVIE_FIELDS = (
+    'url', 'title', 'tagline', 'description', 'year', 'country',
+    'world_premiere', 'budget', 'fees_in_usa', 'fess_in_world', 'poster',
+)
+# Списки в CSV - одна ячейка, значения через разделитель
+CSV_LIST_SEPARATOR = '|'
+CSV_COLUMNS = MOVIE_FIELDS + (
+    'category', 'genres', 'actors', 'directors',
+    'rating_votes', 'rating_middle_star',
+)
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def iter_movies(chunk_size=EXPORT_CHUNK_SIZE):
+    """Опубликованные фильмы порциями по chunk_size, по возрастанию pk"""
+    people = Actor.objects.only('name').order_by('pk')
+    queryset = Movie.objects.filter(draft=False).select_related(
+        'category', 'rating_aggregate',
+    ).prefetch_related(
+        Prefetch('genres', queryset=Genre.objects.only('url').order_by('pk')),
+        Prefetch('actors', queryset=people),
+        Prefetch('directors', queryset=people),
+    ).order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last_pk = chunk[-1].pk
+
+
+def movie_record(movie):
+    """Запись выгрузки: поля фильма, slug категории и жанров, имена людей"""
+    record = {field: getattr(movie, field) for field in MOVIE_FIELDS}
+    record['world_premiere'] = movie.world_premiere.isoformat()
+    record['poster'] = movie.poster.name or None
+    record['category'] = movie.category.url if movie.category else None
+    record['genres'] = [genre.url for genre in movie.genres.all()]
+    record['actors'] = [actor.name for actor in movie.actors.all()]
+    record['directors'] = [actor.name for actor in movie.directors.all()]
+    try:
+        aggregate = movie.rating_aggregate
+    except Movie.rating_aggregate.RelatedObjectDoesNotExist:
+        aggregate = None
+    record['rating'] = {
+        'votes': aggregate.votes if aggregate else 0,
+        'middle_star': aggregate.middle_star if aggregate else None,
+        'histogram': aggregate.histogram if aggregate else {},
+    }
+    return record
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """Файлоподобный объект для csv.writer: write возвращает строку"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        rating = record['rating']
+        row = {
+            **record,
+            'genres': CSV_LIST_SEPARATOR.join(record['genres']),
+            'actors': CSV_LIST_SEPARATOR.join(record['actors']),
+            'directors': CSV_LIST_SEPARATOR.join(record['directors']),
+            'rating_votes': rating['votes'],
+            'rating_middle_star': rating['middle_star'],
+        }
+        yield writer.writerow(
+            ['' if row[column] is None else row[column]
+             for column in CSV_COLUMNS])
+
+
+def export_lines(output_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки выгрузки в формате 'ndjson' или 'csv'"""
+    records = (movie_record(movie) for movie in iter_movies(chunk_size))
+    if output_format == 'csv':
+        return csv_lines(records)
+    return ndjson_lines(records)
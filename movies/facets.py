@@ -0,0 +1,69 @@
+"""
+Фасеты списка фильмов: кол-во опубликованных фильмов по жанрам, годам и
+категориям для текущей выборки MovieFilter
+
+Счётчики измерения считаются с остальными фильтрами, но без своего
+(год не сужает список жанров и наоборот), чтобы в боковой панели были
+видны все варианты. Результат кэшируется по версии списков
+movies.cache.MOVIES (MovieViewSet.facets)
+"""
+from django.db.models import Count
+from django_filters.constants import EMPTY_VALUES
+
+from .models import Category, Genre, Movie
+
+# Фильтр MovieFilter, который не применяется к счётчикам измерения
+FACET_FILTERS = {
+    'genres': 'genres',
+    'years': 'year',
+    'categories': None,
+}
+
+
+# Фильтры через JOIN по M2M: строки фильма повторяются
+JOIN_FILTERS = ('genres',)
+
+
+def filter_queryset(filterset, exclude=None):
+    """
+    Выборка filterset без фильтра exclude. После фильтров из JOIN_FILTERS
+    фильмы выбираются через pk IN (...), чтобы не было повторов строк
+    """
+    queryset = filterset.queryset
+    joined = False
+    for name, value in filterset.form.cleaned_data.items():
+        if name == exclude or value in EMPTY_VALUES:
+            continue
+        queryset = filterset.filters[name].filter(queryset, value)
+        joined = joined or name in JOIN_FILTERS
+    if joined:
+        return Movie.objects.filter(pk__in=queryset.values('pk'))
+    return queryset
+
+
+def get_facets(filterset):
+    """filterset - проверенный (is_valid) MovieFilter"""
+    genres = dict(
+        Movie.genres.through.objects.filter(
+            movie__in=filter_queryset(filterset, FACET_FILTERS['genres']),
+        ).values_list('genre_id').annotate(count=Count('movie_id')).order_by())
+    years = filter_queryset(filterset, FACET_FILTERS['years']).values_list(
+        'year').annotate(count=Count('pk')).order_by('year')
+    categories = dict(
+        filter_queryset(filterset, FACET_FILTERS['categories']).values_list(
+            'category_id').annotate(count=Count('pk')).order_by())
+    return {
+        # У каждого фильма одна категория (или NULL) - сумма равна итогу
+        'total': sum(categories.values()),
+        'genres': [
+            {'name': genre.name, 'url': genre.url,
+             'count': genres.get(genre.pk, 0)}
+            for genre in Genre.objects.only('name', 'url')
+        ],
+        'years': [{'year': year, 'count': count} for year, count in years],
+        'categories': [
+            {'name': category.name, 'url': category.url,
+             'count': categories.get(category.pk, 0)}
+            for category in Category.objects.only('name', 'url')
+        ],
+    }
@@ -0,0 +1,194 @@
+"""
+Уменьшенные копии изображений (постеры, фото актёров, кадры) в WebP и JPEG
+
+Копии лежат рядом с оригиналом в подкаталоге variants с предсказуемыми
+именами (actors/variants/Alan_Taylor.jpg.small.webp - с расширением
+оригинала, у a.jpg и a.png разные копии), поэтому их URL вычисляется без
+запросов к БД. В ответ (ImageVariantsField) попадают только созданные
+копии: готовность файла проверяется в хранилище один раз и запоминается в
+кэше каталога (movies.cache).
+После сохранения модели копии создаются в пуле потоков процесса
+(сигналы movies.signals) - сохранение в админке не ждёт Pillow. Когда
+копии созданы, сигнал variants_generated сбрасывает кэш ответов с этими
+изображениями. Копии уже загруженных файлов - команда
+generate_image_variants
+"""
+import hashlib
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# Модели и поля с изображениями: 'приложение.Модель' -> поле
+IMAGE_FIELDS = {
+    'movies.Movie': 'poster',
+    'movies.Actor': 'image',
+    'movies.MovieShots': 'image',
+}
+VARIANTS_DIR = 'variants'
+# Формат -> (расширение, параметры Image.save)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Копии созданы: names - имена оригиналов
+variants_generated = Signal()
+
+
+def variant_name(name, variant, image_format):
+    """actors/Alan_Taylor.jpg -> actors/variants/Alan_Taylor.jpg.small.webp"""
+    directory, filename = posixpath.split(name)
+    extension = FORMATS[image_format][0]
+    return posixpath.join(
+        directory, VARIANTS_DIR, f'{filename}.{variant}.{extension}')
+
+
+def variant_names(name):
+    """[(вариант, формат, имя файла)] для оригинала name"""
+    return [
+        (variant, image_format, variant_name(name, variant, image_format))
+        for variant in settings.IMAGE_VARIANTS
+        for image_format in settings.IMAGE_VARIANT_FORMATS
+    ]
+
+
+def _ready_key(path):
+    digest = hashlib.md5(path.encode()).hexdigest()
+    return f'movies:image_variant:{digest}'
+
+
+def mark_ready(paths):
+    """Файлы копий записаны (копии не удаляются - без срока жизни)"""
+    cache.get_cache().set_many(
+        {_ready_key(path): True for path in paths}, None)
+
+
+def ready_paths(paths, storage=default_storage):
+    """
+    Созданные копии из paths. Отсутствующие не запоминаются: появятся
+    в ответе, когда файл будет записан
+    """
+    keys = {_ready_key(path): path for path in paths}
+    ready = {keys[key] for key in cache.get_cache().get_many(keys)}
+    found = [
+        path for path in paths
+        if path not in ready and storage.exists(path)]
+    if found:
+        mark_ready(found)
+    return ready.union(found)
+
+
+def variant_urls(name, storage=default_storage):
+    """{вариант: {формат: url}} - только созданные копии"""
+    names = variant_names(name)
+    ready = ready_paths([path for _, _, path in names], storage)
+    urls = {}
+    for variant, image_format, path in names:
+        if path in ready:
+            urls.setdefault(variant, {})[image_format] = storage.url(path)
+    return urls
+
+
+def render_variant(image, max_size, image_format):
+    """Копия image, вписанная в квадрат max_size (без увеличения)"""
+    copy = image.copy()
+    copy.thumbnail((max_size, max_size), Image.LANCZOS)
+    if image_format == 'jpeg' and copy.mode != 'RGB':
+        # JPEG без прозрачности: прозрачные области - белые
+        background = Image.new('RGB', copy.size, 'white')
+        rgba = copy.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        copy = background
+    elif copy.mode not in ('RGB', 'RGBA'):
+        copy = copy.convert('RGBA' if 'transparency' in copy.info else 'RGB')
+    buffer = BytesIO()
+    copy.save(
+        buffer, quality=settings.IMAGE_VARIANT_QUALITY,
+        **FORMATS[image_format][1])
+    return buffer.getvalue()
+
+
+def generate_variants(name, force=False, storage=default_storage):
+    """
+    Создать копии оригинала name. Существующие копии пропускаются,
+    если не force. Возвращает кол-во записанных файлов
+    """
+    names = variant_names(name)
+    if not force:
+        names = [item for item in names if not storage.exists(item[2])]
+    if not names:
+        return 0
+    with storage.open(name, 'rb') as file:
+        image = Image.open(file)
+        # Поворот по EXIF: копии без метаданных
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    for variant, image_format, path in names:
+        content = render_variant(
+            image, settings.IMAGE_VARIANTS[variant], image_format)
+        if storage.exists(path):
+            storage.delete(path)
+        storage.save(path, ContentFile(content))
+    mark_ready([path for _, _, path in names])
+    return len(names)
+
+
+def _generate(name):
+    try:
+        if generate_variants(name):
+            variants_generated.send(sender=None, names=[name])
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s', name)
+
+
+def _generate_in_thread(name):
+    try:
+        _generate(name)
+    finally:
+        # Подключения к БД потока пула (сброс кэша в variants_generated)
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix='image-variants')
+        return _executor
+
+
+def schedule(names):
+    """
+    Создать копии изображений names после фиксации транзакции:
+    в пуле потоков или сразу, если IMAGE_VARIANT_WORKERS = 0
+    """
+    names = [name for name in names if name]
+    if not names:
+        return
+
+    def submit():
+        for name in names:
+            if settings.IMAGE_VARIANT_WORKERS:
+                get_executor().submit(_generate_in_thread, name)
+            else:
+                _generate(name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,270 @@
+"""
+Загрузка каталога из NDJSON/CSV (команда import_catalogue)
+
+Записи обрабатываются порциями, каждая порция - одна транзакция:
+bulk_create новых и bulk_update существующих записей, связи M2M фильмов
+пишутся пачкой напрямую в through-таблицы. Категории, жанры и актёры
+сопоставляются через словари в памяти (slug/имя -> id), фильмы - одним
+запросом url IN (...) на порцию, чтобы память не росла с размером файла.
+Формат записей фильмов совпадает с выгрузкой movies.export
+"""
+import csv
+import json
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache, images, search
+from .export import CSV_LIST_SEPARATOR, MOVIE_FIELDS
+from .models import Actor, Category, Genre, Movie
+
+# Поля справочников; ключ записи - первое поле
+DICTIONARY_FIELDS = {
+    'categories': (Category, ('url', 'name', 'description')),
+    'genres': (Genre, ('url', 'name', 'description')),
+    'actors': (Actor, ('name', 'age', 'description', 'image')),
+}
+# Поля фильма, через которые выводятся записи справочников
+RELATED_MOVIE_LOOKUPS = {
+    Category: ('category',),
+    Genre: ('genres',),
+    Actor: ('actors', 'directors'),
+}
+KINDS = ('movies',) + tuple(DICTIONARY_FIELDS)
+LIST_FIELDS = ('genres', 'actors', 'directors')
+FORMATS = ('ndjson', 'csv')
+# Порция по умолчанию: запросы IN (...) порции укладываются в лимит
+# параметров SQLite (999 в Django 3.2)
+IMPORT_CHUNK_SIZE = 500
+# Сколько предупреждений хранить (остальные только считаются)
+MAX_WARNINGS = 100
+
+
+class CatalogueImportError(Exception):
+    """Ошибка формата файла импорта"""
+
+
+def read_records(path, file_format):
+    """Записи файла (dict). В CSV списки - значения через CSV_LIST_SEPARATOR"""
+    with open(path, encoding='utf-8', newline='') as file:
+        if file_format == 'ndjson':
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as exc:
+                    raise CatalogueImportError(
+                        f'Строка {number}: {exc}') from exc
+            return
+        for row in csv.DictReader(file):
+            record = {key: value for key, value in row.items() if value != ''}
+            for field in LIST_FIELDS:
+                if field in record:
+                    record[field] = record[field].split(CSV_LIST_SEPARATOR)
+            yield record
+
+
+def related_movie_ids(model, pks):
+    """id фильмов, связанных с записями справочника model"""
+    if not pks:
+        return []
+    condition = Q()
+    for name in RELATED_MOVIE_LOOKUPS[model]:
+        condition |= Q(**{f'{name}__in': pks})
+    return Movie.objects.filter(condition).distinct().values_list(
+        'pk', flat=True)
+
+
+def to_python(model, field_name, value):
+    """Значение из файла (строка CSV или JSON) -> значение поля модели"""
+    field = model._meta.get_field(field_name)
+    if value is None:
+        return None if field.null else field.get_default()
+    return field.to_python(value)
+
+
+class CatalogueImporter:
+    """
+    Импорт записей одного вида (movies, actors, genres, categories).
+    import_chunk(records) - одна транзакция; warnings - пропущенные
+    записи и неизвестные slug
+    """
+
+    def __init__(self, kind):
+        if kind not in KINDS:
+            raise CatalogueImportError(f'Неизвестный вид записей: {kind}')
+        self.kind = kind
+        self.warnings = []
+        self.warning_count = 0
+        self.created = self.updated = 0
+        if kind == 'movies':
+            self.categories = dict(Category.objects.values_list('url', 'pk'))
+            self.genres = dict(Genre.objects.values_list('url', 'pk'))
+            self.actors = self.load_actors()
+
+    @staticmethod
+    def load_actors():
+        # При одинаковых именах - первый по id
+        actors = {}
+        for name, pk in Actor.objects.order_by('-pk').values_list('name', 'pk'):
+            actors[name] = pk
+        return actors
+
+    def import_chunk(self, records):
+        with transaction.atomic():
+            if self.kind == 'movies':
+                self.import_movies(records)
+            else:
+                self.import_dictionary(records)
+
+    def import_dictionary(self, records):
+        model, fields = DICTIONARY_FIELDS[self.kind]
+        key, fields = fields[0], fields[1:]
+        records = self.unique_records(records, key)
+        existing = {
+            getattr(obj, key): obj for obj in model.objects.filter(
+                **{f'{key}__in': list(records)}).order_by('-pk')}
+        now = timezone.now()
+        created, updated = [], []
+        for value, record in records.items():
+            obj = existing.get(value)
+            if obj is None:
+                obj = model(**{key: value})
+                created.append(obj)
+            else:
+                updated.append(obj)
+            for field in fields:
+                if field in record:
+                    setattr(obj, field, to_python(model, field, record[field]))
+            if hasattr(obj, 'updated_at'):
+                obj.updated_at = now
+        model.objects.bulk_create(created, batch_size=IMPORT_CHUNK_SIZE)
+        if updated:
+            update_fields = [field for field in fields if field != key]
+            if hasattr(model, 'updated_at'):
+                update_fields.append('updated_at')
+            model.objects.bulk_update(
+                updated, update_fields, batch_size=IMPORT_CHUNK_SIZE)
+        self.created += len(created)
+        self.updated += len(updated)
+        # bulk-операции не вызывают сигналы (movies.signals): списки и
+        # детальный вывод фильмов, в которых выводятся изменённые записи
+        updated_pks = [obj.pk for obj in updated]
+        cache.invalidate(
+            cache.MOVIES, related_movie_ids(model, updated_pks))
+        if model is Actor:
+            cache.invalidate(cache.ACTORS, updated_pks)
+            search.update_index(Actor, model.objects.filter(
+                name__in=list(records)).values_list('pk', flat=True))
+            images.schedule({
+                obj.image.name for obj in created + updated if obj.image})
+
+    def import_movies(self, records):
+        records = self.unique_records(records, 'url')
+        existing = Movie.objects.in_bulk(list(records), field_name='url')
+        now = timezone.now()
+        created, updated = [], []
+        for url, record in records.items():
+            movie = existing.get(url)
+            if movie is None:
+                movie = Movie(url=url)
+                created.append(movie)
+            else:
+                updated.append(movie)
+            for field in MOVIE_FIELDS[1:] + ('draft',):
+                if field in record:
+                    setattr(movie, field, to_python(Movie, field, record[field]))
+            if 'category' in record:
+                movie.category_id = self.resolve(
+                    self.categories, record['category'], 'категория', url)
+            movie.updated_at = now
+
+        Movie.objects.bulk_create(created, batch_size=IMPORT_CHUNK_SIZE)
+        Movie.objects.bulk_update(
+            updated, MOVIE_FIELDS[1:] + ('draft', 'category', 'updated_at'),
+            batch_size=IMPORT_CHUNK_SIZE)
+        self.created += len(created)
+        self.updated += len(updated)
+
+        # bulk_create в Django 3.2 не возвращает id для SQLite
+        movie_ids = dict(Movie.objects.filter(
+            url__in=list(records)).values_list('url', 'pk'))
+        self.create_missing_actors(records.values())
+        self.write_links(records, movie_ids)
+
+        cache.invalidate(cache.MOVIES, [movie.pk for movie in updated])
+        search.update_index(Movie, movie_ids.values())
+        images.schedule({
+            movie.poster.name for movie in created + updated if movie.poster})
+
+    def create_missing_actors(self, records):
+        names = {
+            name for record in records
+            for field in ('actors', 'directors')
+            for name in record.get(field) or ()
+            if name not in self.actors
+        }
+        if not names:
+            return
+        names = list(names)
+        Actor.objects.bulk_create(
+            [Actor(name=name, description='') for name in names],
+            batch_size=IMPORT_CHUNK_SIZE)
+        created = {}
+        for start in range(0, len(names), IMPORT_CHUNK_SIZE):
+            created.update(Actor.objects.filter(
+                name__in=names[start:start + IMPORT_CHUNK_SIZE],
+            ).order_by('-pk').values_list('name', 'pk'))
+        self.actors.update(created)
+        cache.invalidate(cache.ACTORS)
+        search.update_index(Actor, created.values())
+
+    def write_links(self, records, movie_ids):
+        """Связи M2M из записей заменяют прежние связи фильма"""
+        relations = (
+            ('genres', Movie.genres.through, 'genre_id', self.genres),
+            ('actors', Movie.actors.through, 'actor_id', self.actors),
+            ('directors', Movie.directors.through, 'actor_id', self.actors),
+        )
+        for field, through, column, lookup in relations:
+            replaced = [
+                movie_ids[url] for url, record in records.items()
+                if field in record]
+            if not replaced:
+                continue
+            through.objects.filter(movie_id__in=replaced).delete()
+            links = {}
+            for url, record in records.items():
+                for value in record.get(field) or ():
+                    pk = self.resolve(lookup, value, field, url)
+                    if pk is not None:
+                        links[(movie_ids[url], pk)] = through(
+                            movie_id=movie_ids[url], **{column: pk})
+            through.objects.bulk_create(
+                links.values(), batch_size=IMPORT_CHUNK_SIZE * 2)
+
+    def resolve(self, lookup, value, what, url):
+        if value is None:
+            return None
+        pk = lookup.get(value)
+        if pk is None:
+            self.warn(f'{url}: неизвестное значение {what} "{value}"')
+        return pk
+
+    def warn(self, message):
+        self.warning_count += 1
+        if len(self.warnings) < MAX_WARNINGS:
+            self.warnings.append(message)
+
+    def unique_records(self, records, key):
+        """{ключ: запись}; при повторе ключа в порции - последняя запись"""
+        unique = {}
+        for record in records:
+            value = record.get(key)
+            if not value:
+                self.warn(f'Пропущена запись без поля {key}')
+                continue
+            unique[value] = record
+        return unique
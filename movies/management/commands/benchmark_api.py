@@ -0,0 +1,224 @@
+"""
+Нагрузочный замер API каталога через тестовый клиент Django: задержка
+(p50/p95/p99), кол-во SQL-запросов на запрос и пиковая память (tracemalloc).
+Результат - JSON, который сохраняется как базовый и сравнивается между
+коммитами. Данные для замера - generate_catalogue
+
+python manage.py benchmark_api --output baseline.json
+python manage.py benchmark_api --compare baseline.json
+"""
+import json
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from movies import cache
+from movies.models import Actor, Movie, MovieRating, Rating, RatingStar
+
+# Адреса голосов замера (сеть 198.18.0.0/15 отведена под тесты, RFC 2544)
+BENCHMARK_IP_PREFIX = '198.18.'
+BENCHMARK_USERNAME = 'benchmark-api'
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга"""
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Замер задержки, запросов к БД и памяти эндпоинтов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='кол-во замеряемых запросов на эндпоинт')
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='кол-во запросов прогрева на эндпоинт')
+        parser.add_argument(
+            '--memory-requests', type=int, default=20,
+            help='кол-во запросов для замера пиковой памяти')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='не сбрасывать кэш ответов перед каждым запросом')
+        parser.add_argument(
+            '--host', default='localhost', help='заголовок Host запросов')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='файл для JSON результата')
+        parser.add_argument('--compare', help='JSON базового замера')
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.warm_cache = options['warm_cache']
+        self.vote = 0
+        self.movie_ids = list(Movie.objects.filter(
+            draft=False).values_list('pk', flat=True)[:1000])
+        self.stars = list(RatingStar.objects.values_list('pk', flat=True))
+        if not self.movie_ids or not self.stars:
+            raise CommandError(
+                'Нет опубликованных фильмов или звёзд рейтинга - '
+                'сначала выполните generate_catalogue')
+
+        self.anonymous = Client(HTTP_HOST=options['host'])
+        self.user_client = Client(HTTP_HOST=options['host'])
+        # Временный пользователь: список актёров требует авторизации
+        user = get_user_model().objects.create_user(
+            f'{BENCHMARK_USERNAME}-{time.time_ns()}')
+        self.user_client.force_login(user)
+        try:
+            endpoints = {
+                name: self.measure(
+                    request, options['requests'], options['warmup'],
+                    options['memory_requests'])
+                for name, request in self.get_endpoints().items()
+            }
+        finally:
+            self.user_client.logout()
+            user.delete()
+            self.cleanup_votes()
+
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'vendor': connection.vendor,
+                'requests': options['requests'],
+                'warm_cache': self.warm_cache,
+                'movies': Movie.objects.count(),
+                'actors': Actor.objects.count(),
+                'ratings': Rating.objects.count(),
+            },
+            'endpoints': endpoints,
+        }
+        result = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(result)
+        else:
+            self.stdout.write(result)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                self.compare(json.load(file), report)
+
+    def get_endpoints(self):
+        """
+        Эндпоинты замера: name -> функция, выполняющая один запрос.
+        Кэш ответов сбрасывается до начала замера запроса
+        """
+        def movie_list():
+            self.reset_cache(cache.MOVIES)
+            return self.anonymous.get('/api/v1/movie/')
+
+        def movie_detail():
+            pk = self.rnd.choice(self.movie_ids)
+            self.reset_cache(cache.MOVIES, pk)
+            return self.anonymous.get(f'/api/v1/movie/{pk}/')
+
+        def actor_list():
+            self.reset_cache(cache.ACTORS)
+            return self.user_client.get('/api/v1/actor/')
+
+        def rating_create():
+            # Новый голос с нового адреса: update_or_create + агрегат
+            self.vote += 1
+            return self.anonymous.post(
+                '/api/v1/rating/',
+                {'star': self.rnd.choice(self.stars),
+                 'movie': self.rnd.choice(self.movie_ids)},
+                REMOTE_ADDR=(f'{BENCHMARK_IP_PREFIX}'
+                             f'{self.vote >> 8 & 255}.{self.vote & 255}'))
+
+        return {
+            'movie-list': movie_list,
+            'movie-detail': movie_detail,
+            'actor-list': actor_list,
+            'rating-create': rating_create,
+        }
+
+    def reset_cache(self, namespace, pk=None):
+        if not self.warm_cache:
+            cache.invalidate(namespace, [pk] if pk is not None else None)
+
+    def measure(self, request, count, warmup, memory_requests):
+        for _ in range(warmup):
+            request()
+
+        latencies, queries, statuses = [], [], {}
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = request()
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context))
+            status = str(response.status_code)
+            statuses[status] = statuses.get(status, 0) + 1
+
+        # Память отдельно: tracemalloc замедляет выполнение
+        tracemalloc.start()
+        try:
+            peak = 0
+            for _ in range(memory_requests):
+                tracemalloc.reset_peak()
+                request()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'status': statuses,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'mean': round(sum(latencies) / len(latencies), 3),
+                'max': round(max(latencies), 3),
+            },
+            'queries': {
+                'mean': round(sum(queries) / len(queries), 2),
+                'max': max(queries),
+            },
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def cleanup_votes(self):
+        """Удалить голоса замера и пересчитать агрегаты этих фильмов"""
+        votes = Rating.objects.filter(ip__startswith=BENCHMARK_IP_PREFIX)
+        movie_ids = list(votes.values_list('movie_id', flat=True).distinct())
+        if movie_ids:
+            votes.delete()
+            MovieRating.rebuild(movie_ids=movie_ids)
+            cache.invalidate(cache.MOVIES, movie_ids)
+
+    def compare(self, baseline, report):
+        """Таблица изменений относительно базового замера"""
+        metrics = (
+            ('latency_ms', 'p50'), ('latency_ms', 'p95'),
+            ('latency_ms', 'p99'), ('queries', 'mean'),
+            ('peak_memory_kb', None),
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Сравнение с замером от {baseline["meta"]["created"]}'))
+        for name, current in report['endpoints'].items():
+            previous = baseline['endpoints'].get(name)
+            if previous is None:
+                continue
+            self.stdout.write(self.style.MIGRATE_LABEL(f'  {name}'))
+            for group, key in metrics:
+                old, new = previous[group], current[group]
+                if key is not None:
+                    old, new = old[key], new[key]
+                label = f'{group}.{key}' if key else group
+                delta = (new - old) / old * 100 if old else 0
+                style = self.style.ERROR if delta > 5 else (
+                    self.style.SUCCESS if delta < -5 else str)
+                self.stdout.write(
+                    f'    {label:<16} {old:>10} -> {new:<10} '
+                    + style(f'{delta:+.1f}%'))
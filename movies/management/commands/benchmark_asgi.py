@@ -0,0 +1,245 @@
+"""
+Замер пропускной способности и задержки чтения каталога под uvicorn:
+WSGI (синхронные views), ASGI с синхронными views и ASGI с
+асинхронными вариантами (movies.views_async) при разной конкурентности.
+Серверы запускаются отдельными процессами на время замера, нагрузка -
+asyncio-клиент с keep-alive соединением на каждого клиента.
+
+Детальный вывод перебирает разные фильмы (первое обращение к каждому -
+мимо кэша ответов), список повторяет один URL и при кэше ответов
+замеряет чтение из кэша. Для замера работы с БД запускайте серверы с
+--settings, где MOVIES_CACHE_ALIAS указывает на DummyCache.
+Нужен uvicorn (pip install uvicorn)
+
+python manage.py benchmark_asgi --concurrency 1,8,32 --output asgi.json
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from movies.models import Movie
+from .benchmark_api import BENCHMARK_USERNAME, percentile
+
+# Эндпоинт -> (синхронный путь, асинхронный путь); {pk} - id фильма
+ENDPOINTS = {
+    'movie-list': ('/api/v1/movie/', '/api/v1/async/movie/'),
+    'movie-detail': ('/api/v1/movie/{pk}/', '/api/v1/async/movie/{pk}/'),
+    'actor-list': ('/api/v1/actor/', '/api/v1/async/actor/'),
+}
+# Режим -> (приложение uvicorn, интерфейс, вариант views)
+MODES = {
+    'wsgi': ('django_movie_rest.wsgi:application', 'wsgi', 0),
+    'asgi-sync': ('django_movie_rest.asgi:application', 'asgi3', 0),
+    'asgi-async': ('django_movie_rest.asgi:application', 'asgi3', 1),
+}
+SERVER_START_TIMEOUT = 30
+
+
+async def fetch(reader, writer, path, headers):
+    """GET по keep-alive соединению: (статус, тело)"""
+    request = f'GET {path} HTTP/1.1\r\n{headers}\r\n'
+    writer.write(request.encode('latin-1'))
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    length = None
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    if length is None:
+        raise CommandError(f'{path}: ответ без Content-Length')
+    await reader.readexactly(length)
+    return status
+
+
+async def run_load(port, paths, concurrency, headers):
+    """
+    concurrency клиентов выполняют запросы paths по очереди.
+    Возвращает (задержки в секундах, кол-во ошибок, общее время)
+    """
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    latencies, errors = [], [0]
+
+    async def client():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while True:
+                try:
+                    path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                status = await fetch(reader, writer, path, headers)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors[0] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors[0], time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Сравнить WSGI и ASGI (синхронные и асинхронные views) под uvicorn'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', default='1,8,32',
+            help='уровни конкурентности через запятую')
+        parser.add_argument(
+            '--requests', type=int, default=400,
+            help='кол-во запросов на эндпоинт и уровень конкурентности')
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='кол-во запросов прогрева на эндпоинт')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='кол-во процессов uvicorn')
+        parser.add_argument(
+            '--endpoints', default=','.join(ENDPOINTS),
+            help='эндпоинты через запятую')
+        parser.add_argument(
+            '--modes', default=','.join(MODES), help='режимы через запятую')
+        parser.add_argument(
+            '--host', default='localhost', help='заголовок Host запросов')
+        parser.add_argument('--output', help='файл для JSON результата')
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError('Нужен uvicorn: pip install uvicorn')
+        levels = [int(value) for value in options['concurrency'].split(',')]
+        endpoints = options['endpoints'].split(',')
+        modes = options['modes'].split(',')
+        for name in endpoints:
+            if name not in ENDPOINTS:
+                raise CommandError(f'Неизвестный эндпоинт: {name}')
+        for name in modes:
+            if name not in MODES:
+                raise CommandError(f'Неизвестный режим: {name}')
+        self.movie_ids = list(Movie.objects.filter(
+            draft=False).values_list('pk', flat=True)[:10000])
+        if not self.movie_ids:
+            raise CommandError(
+                'Нет опубликованных фильмов - сначала выполните '
+                'generate_catalogue')
+
+        # Временный пользователь с сессией: список актёров требует
+        # авторизации, сессия в БД общая с процессами сервера
+        user = get_user_model().objects.create_user(
+            f'{BENCHMARK_USERNAME}-{time.time_ns()}')
+        client = Client()
+        client.force_login(user)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.headers = (
+            f'Host: {options["host"]}\r\n'
+            f'Accept: application/json\r\n'
+            f'Cookie: {settings.SESSION_COOKIE_NAME}={session}\r\n')
+        results = {}
+        try:
+            for mode in modes:
+                with self.server(mode, options['port'], options['workers']):
+                    for name in endpoints:
+                        for level in levels:
+                            results.setdefault(name, {}).setdefault(
+                                mode, {})[level] = self.measure(
+                                    mode, name, level, options)
+        finally:
+            client.logout()
+            user.delete()
+
+        self.print_results(results, modes, levels)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Результат записан в {options["output"]}')
+
+    @contextmanager
+    def server(self, mode, port, workers):
+        """Процесс uvicorn на время замера режима"""
+        app, interface, _ = MODES[mode]
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', app,
+             '--interface', interface, '--host', '127.0.0.1',
+             '--port', str(port), '--workers', str(workers),
+             '--log-level', 'warning', '--no-access-log'],
+            env=env)
+        try:
+            self.wait_for_port(port, process)
+            yield
+        finally:
+            process.terminate()
+            process.wait()
+
+    @staticmethod
+    def wait_for_port(port, process):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('Сервер uvicorn завершился при запуске')
+            try:
+                socket.create_connection(('127.0.0.1', port), 0.5).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Сервер не ответил за {SERVER_START_TIMEOUT} с')
+
+    def get_paths(self, mode, name, count, offset=0):
+        template = ENDPOINTS[name][MODES[mode][2]]
+        return [
+            template.format(
+                pk=self.movie_ids[(offset + index) % len(self.movie_ids)])
+            for index in range(count)]
+
+    def measure(self, mode, name, level, options):
+        # Прогрев и замер - разные фильмы; у замеров разных уровней тоже
+        offset = options['warmup'] + level * options['requests']
+        asyncio.run(run_load(
+            options['port'], self.get_paths(mode, name, options['warmup']),
+            level, self.headers))
+        latencies, errors, elapsed = asyncio.run(run_load(
+            options['port'],
+            self.get_paths(mode, name, options['requests'], offset),
+            level, self.headers))
+        self.stdout.write(f'{name} {mode} x{level}: {elapsed:.2f} с')
+        return {
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'errors': errors,
+        }
+
+    def print_results(self, results, modes, levels):
+        self.stdout.write('')
+        self.stdout.write(
+            f'{"эндпоинт":<14}{"режим":<12}{"клиентов":>9}{"rps":>9}'
+            f'{"p50 мс":>9}{"p95 мс":>9}{"p99 мс":>9}{"ошибок":>8}')
+        for name, by_mode in results.items():
+            for mode in modes:
+                for level in levels:
+                    row = by_mode[mode][level]
+                    self.stdout.write(
+                        f'{name:<14}{mode:<12}{level:>9}{row["rps"]:>9}'
+                        f'{row["p50_ms"]:>9}{row["p95_ms"]:>9}'
+                        f'{row["p99_ms"]:>9}{row["errors"]:>8}')
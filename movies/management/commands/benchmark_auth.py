@@ -0,0 +1,138 @@
+"""
+Замер аутентифицированных запросов к MovieListView: классы аутентификации
+DRF и Simple JWT против movies.authentication (кэш проверки учётных
+данных). Для каждой схемы (Basic, токен, JWT) - запросов в секунду,
+задержка p50/p95 и кол-во SQL-запросов на запрос.
+Данные для замера - generate_catalogue
+
+python manage.py benchmark_auth --requests 200 --output auth.json
+"""
+import base64
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.authentication import (
+    BasicAuthentication, TokenAuthentication, )
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from movies import authentication
+from movies.views import MovieListView
+from .benchmark_api import BENCHMARK_USERNAME, percentile
+
+# Схема -> (класс без кэша, класс с кэшем)
+SCHEMES = {
+    'basic': (BasicAuthentication, authentication.CachedBasicAuthentication),
+    'token': (TokenAuthentication, authentication.CachedTokenAuthentication),
+    'jwt': (JWTAuthentication, authentication.CachedJWTAuthentication),
+}
+BENCHMARK_PASSWORD = 'benchmark-auth-password'
+
+
+class Command(BaseCommand):
+    help = 'Замер MovieListView с аутентификацией без кэша и с кэшем проверки'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='кол-во замеряемых запросов на схему и вариант')
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='кол-во запросов прогрева на схему и вариант')
+        parser.add_argument(
+            '--schemes', default=','.join(SCHEMES),
+            help='схемы через запятую')
+        parser.add_argument(
+            '--host', default='localhost', help='заголовок Host запросов')
+        parser.add_argument('--output', help='файл для JSON результата')
+
+    def handle(self, *args, **options):
+        schemes = options['schemes'].split(',')
+        for name in schemes:
+            if name not in SCHEMES:
+                raise CommandError(f'Неизвестная схема: {name}')
+
+        user = get_user_model().objects.create_user(
+            f'{BENCHMARK_USERNAME}-{time.time_ns()}',
+            password=BENCHMARK_PASSWORD)
+        token = Token.objects.create(user=user)
+        self.headers = {
+            'basic': 'Basic ' + self.basic_credentials(user.get_username()),
+            'token': f'Token {token.key}',
+            'jwt': f'Bearer {AccessToken.for_user(user)}',
+        }
+        self.factory = RequestFactory()
+        results = {}
+        try:
+            for name in schemes:
+                for variant, auth_class in zip(('drf', 'cached'),
+                                               SCHEMES[name]):
+                    authentication.get_verification_cache().clear()
+                    results.setdefault(name, {})[variant] = self.measure(
+                        name, auth_class, options)
+        finally:
+            user.delete()
+
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Результат записан в {options["output"]}')
+
+    @staticmethod
+    def basic_credentials(username):
+        raw = f'{username}:{BENCHMARK_PASSWORD}'.encode()
+        return base64.b64encode(raw).decode()
+
+    def request(self, view, name, host):
+        request = self.factory.get(
+            '/api/v1/movie/', HTTP_HOST=host,
+            HTTP_AUTHORIZATION=self.headers[name])
+        response = view(request)
+        response.render()
+        if response.status_code != 200:
+            raise CommandError(
+                f'{name}: ответ {response.status_code} {response.content!r}')
+        if not request.user.is_authenticated:
+            raise CommandError(f'{name}: запрос не аутентифицирован')
+
+    def measure(self, name, auth_class, options):
+        view = MovieListView.as_view(authentication_classes=(auth_class,))
+        for _ in range(options['warmup']):
+            self.request(view, name, options['host'])
+
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(options['requests']):
+                request_start = time.perf_counter()
+                self.request(view, name, options['host'])
+                latencies.append(time.perf_counter() - request_start)
+            elapsed = time.perf_counter() - start
+        return {
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'queries': round(len(queries) / len(latencies), 1),
+        }
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"схема":<8}{"вариант":<9}{"rps":>9}{"p50 мс":>9}'
+            f'{"p95 мс":>9}{"SQL":>6}')
+        for name, variants in results.items():
+            for variant, row in variants.items():
+                self.stdout.write(
+                    f'{name:<8}{variant:<9}{row["rps"]:>9}'
+                    f'{row["p50_ms"]:>9}{row["p95_ms"]:>9}'
+                    f'{row["queries"]:>6}')
+            speedup = variants['cached']['rps'] / variants['drf']['rps']
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: с кэшем быстрее в {speedup:.1f} раза'))
@@ -0,0 +1,106 @@
+"""
+Сравнение вывода списков фильмов и актёров: ModelSerializer + JSONRenderer
+против FastListSerializer + FastJSONRenderer (mixins.FastListMixin).
+Время - мс на 1000 строк: выборка и сериализация, рендеринг JSON, всего.
+Вывод обоих способов сверяется побайтно
+
+python manage.py benchmark_serializers --rows 1000 --repeat 20
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from rest_framework.renderers import JSONRenderer
+
+from movies.mixins import optimize_queryset
+from movies.serializers import (
+    ActorFastListSerializer, ActorListSerializer, MovieFastListSerializer,
+    MovieListSerializer, )
+from movies.service import FastJSONRenderer, orjson
+from movies.api import ActorModelViewSet
+from movies.views_set import MovieViewSet
+
+# Список -> (запрос view, сериализатор DRF, быстрый сериализатор, порядок)
+LISTS = {
+    'movies': (MovieViewSet.queryset, MovieListSerializer,
+               MovieFastListSerializer, ('title', 'id')),
+    'actors': (ActorModelViewSet.queryset, ActorListSerializer,
+               ActorFastListSerializer, ('name', 'id')),
+}
+
+
+class Command(BaseCommand):
+    help = 'Замер быстрого вывода списков фильмов и актёров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=1000, help='строк в списке')
+        parser.add_argument(
+            '--repeat', type=int, default=20, help='кол-во повторов')
+        parser.add_argument(
+            '--host', default='localhost', help='заголовок Host запроса')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/', HTTP_HOST=options['host'])
+        context = {'request': request}
+        rows = options['rows']
+        self.stdout.write(
+            f'JSON: {"orjson" if orjson else "json (orjson не установлен)"}')
+        self.stdout.write(
+            f'{"список":<8}{"способ":<8}{"сериализация":>14}'
+            f'{"рендеринг":>11}{"всего":>9}  мс на 1000 строк')
+
+        for name, (queryset, serializer_class, fast_class,
+                   ordering) in LISTS.items():
+            queryset = queryset.order_by(*ordering)
+
+            def drf():
+                objects = list(
+                    optimize_queryset(queryset, serializer_class)[:rows])
+                return serializer_class(
+                    objects, many=True, context=context).data
+
+            def fast():
+                values = fast_class.prepare_queryset(queryset)[:rows]
+                return fast_class(values, context=context).data
+
+            results = {
+                'drf': self.measure(drf, JSONRenderer(), options['repeat']),
+                'fast': self.measure(
+                    fast, FastJSONRenderer(), options['repeat']),
+            }
+            if results['drf'][1] != results['fast'][1]:
+                raise CommandError(f'{name}: вывод отличается')
+            count = len(results['drf'][2])
+            if not count:
+                raise CommandError(
+                    f'{name}: нет данных - выполните generate_catalogue')
+
+            for method, (times, _, _) in results.items():
+                serialize, render = (
+                    statistics.median(values) * 1000 / count * 1000
+                    for values in times)
+                self.stdout.write(
+                    f'{name:<8}{method:<8}{serialize:>14.1f}{render:>11.1f}'
+                    f'{serialize + render:>9.1f}')
+            drf_total = sum(map(statistics.median, results['drf'][0]))
+            fast_total = sum(map(statistics.median, results['fast'][0]))
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: строк {count}, вывод совпадает, '
+                f'быстрее в {drf_total / fast_total:.1f} раза'))
+
+    @staticmethod
+    def measure(build, renderer, repeat):
+        """([времена сериализации], [времена рендеринга]), JSON, данные"""
+        serialize_times, render_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = build()
+            middle = time.perf_counter()
+            content = renderer.render(data, 'application/json')
+            end = time.perf_counter()
+            serialize_times.append(middle - start)
+            render_times.append(end - middle)
+        return (serialize_times, render_times), content, data
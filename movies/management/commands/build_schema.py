@@ -0,0 +1,58 @@
+"""
+Сборка схемы OpenAPI в файлы (JSON и YAML), которые отдают
+/swagger.json и /swagger.yaml (django_movie_rest.yasg). Запускать при
+сборке/деплое после изменения API; работающие процессы читают файлы при
+первом запросе схемы, поэтому после сборки их нужно перезапустить.
+Файлы заменяются атомарно
+
+python manage.py build_schema
+python manage.py build_schema --output-dir /srv/movie/openapi
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from django_movie_rest.yasg import generate_schema, get_schema_path
+
+
+class Command(BaseCommand):
+    help = 'Собрать схему OpenAPI в файлы JSON и YAML'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir', type=Path,
+            help='каталог файлов (по умолчанию - OPENAPI_SCHEMA_DIR)')
+
+    def handle(self, *args, **options):
+        directory = options['output_dir'] or settings.OPENAPI_SCHEMA_DIR
+        if not directory:
+            raise CommandError('Не задан OPENAPI_SCHEMA_DIR или --output-dir')
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        start = time.perf_counter()
+        documents = generate_schema()
+        self.stdout.write(
+            f'Схема построена за {time.perf_counter() - start:.2f} с')
+        for extension, content in documents.items():
+            path = get_schema_path(extension, directory)
+            self.write(path, content)
+            self.stdout.write(f'{path}: {len(content)} байт')
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    @staticmethod
+    def write(path, content):
+        """Через временный файл: процесс не прочитает файл наполовину"""
+        descriptor, temporary = tempfile.mkstemp(
+            dir=path.parent, prefix=f'.{path.name}.')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(content)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
@@ -0,0 +1,134 @@
+"""
+Планы выполнения (EXPLAIN) запросов API до и после индексов из
+миграции 0007_api_query_indexes
+
+Всё выполняется в транзакции, которая откатывается: при --seed данные
+генерируются только на время замера, индексы удаляются только для плана
+'до'. Текущая БД не изменяется
+
+python manage.py explain_queries
+python manage.py explain_queries --seed 20000 --ratings 100000
+"""
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from movies.models import Genre, Movie, Rating
+from movies.seed import (
+    seed_dictionaries, seed_movies, seed_movie_genres, seed_ratings, )
+
+# Индексы под запросы API (см. Meta.indexes/constraints моделей)
+INDEXES = (
+    (Movie, 'movies_movie_pub_title_idx'),
+    (Movie, 'movies_movie_pub_year_idx'),
+    (Genre, 'movies_genre_name_idx'),
+)
+CONSTRAINTS = (
+    (Rating, 'movies_rating_ip_movie_uniq'),
+)
+
+
+class Rollback(Exception):
+    """Откат транзакции замера"""
+
+
+def get_queries():
+    """Запросы в том виде, в каком их строят views и сериализаторы"""
+    published = Movie.objects.filter(draft=False)
+    movie_id = published.values_list('pk', flat=True).first() or 0
+    return {
+        'Список фильмов (страница)': published.annotate(
+            middle_star=F('rating_aggregate__middle_star'),
+        ).order_by('title', 'id')[:20],
+        'Фильтр по годам': published.filter(
+            year__gte=2000, year__lte=2005).order_by('title', 'id')[:20],
+        'Фильтр по жанрам': published.filter(
+            genres__name__in=['Боевик', 'Драма']).order_by('title', 'id')[:20],
+        'Голос клиента (update_or_create)': Rating.objects.filter(
+            ip='10.0.0.1', movie_id=movie_id),
+        'Голоса клиента на странице': Rating.objects.filter(
+            ip='10.0.0.1', movie_id__in=[movie_id, movie_id + 1]),
+    }
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN запросов API до и после индексов (без изменения БД)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='кол-во сгенерированных фильмов на время замера')
+        parser.add_argument(
+            '--ratings', type=int, default=0,
+            help='кол-во сгенерированных голосов на время замера')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['seed'], options['ratings'])
+                after = self.explain('after')
+                self.drop_indexes()
+                before = self.explain('before')
+                raise Rollback
+        except Rollback:
+            pass
+
+        for name in after:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(self.style.WARNING('  до:'))
+            self.stdout.write(self.indent(before[name]))
+            self.stdout.write(self.style.SUCCESS('  после:'))
+            self.stdout.write(self.indent(after[name]))
+
+    def seed(self, movies, ratings):
+        if not movies:
+            return
+        rnd = random.Random(0)
+        categories, genres = seed_dictionaries()
+        movie_ids = seed_movies(movies, categories, rnd=rnd)
+        seed_movie_genres(movie_ids, genres, rnd=rnd)
+        if ratings:
+            seed_ratings(movie_ids, ratings, rnd=rnd)
+        # Статистика для планировщика
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def explain(self, tag):
+        """
+        План каждого запроса. Метка tag в комментарии делает текст SQL
+        уникальным: иначе SQLite возьмёт из кэша соединения план,
+        подготовленный до удаления индексов
+        """
+        plans = {}
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            for name, queryset in get_queries().items():
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'{prefix} {sql} /* {tag} */', params)
+                plans[name] = '\n'.join(
+                    ' '.join(str(value) for value in row)
+                    for row in cursor.fetchall())
+        return plans
+
+    def drop_indexes(self):
+        quote = connection.ops.quote_name
+        statements = [f'DROP INDEX {quote(name)}' for _, name in INDEXES]
+        for model, name in CONSTRAINTS:
+            if connection.vendor == 'sqlite':
+                # В SQLite ограничение - часть CREATE TABLE, его индекс
+                # не удаляется без пересоздания таблицы
+                self.stdout.write(self.style.NOTICE(
+                    f'{name}: в SQLite не удаляется, план "до" совпадёт'))
+                continue
+            statements.append(
+                f'ALTER TABLE {quote(model._meta.db_table)} '
+                f'DROP CONSTRAINT {quote(name)}')
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    @staticmethod
+    def indent(text):
+        return '\n'.join(f'    {line}' for line in text.splitlines())
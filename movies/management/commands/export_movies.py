@@ -0,0 +1,37 @@
+"""
+Выгрузка опубликованных фильмов в NDJSON или CSV (movies.export)
+
+python manage.py export_movies > movies.ndjson
+python manage.py export_movies --format csv --output movies.csv
+"""
+import sys
+
+from django.core.management.base import BaseCommand
+
+from movies.export import CONTENT_TYPES, EXPORT_CHUNK_SIZE, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить опубликованные фильмы в NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=tuple(CONTENT_TYPES), default='ndjson')
+        parser.add_argument('--output', help='файл (по умолчанию stdout)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='кол-во фильмов в одной выборке из БД')
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['format'], options['chunk_size'])
+        if not options['output']:
+            sys.stdout.writelines(lines)
+            return
+        count = -1 if options['format'] == 'csv' else 0
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as file:
+            for line in lines:
+                file.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено фильмов: {count} -> {options["output"]}'))
@@ -0,0 +1,81 @@
+"""
+Генерация синтетического каталога для нагрузочных замеров
+(фильмы, актёры, жанры, голоса, ветки отзывов) через bulk_create пачками
+
+python manage.py generate_catalogue
+python manage.py generate_catalogue --movies 100000 --ratings 1000000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies import cache, search
+from movies.seed import (
+    seed_dictionaries, seed_movies, seed_actors, seed_movie_people,
+    seed_movie_genres, seed_ratings, seed_reviews, )
+
+
+class Command(BaseCommand):
+    help = 'Сгенерировать синтетические данные каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=100000)
+        parser.add_argument('--actors', type=int, default=20000)
+        parser.add_argument('--ratings', type=int, default=1000000)
+        parser.add_argument(
+            '--review-movies', type=int, default=1000,
+            help='кол-во фильмов с ветками отзывов')
+        parser.add_argument(
+            '--review-depth', type=int, default=8,
+            help='глубина веток отзывов')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--seed', type=int, default=0, help='seed генератора случайных')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        categories, genres = self.step(
+            'Категории и жанры', seed_dictionaries)
+        movie_ids = self.step(
+            'Фильмы', seed_movies, options['movies'], categories,
+            batch_size=batch_size, rnd=rnd)
+        actor_ids = self.step(
+            'Актёры', seed_actors, options['actors'],
+            batch_size=batch_size, rnd=rnd)
+        if movie_ids and actor_ids:
+            self.step(
+                'Актёры и режиссёры фильмов', seed_movie_people,
+                movie_ids, actor_ids, batch_size=batch_size * 5, rnd=rnd)
+        if movie_ids:
+            self.step(
+                'Жанры фильмов', seed_movie_genres, movie_ids, genres,
+                batch_size=batch_size * 5, rnd=rnd)
+        if movie_ids and options['ratings']:
+            self.step(
+                'Голоса и агрегаты рейтинга', seed_ratings, movie_ids,
+                options['ratings'], batch_size=batch_size * 5, rnd=rnd)
+        review_movies = movie_ids[:options['review_movies']]
+        if review_movies:
+            total = self.step(
+                'Ветки отзывов', seed_reviews, review_movies,
+                depth=options['review_depth'], batch_size=batch_size * 5,
+                rnd=rnd)
+            self.stdout.write(f'  отзывов: {total}')
+
+        # bulk_create не вызывает сигналы - сброс кэша каталога и
+        # перестройка поискового индекса
+        cache.invalidate(cache.MOVIES)
+        cache.invalidate(cache.ACTORS)
+        self.step('Поисковый индекс', search.rebuild)
+
+    def step(self, title, func, *args, **kwargs):
+        self.stdout.write(f'{title}...', ending='')
+        self.stdout.flush()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write(self.style.SUCCESS(
+            f' {time.perf_counter() - start:.1f} c'))
+        return result
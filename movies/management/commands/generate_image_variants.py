@@ -0,0 +1,82 @@
+"""
+Уменьшенные копии уже загруженных изображений (movies.images):
+постеры фильмов, фото актёров, кадры. Файлы обрабатываются в пуле
+процессов, готовые копии пропускаются (--force - пересоздать).
+Кэш ответов с изображениями, для которых записаны копии, сбрасывается
+(сигнал images.variants_generated)
+
+python manage.py generate_image_variants [--workers 4] [--force]
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from movies import images
+
+# Имён оригиналов в одном сигнале variants_generated (IN в запросе)
+SIGNAL_CHUNK_SIZE = 500
+
+
+def init_worker(settings_module):
+    # Для пула со способом запуска spawn (Windows, macOS)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def generate(name, force):
+    """(имя, кол-во файлов, ошибка) - исключения не передаются из процесса"""
+    try:
+        return name, images.generate_variants(name, force=force), None
+    except Exception as exc:
+        return name, 0, f'{type(exc).__name__}: {exc}'
+
+
+class Command(BaseCommand):
+    help = 'Создать уменьшенные копии загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Кол-во процессов (по умолчанию - кол-во CPU)')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать существующие копии')
+
+    def handle(self, *args, **options):
+        names = set()
+        for label, field in images.IMAGE_FIELDS.items():
+            queryset = apps.get_model(label)._default_manager.exclude(
+                **{field: ''}).exclude(**{f'{field}__isnull': True})
+            names.update(queryset.values_list(field, flat=True).distinct())
+        names = sorted(names)
+        self.stdout.write(f'Изображений: {len(names)}')
+
+        written = failed = 0
+        generated = []
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE')
+        with ProcessPoolExecutor(
+                max_workers=max(options['workers'], 1),
+                initializer=init_worker,
+                initargs=(settings_module,)) as executor:
+            futures = [
+                executor.submit(generate, name, options['force'])
+                for name in names]
+            for future in as_completed(futures):
+                name, count, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                elif count:
+                    generated.append(name)
+                written += count
+
+        for start in range(0, len(generated), SIGNAL_CHUNK_SIZE):
+            images.variants_generated.send(
+                sender=None,
+                names=generated[start:start + SIGNAL_CHUNK_SIZE])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано файлов: {written}, ошибок: {failed}'))
@@ -0,0 +1,120 @@
+"""
+Импорт каталога из NDJSON/CSV (movies.importer): фильмы, актёры, жанры,
+категории. Файл обрабатывается порциями; после каждой порции номер
+записи сохраняется в файл состояния, повторный запуск продолжает с него
+
+python manage.py import_catalogue genres.csv --kind genres
+python manage.py import_catalogue movies.ndjson --kind movies
+python manage.py import_catalogue movies.ndjson --kind movies --restart
+"""
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.importer import (
+    CatalogueImporter, CatalogueImportError, FORMATS, IMPORT_CHUNK_SIZE,
+    KINDS, read_records, )
+
+
+class Command(BaseCommand):
+    help = 'Импортировать фильмы, актёров, жанры или категории из файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл NDJSON или CSV')
+        parser.add_argument('--kind', choices=KINDS, required=True)
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='формат файла (по умолчанию - по расширению)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+            help='записей в одной транзакции (SQLite: не больше 999)')
+        parser.add_argument(
+            '--state-file',
+            help='файл состояния (по умолчанию <path>.import-state)')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='начать сначала, игнорируя сохранённое состояние')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}')
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson')
+        state_path = options['state_file'] or f'{path}.import-state'
+        signature = self.get_signature(path, options['kind'])
+
+        done = 0
+        if not options['restart']:
+            done = self.load_state(state_path, signature)
+            if done:
+                self.stdout.write(f'Продолжение с записи {done + 1}')
+
+        try:
+            importer = CatalogueImporter(options['kind'])
+            records = islice(read_records(path, file_format), done, None)
+            start = time.perf_counter()
+            imported = 0
+            # В терминале прогресс обновляется в одной строке
+            tty = self.stdout.isatty()
+            prefix, ending = ('\r', '') if tty else ('', '\n')
+            while True:
+                chunk = list(islice(records, options['chunk_size']))
+                if not chunk:
+                    break
+                importer.import_chunk(chunk)
+                done += len(chunk)
+                imported += len(chunk)
+                self.save_state(state_path, signature, done)
+                rate = imported / (time.perf_counter() - start)
+                self.stdout.write(
+                    f'{prefix}Записей: {done} ({rate:.0f}/c), создано '
+                    f'{importer.created}, обновлено {importer.updated}',
+                    ending=ending)
+                self.stdout.flush()
+        except CatalogueImportError as exc:
+            raise CommandError(exc) from exc
+
+        if tty:
+            self.stdout.write('')
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        for warning in importer.warnings:
+            self.stderr.write(self.style.WARNING(warning))
+        if importer.warning_count > len(importer.warnings):
+            self.stderr.write(self.style.WARNING(
+                f'... всего предупреждений: {importer.warning_count}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершён: создано {importer.created}, '
+            f'обновлено {importer.updated}'))
+
+    @staticmethod
+    def get_signature(path, kind):
+        """Состояние действительно, только если файл не менялся"""
+        stat = os.stat(path)
+        return {
+            'path': os.path.abspath(path), 'kind': kind,
+            'size': stat.st_size, 'mtime': stat.st_mtime,
+        }
+
+    @staticmethod
+    def load_state(state_path, signature):
+        try:
+            with open(state_path, encoding='utf-8') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return 0
+        if state.get('signature') != signature:
+            return 0
+        return state.get('done', 0)
+
+    @staticmethod
+    def save_state(state_path, signature, done):
+        # Запись через временный файл - состояние не повреждается при сбое
+        temp_path = f'{state_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'signature': signature, 'done': done}, file)
+        os.replace(temp_path, state_path)
@@ -0,0 +1,117 @@
+"""
+Удаление устаревших записей аутентификации небольшими пачками:
+истёкшие сессии, токены OAuth2 (по правилам oauth2_provider.clear_expired)
+и старые nonce social_django. Каждая пачка - отдельный DELETE по списку
+id, между пачками - пауза, поэтому таблица не блокируется надолго и
+команду можно запускать по расписанию на работающем сервере
+
+python manage.py purge_expired
+python manage.py purge_expired --only sessions --batch-size 1000
+"""
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+TARGETS = ('sessions', 'oauth2', 'nonces')
+
+
+def purge(queryset, batch_size, pause):
+    """Удалить записи queryset пачками, вернуть кол-во удалённых"""
+    model = queryset.model
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        _, counts = model._default_manager.filter(pk__in=pks).delete()
+        deleted += counts.get(model._meta.label, 0)
+        if len(pks) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def expired_sessions(now):
+    return [('сессии', Session.objects.filter(expire_date__lt=now))]
+
+
+def expired_oauth2_tokens(now):
+    from oauth2_provider.models import (
+        get_access_token_model, get_grant_model, get_refresh_token_model, )
+    from oauth2_provider.settings import oauth2_settings
+
+    access_tokens = get_access_token_model()._default_manager
+    refresh_tokens = get_refresh_token_model()._default_manager
+    querysets = []
+    lifetime = oauth2_settings.REFRESH_TOKEN_EXPIRE_SECONDS
+    if lifetime:
+        if not isinstance(lifetime, timedelta):
+            lifetime = timedelta(seconds=lifetime)
+        refresh_expire_at = now - lifetime
+        querysets += [
+            ('отозванные refresh-токены OAuth2',
+             refresh_tokens.filter(revoked__lt=refresh_expire_at)),
+            ('истёкшие refresh-токены OAuth2', refresh_tokens.filter(
+                access_token__expires__lt=refresh_expire_at)),
+        ]
+    querysets += [
+        ('истёкшие access-токены OAuth2', access_tokens.filter(
+            refresh_token__isnull=True, expires__lt=now)),
+        ('истёкшие коды OAuth2',
+         get_grant_model()._default_manager.filter(expires__lt=now)),
+    ]
+    return querysets
+
+
+def stale_nonces(now):
+    from social_django.models import Nonce
+
+    # timestamp - время Unix в секундах
+    oldest = int(now.timestamp()) - settings.PURGE_NONCE_MAX_AGE
+    return [('nonce social auth', Nonce.objects.filter(timestamp__lt=oldest))]
+
+
+# Цель -> (приложение, функция: время -> [(название, queryset)])
+SOURCES = {
+    'sessions': ('django.contrib.sessions', expired_sessions),
+    'oauth2': ('oauth2_provider', expired_oauth2_tokens),
+    'nonces': ('social_django', stale_nonces),
+}
+
+
+class Command(BaseCommand):
+    help = 'Удалить истёкшие сессии, токены OAuth2 и nonce пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only', action='append', choices=TARGETS,
+            help='что удалять (можно указать несколько раз, '
+                 'по умолчанию - всё)')
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PURGE_BATCH_SIZE,
+            help='записей в одном DELETE')
+        parser.add_argument(
+            '--pause', type=float, default=settings.PURGE_BATCH_PAUSE,
+            help='пауза между пачками, секунды')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        now = timezone.now()
+        for target in options['only'] or TARGETS:
+            app, get_querysets = SOURCES[target]
+            if not apps.is_installed(app):
+                self.stdout.write(f'{target}: приложение {app} не установлено')
+                continue
+            for title, queryset in get_querysets(now):
+                start = time.perf_counter()
+                deleted = purge(
+                    queryset, options['batch_size'], options['pause'])
+                self.stdout.write(
+                    f'{title}: удалено {deleted} '
+                    f'за {time.perf_counter() - start:.2f} с')
+        self.stdout.write(self.style.SUCCESS('Готово'))
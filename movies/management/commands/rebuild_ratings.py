@@ -0,0 +1,27 @@
+"""
+Пересчёт агрегированного рейтинга фильмов (MovieRating) по таблице Rating.
+Нужен после ручных правок рейтинга через админку или импорта данных
+
+python manage.py rebuild_ratings
+python manage.py rebuild_ratings --movie 1 --movie 2
+"""
+from django.core.management.base import BaseCommand
+
+from movies import cache
+from movies.models import MovieRating
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать агрегированный рейтинг фильмов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--movie', action='append', type=int, dest='movie_ids',
+            help='id фильма (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        count = MovieRating.rebuild(movie_ids=options['movie_ids'])
+        # bulk_create не вызывает сигналы - сброс кэша списка фильмов
+        cache.invalidate(cache.MOVIES)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано агрегатов рейтинга: {count}'))
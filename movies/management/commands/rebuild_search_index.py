@@ -0,0 +1,22 @@
+"""
+Перестройка поискового индекса фильмов и актёров (movies.search).
+Нужна после массовых изменений в обход сигналов (update(), bulk_create)
+
+python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+
+from movies import search
+
+
+class Command(BaseCommand):
+    help = 'Перестроить поисковый индекс фильмов и актёров'
+
+    def handle(self, *args, **options):
+        counts = search.rebuild()
+        if not counts:
+            self.stdout.write(self.style.WARNING(
+                'Для этой БД индекс не используется (поиск через icontains)'))
+        for label, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}: проиндексировано {count}'))
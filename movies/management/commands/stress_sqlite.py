@@ -0,0 +1,188 @@
+"""
+Нагрузка SQLite несколькими процессами: читатели выбирают страницы
+списка фильмов, писатели записывают голоса через flush_votes (выборка
+существующих голосов и запись в одной транзакции - как при приёме
+рейтинга). Профили:
+
+- stock - django.db.backends.sqlite3, журнал DELETE, BEGIN, без повторов;
+- production - django_movie_rest.sqlite: WAL, PRAGMA из SQLITE_PRAGMAS,
+  BEGIN IMMEDIATE, повтор при "database is locked".
+
+Результат - чтений и записей в секунду, p95 задержки и кол-во ошибок
+блокировки. Замер идёт на копии базы default во временном каталоге:
+режим журнала и голоса замера не попадают в рабочий файл.
+Данные - generate_catalogue
+
+python manage.py stress_sqlite --readers 4 --writers 4 --seconds 10
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+
+# Модели импортируются в функциях: модуль загружается в процессах пула
+# (spawn) до django.setup()
+PROFILES = {
+    'stock': 'django.db.backends.sqlite3',
+    'production': 'django_movie_rest.sqlite',
+}
+PAGE_SIZE = 20
+
+
+def init_worker(settings_module, profile, database):
+    # Отдельный процесс (spawn): профиль и копия базы - до первого
+    # подключения к БД
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+    settings.DATABASES['default']['ENGINE'] = PROFILES[profile]
+    settings.DATABASES['default']['NAME'] = database
+    if profile == 'stock':
+        settings.SQLITE_LOCK_RETRIES = 0
+
+
+def run_worker(role, seconds, seed, movie_ids, star_ids):
+    """(роль, кол-во операций, ошибок блокировки, задержки)"""
+    from movies.models import Movie
+    from movies.rating_buffer import flush_votes
+    from .benchmark_api import BENCHMARK_IP_PREFIX
+
+    rnd = random.Random(seed)
+
+    def read():
+        offset = rnd.randrange(max(len(movie_ids) - PAGE_SIZE, 1))
+        list(Movie.objects.filter(draft=False).order_by('title', 'id').values(
+            'id', 'title', 'rating_aggregate__middle_star')[
+                offset:offset + PAGE_SIZE])
+
+    def write():
+        vote = rnd.randrange(1 << 16)
+        ip = f'{BENCHMARK_IP_PREFIX}{vote >> 8}.{vote & 255}'
+        flush_votes({(ip, rnd.choice(movie_ids)): rnd.choice(star_ids)})
+
+    operation = read if role == 'read' else write
+    done = locked = 0
+    latencies = []
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                operation()
+            except OperationalError:
+                locked += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            done += 1
+    finally:
+        close_old_connections()
+    return role, done, locked, latencies
+
+
+class Command(BaseCommand):
+    help = 'Чтение и запись SQLite несколькими процессами по профилям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--seconds', type=float, default=10, help='длительность профиля')
+        parser.add_argument(
+            '--profiles', default=','.join(PROFILES),
+            help='профили через запятую')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        from movies.models import Movie, RatingStar
+
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('База default - не SQLite')
+        profiles = options['profiles'].split(',')
+        for name in profiles:
+            if name not in PROFILES:
+                raise CommandError(f'Неизвестный профиль: {name}')
+        movie_ids = list(Movie.objects.filter(
+            draft=False).values_list('pk', flat=True))
+        star_ids = list(RatingStar.objects.values_list('pk', flat=True))
+        if not movie_ids or not star_ids:
+            raise CommandError(
+                'Нет фильмов или звёзд рейтинга - выполните '
+                'generate_catalogue')
+
+        results = {}
+        connections.close_all()
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in profiles:
+                # Каждый профиль - на свежей копии: без голосов прошлого
+                database = os.path.join(directory, f'{profile}.sqlite3')
+                self.copy_database(database, profile)
+                results[profile] = self.run_profile(
+                    profile, database, movie_ids, star_ids, options)
+        self.print_results(results)
+
+    @staticmethod
+    def copy_database(target, profile):
+        """
+        Копия базы default (sqlite3 backup) с режимом журнала профиля:
+        WAL сохраняется в файле базы, для stock - DELETE
+        """
+        mode = settings.SQLITE_PRAGMAS.get('journal_mode', 'WAL')
+        if profile == 'stock':
+            mode = 'DELETE'
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        database = sqlite3.connect(target)
+        try:
+            source.backup(database)
+            database.execute(f'PRAGMA journal_mode = {mode}')
+        finally:
+            database.close()
+            source.close()
+
+    def run_profile(self, profile, database, movie_ids, star_ids, options):
+        from .benchmark_api import percentile
+
+        roles = (['read'] * options['readers']
+                 + ['write'] * options['writers'])
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE')
+        with ProcessPoolExecutor(
+                max_workers=len(roles),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+                initargs=(settings_module, profile, database)) as executor:
+            futures = [
+                executor.submit(
+                    run_worker, role, options['seconds'],
+                    options['seed'] + index, movie_ids, star_ids)
+                for index, role in enumerate(roles)]
+            rows = [future.result() for future in futures]
+
+        result = {}
+        for role in ('read', 'write'):
+            done = sum(row[1] for row in rows if row[0] == role)
+            latencies = [
+                value for row in rows if row[0] == role for value in row[3]]
+            result[role] = {
+                'ops': round(done / options['seconds'], 1),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2)
+                if latencies else None,
+                'locked': sum(row[2] for row in rows if row[0] == role),
+            }
+        self.stdout.write(f'{profile}: готово')
+        return result
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"профиль":<12}{"операция":<10}{"в секунду":>11}'
+            f'{"p95 мс":>9}{"locked":>8}')
+        for profile, roles in results.items():
+            for role, row in roles.items():
+                self.stdout.write(
+                    f'{profile:<12}{role:<10}{row["ops"]:>11}'
+                    f'{row["p95_ms"]!s:>9}{row["locked"]:>8}')
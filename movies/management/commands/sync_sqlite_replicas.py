@@ -0,0 +1,55 @@
+"""
+Локальная замена репликации: копия файла SQLite базы default в базы
+DATABASE_REPLICAS (sqlite3 backup API - согласованный снимок без
+остановки записи). Между запусками реплика отстаёт от default, как
+асинхронная реплика - на этом проверяется чтение своих записей
+
+python manage.py sync_sqlite_replicas
+python manage.py sync_sqlite_replicas --interval 2   # повторять
+"""
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Скопировать базу SQLite default в реплики DATABASE_REPLICAS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='повторять каждые N секунд (по умолчанию - один раз)')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('DATABASE_REPLICAS не заданы')
+        for alias in (DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS):
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias}: не SQLite')
+        while True:
+            self.sync()
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self):
+        start = time.perf_counter()
+        source = sqlite3.connect(self.get_name(DEFAULT_DB_ALIAS))
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(self.get_name(alias))
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+        self.stdout.write(
+            f'Реплики обновлены за {time.perf_counter() - start:.2f} с')
+
+    @staticmethod
+    def get_name(alias):
+        return connections[alias].settings_dict['NAME']
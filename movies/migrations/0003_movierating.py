@@ -0,0 +1,59 @@
+# Generated by Django 3.2.7 on 2026-10-18 12:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_movie_ratings(apps, schema_editor):
+    """
+    Первичное заполнение агрегатов по уже существующим голосам.
+    Схема агрегата - на момент этой миграции, без кода модели
+    (MovieRating.rebuild может меняться)
+    """
+    Rating = apps.get_model('movies', 'Rating')
+    MovieRating = apps.get_model('movies', 'MovieRating')
+    totals = Rating.objects.values('movie_id').annotate(
+        votes=models.Count('id'),
+        star_sum=models.Sum('star__value'),
+    ).order_by()
+    histograms = {}
+    for movie_id, value, count in Rating.objects.values_list(
+            'movie_id', 'star__value').annotate(
+            count=models.Count('id')).order_by():
+        histograms.setdefault(movie_id, {})[str(value)] = count
+
+    MovieRating.objects.bulk_create([
+        MovieRating(
+            movie_id=row['movie_id'],
+            votes=row['votes'],
+            star_sum=row['star_sum'],
+            middle_star=row['star_sum'] // row['votes'],
+            histogram=histograms[row['movie_id']],
+        )
+        for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_auto_20211117_2254'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieRating',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_aggregate', serialize=False, to='movies.movie', verbose_name='Фильм')),
+                ('votes', models.PositiveIntegerField(default=0, verbose_name='Кол-во голосов')),
+                ('star_sum', models.IntegerField(default=0, verbose_name='Сумма звёзд')),
+                ('middle_star', models.SmallIntegerField(blank=True, null=True, verbose_name='Средняя оценка')),
+                ('histogram', models.JSONField(blank=True, default=dict, verbose_name='Распределение оценок')),
+            ],
+            options={
+                'verbose_name': 'Агрегированный рейтинг',
+                'verbose_name_plural': 'Агрегированные рейтинги',
+            },
+        ),
+        migrations.RunPython(fill_movie_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.7 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+def remove_duplicate_ratings(apps, schema_editor):
+    """
+    Прежний update_or_create не был защищён от гонки - в БД могут быть
+    повторные голоса (ip, movie). Остаётся последний (наибольший id),
+    агрегаты затронутых фильмов пересчитываются
+    """
+    Rating = apps.get_model('movies', 'Rating')
+    MovieRating = apps.get_model('movies', 'MovieRating')
+    duplicates = Rating.objects.values('ip', 'movie_id').annotate(
+        count=models.Count('id'), last_id=models.Max('id'),
+    ).filter(count__gt=1).order_by()
+
+    movie_ids = set()
+    for row in duplicates.iterator():
+        Rating.objects.filter(
+            ip=row['ip'], movie_id=row['movie_id'],
+        ).exclude(id=row['last_id']).delete()
+        movie_ids.add(row['movie_id'])
+    if not movie_ids:
+        return
+
+    movie_ids = list(movie_ids)
+    ratings = Rating.objects.filter(movie_id__in=movie_ids)
+    histograms = {}
+    for movie_id, value, count in ratings.values_list(
+            'movie_id', 'star__value').annotate(
+            count=models.Count('id')).order_by():
+        histograms.setdefault(movie_id, {})[str(value)] = count
+    aggregates = [
+        MovieRating(
+            movie_id=row['movie_id'],
+            votes=row['votes'],
+            star_sum=row['star_sum'],
+            middle_star=row['star_sum'] // row['votes'],
+            histogram=histograms[row['movie_id']],
+        )
+        for row in ratings.values('movie_id').annotate(
+            votes=models.Count('id'),
+            star_sum=models.Sum('star__value'),
+        ).order_by()
+    ]
+    MovieRating.objects.filter(movie_id__in=movie_ids).delete()
+    MovieRating.objects.bulk_create(aggregates, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_movierating'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('ip', 'movie'), name='movies_rating_ip_movie_uniq'),
+        ),
+    ]
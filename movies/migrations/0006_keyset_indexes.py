@@ -0,0 +1,21 @@
+# Generated by Django 3.2.7 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actor',
+            index=models.Index(fields=['name', 'id'], name='movies_actor_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title', 'id'], name='movies_movie_title_id_idx'),
+        ),
+    ]
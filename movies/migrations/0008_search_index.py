@@ -0,0 +1,110 @@
+import html
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+from movies.stemmer import stem_text
+
+# Схема индекса на момент этой миграции (не зависит от movies.search):
+# модель, таблица, поля по убыванию веса, условие публикации
+INDEXED = (
+    ('Movie', 'movies_movie', ('title', 'tagline', 'description'),
+     {'draft': False}),
+    ('Actor', 'movies_actor', ('name',), {}),
+)
+CHUNK_SIZE = 500
+
+
+def clean_text(value):
+    return html.unescape(strip_tags(value or ''))
+
+
+def create_sqlite(cursor, table, fields):
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts '
+        f'USING fts5({", ".join(fields)}, tokenize="unicode61")')
+
+
+def insert_sqlite(cursor, table, fields, rows):
+    # В индексе - основы слов, как в запросе поиска
+    placeholders = ', '.join(['%s'] * (len(fields) + 1))
+    cursor.executemany(
+        f'INSERT INTO {table}_fts (rowid, {", ".join(fields)}) '
+        f'VALUES ({placeholders})',
+        [(pk, *(stem_text(clean_text(value).lower()) for value in values))
+         for pk, *values in rows])
+
+
+def create_postgresql(cursor, table, fields):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {table}_search ('
+        f'object_id integer PRIMARY KEY REFERENCES {table} (id) '
+        f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        f'document tsvector NOT NULL)')
+    cursor.execute(
+        f'CREATE INDEX IF NOT EXISTS {table}_search_gin '
+        f'ON {table}_search USING GIN (document)')
+
+
+def insert_postgresql(cursor, table, fields, rows):
+    document = ' || '.join(
+        f"setweight(to_tsvector('russian', %s), '{weight}')"
+        for weight in 'ABCD'[:len(fields)])
+    cursor.executemany(
+        f'INSERT INTO {table}_search (object_id, document) '
+        f'VALUES (%s, {document}) ON CONFLICT (object_id) DO NOTHING',
+        [(pk, *(clean_text(value) for value in values))
+         for pk, *values in rows])
+
+
+BACKENDS = {
+    'sqlite': (create_sqlite, insert_sqlite),
+    'postgresql': (create_postgresql, insert_postgresql),
+}
+
+
+def create_index(apps, schema_editor):
+    """Таблицы индекса и заполнение опубликованными записями"""
+    connection = schema_editor.connection
+    if connection.vendor not in BACKENDS:
+        return
+    create, insert = BACKENDS[connection.vendor]
+    with connection.cursor() as cursor:
+        for model_name, table, fields, published in INDEXED:
+            create(cursor, table, fields)
+            queryset = apps.get_model('movies', model_name).objects.using(
+                connection.alias).filter(**published).order_by('pk')
+            last_pk = 0
+            while True:
+                rows = list(queryset.filter(pk__gt=last_pk).values_list(
+                    'pk', *fields)[:CHUNK_SIZE])
+                if not rows:
+                    break
+                insert(cursor, table, fields, rows)
+                last_pk = rows[-1][0]
+
+
+def drop_index(apps, schema_editor):
+    connection = schema_editor.connection
+    suffix = {'sqlite': 'fts', 'postgresql': 'search'}.get(connection.vendor)
+    if suffix is None:
+        return
+    with connection.cursor() as cursor:
+        for _, table, _, _ in INDEXED:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}_{suffix}')
+
+
+class Migration(migrations.Migration):
+    """
+    Таблицы полнотекстового поиска (movies.search) и их заполнение.
+    DDL и выборка записей зафиксированы здесь; основы слов - movies.stemmer,
+    тот же, что у запроса поиска
+    """
+
+    dependencies = [
+        ('movies', '0007_api_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
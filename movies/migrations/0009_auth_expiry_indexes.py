@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# (имя индекса, таблица, столбец) - столбцы сроков действия, по которым
+# команда purge_expired выбирает устаревшие записи. У django_session
+# индекс по expire_date уже есть (db_index=True)
+INDEXES = (
+    ('oauth2_accesstoken_expires_idx', 'oauth2_provider_accesstoken',
+     'expires'),
+    ('oauth2_refreshtoken_revoked_idx', 'oauth2_provider_refreshtoken',
+     'revoked'),
+    ('oauth2_grant_expires_idx', 'oauth2_provider_grant', 'expires'),
+    ('social_auth_nonce_timestamp_idx', 'social_auth_nonce', 'timestamp'),
+)
+
+
+class Migration(migrations.Migration):
+    """
+    Индексы сроков действия в таблицах oauth2_provider и social_django:
+    модели сторонних приложений, поэтому RunSQL, а не AddIndex
+    """
+
+    dependencies = [
+        ('movies', '0008_search_index'),
+        ('oauth2_provider', '0004_auto_20200902_2022'),
+        ('social_django', '0010_uid_db_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})',
+            f'DROP INDEX IF EXISTS {name}')
+        for name, table, column in INDEXES
+    ]
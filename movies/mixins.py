@@ -1,10 +1,33 @@
 """
 Миксины
 
-В шаблонах добавляет переменную view, через которую осуществляется
-обращение к методам - view.get_genres или view.get_years
+GenreYear - в шаблонах добавляет переменную view, через которую
+осуществляется обращение к методам - view.get_genres или view.get_years
+
+OptimizedQuerysetMixin, QueryBudgetMixin - для API views: запрос к БД по
+связям, объявленным в сериализаторе, и контроль кол-ва SQL-запросов
+
+BufferedRatingMixin - голосование через буфер movies.rating_buffer
+BulkCreateMixin - пакетное создание записей (действие bulk)
+FastListMixin - быстрый вывод списков (FAST_LIST_SERIALIZATION)
+SparseFieldsetMixin - выбор полей и связей ответа (?fields=, ?expand=)
 """
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+
+from . import rating_buffer
 from .models import Genre, Movie
+from .service import get_client_ip, FastJSONRenderer
 
 
 class GenreYear:
@@ -14,5 +37,290 @@ class GenreYear:
         return Genre.objects.all()
 
     def get_years(self):
-        # values('year') - забрать только записи лет, а не фильмов целиком
-        return Movie.objects.filter(draft=False).values("year")
+        # values('year') - забрать только записи лет, а не фильмов целиком,
+        # distinct - по одной записи на год (сортировка Meta по title
+        # попала бы в SELECT DISTINCT, поэтому order_by('year'))
+        return Movie.objects.filter(draft=False).values(
+            'year').order_by('year').distinct()
+
+
+def get_serializer_relations(serializer_class, prefix=''):
+    """
+    Связи, которые затрагивает сериализатор. Объявляются в Meta:
+    select_related (FK/OneToOne) и prefetch_related (M2M/обратные FK).
+    Связи вложенных сериализаторов добавляются с префиксом поля
+    """
+    meta = getattr(serializer_class, 'Meta', None)
+    select = [prefix + name for name in getattr(meta, 'select_related', ())]
+    prefetch = [
+        prefix + name for name in getattr(meta, 'prefetch_related', ())]
+
+    for name, field in getattr(serializer_class, '_declared_fields', {}).items():
+        nested = getattr(field, 'child', field)
+        if not isinstance(nested, BaseSerializer):
+            continue
+        source = field.source or name
+        nested_select, nested_prefetch = get_serializer_relations(
+            type(nested), f'{prefix}{source}__')
+        # Под prefetch-связью вложенные связи тоже догружаются prefetch
+        prefetch += nested_select + nested_prefetch
+    return select, prefetch
+
+
+def optimize_queryset(queryset, serializer_class):
+    """Добавить к запросу select_related/prefetch_related сериализатора"""
+    select, prefetch = get_serializer_relations(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def restrict_queryset(queryset, serializer, selected, keep=()):
+    """
+    Запрос только под поля selected сериализатора serializer: связи из
+    Meta невыбранных полей не загружаются, колонки модели - only()
+    (pk, keep и колонки выбранных полей)
+    """
+    sources = {
+        serializer.fields[name].source.split('.')[0] for name in selected}
+    select, prefetch = get_serializer_relations(type(serializer))
+    select = [name for name in select if name.split('__')[0] in sources]
+    prefetch = [name for name in prefetch if name.split('__')[0] in sources]
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+
+    meta = queryset.model._meta
+    concrete = {field.name for field in meta.concrete_fields}
+    columns = {meta.pk.name, *keep} | (sources & concrete)
+    # Внешний ключ связи из select_related не может быть отложен
+    columns |= {name.split('__')[0] for name in select}
+    return queryset.only(*columns)
+
+
+class OptimizedQuerysetMixin:
+    """Запрос строится с учётом связей из Meta текущего сериализатора"""
+
+    def get_queryset(self):
+        return optimize_queryset(
+            super().get_queryset(), self.get_serializer_class())
+
+
+class QueryBudgetMixin:
+    """
+    Максимальное кол-во SQL-запросов на обработку запроса (без аутентификации).
+    max_queries - число или словарь {action: число}. Проверяется только при
+    settings.ASSERT_MAX_QUERIES (movies.tests), превышение - AssertionError
+    """
+    max_queries = None
+
+    def get_max_queries(self):
+        if isinstance(self.max_queries, dict):
+            action = getattr(self, 'action', None) or self.request.method.lower()
+            return self.max_queries.get(action)
+        return self.max_queries
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if getattr(settings, 'ASSERT_MAX_QUERIES', False):
+            self._captured_queries = CaptureQueriesContext(connection)
+            self._captured_queries.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        captured = getattr(self, '_captured_queries', None)
+        if captured is not None:
+            self._captured_queries = None
+            captured.__exit__(None, None, None)
+            limit = self.get_max_queries()
+            assert limit is None or len(captured) <= limit, (
+                f'{type(self).__name__}: {len(captured)} SQL-запросов '
+                f'при допустимых {limit}:\n'
+                + '\n'.join(query['sql'] for query in captured))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class BufferedRatingMixin:
+    """
+    При settings.RATING_BUFFER_ENABLED голос кладётся в буфер процесса
+    (ответ 202), запись в БД - фоновым потоком пачкой. Если буфер
+    переполнен - обычная синхронная запись (201)
+    """
+
+    def create(self, request, *args, **kwargs):
+        if not settings.RATING_BUFFER_ENABLED:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if rating_buffer.get_buffer().add(
+                get_client_ip(request), data['movie'].pk, data['star'].pk):
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class BulkCreateMixin:
+    """
+    Действие bulk (POST списка объектов, только администраторам).
+    bulk_serializer_class - сериализатор с BulkCreateListSerializer:
+    связи проверяются одним запросом на модель, запись пачками, ошибки -
+    по индексу элемента. Валидные элементы записываются, даже если есть
+    ошибки: 201 - все записаны, 207 - часть, 400 - ни одного
+    """
+    bulk_serializer_class = None
+
+    def get_serializer_class(self):
+        if getattr(self, 'action', None) == 'bulk':
+            return self.bulk_serializer_class
+        return super().get_serializer_class()
+
+    def get_permissions(self):
+        if getattr(self, 'action', None) == 'bulk':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise ValidationError({'detail': 'Ожидается список объектов'})
+        limit = settings.BULK_CREATE_MAX_ITEMS
+        if len(request.data) > limit:
+            raise ValidationError(
+                {'detail': f'Не более {limit} объектов за запрос'})
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        valid, errors = serializer.validate_items()
+        saved = serializer.bulk_create(valid) if valid else 0
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif valid:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {'received': len(request.data), 'saved': saved, 'errors': errors},
+            status=response_status)
+
+
+class FastListMixin:
+    """
+    Списки через fast_list_serializer_class (строки .values() без полей
+    DRF) и FastJSONRenderer, если включён FAST_LIST_SERIALIZATION.
+    Пагинация, фильтры, кэш и ETag - как при обычном выводе
+    """
+    fast_list_serializer_class = None
+    fast_list_actions = ('list',)
+
+    def use_fast_list(self):
+        return (settings.FAST_LIST_SERIALIZATION
+                and self.fast_list_serializer_class is not None
+                and getattr(self, 'action', None) in self.fast_list_actions)
+
+    def filter_queryset(self, queryset):
+        # После фильтров: get_queryset остаётся запросом модели
+        queryset = super().filter_queryset(queryset)
+        if self.use_fast_list():
+            queryset = self.fast_list_serializer_class.prepare_queryset(
+                queryset)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.use_fast_list() and kwargs.get('many'):
+            return self.fast_list_serializer_class(
+                *args, context=self.get_serializer_context())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.use_fast_list():
+            renderers = [
+                FastJSONRenderer() if type(renderer) is JSONRenderer
+                else renderer for renderer in renderers]
+        return renderers
+
+
+class SparseFieldsetMixin:
+    """
+    ?fields=a,b - только эти поля ответа; ?expand=r1,r2 - из связей
+    (вложенные сериализаторы и связанные поля) только эти. Без параметров -
+    все поля и связи; expand без fields - все поля, кроме невыбранных связей.
+    Невыбранные связи не загружаются, колонки модели - only()
+    (restrict_queryset). Указывать до CachedResponseMixin и
+    OptimizedQuerysetMixin: выбор входит в ключ кэша ответа
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_sparse_fields(self):
+        """Имена выбранных полей ответа или None (все поля)"""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self.parse_sparse_fields()
+        return self._sparse_fields
+
+    def parse_sparse_fields(self):
+        if self.request is None:
+            # Схема drf-yasg без запроса (build_schema)
+            return None
+        params = self.request.query_params
+        if (self.request.method not in ('GET', 'HEAD')
+                or self.fields_query_param not in params
+                and self.expand_query_param not in params):
+            return None
+        serializer = self.get_serializer_class()(
+            context={'request': self.request})
+        available = serializer.fields
+        relations = {
+            name for name, field in available.items()
+            if isinstance(field, (
+                BaseSerializer, RelatedField, ManyRelatedField))}
+
+        def parse(name):
+            value = params.get(name)
+            if value is None:
+                return None
+            return {item.strip() for item in value.split(',') if item.strip()}
+
+        fields = parse(self.fields_query_param)
+        expand = parse(self.expand_query_param)
+        errors = {}
+        if fields is not None and fields - set(available):
+            errors[self.fields_query_param] = [
+                f'Неизвестные поля: {", ".join(sorted(fields - set(available)))}']
+        if expand is not None and expand - relations:
+            errors[self.expand_query_param] = [
+                f'Не связи: {", ".join(sorted(expand - relations))}']
+        if errors:
+            raise ValidationError(errors)
+
+        if fields is None:
+            fields = set(available) - relations
+        return fields | (expand or set())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        selected = self.get_sparse_fields()
+        if selected is None:
+            return queryset
+        serializer = self.get_serializer_class()(
+            context={'request': self.request})
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        keep = [name.lstrip('-') for name in ordering]
+        return restrict_queryset(queryset, serializer, selected, keep)
+
+    def get_cache_params(self, request):
+        params = super().get_cache_params(request)
+        selected = self.get_sparse_fields()
+        if params is None or selected is None:
+            return params
+        return params + (('sparse_fields', tuple(sorted(selected))),)
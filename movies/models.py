@@ -1,6 +1,8 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import date
 
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 
 
@@ -26,6 +28,8 @@ class Actor(models.Model):
     description = models.TextField(verbose_name='Описание')
     image = models.ImageField(
         verbose_name='Изображение', upload_to='actors/', null=True, blank=True)
+    updated_at = models.DateTimeField(
+        verbose_name='Изменено', auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -37,6 +41,11 @@ class Actor(models.Model):
         verbose_name = 'Актёры и режиссёры'
         verbose_name_plural = 'Актёры и режиссёры'
         ordering = ('name',)
+        indexes = (
+            # Сортировка и курсорная пагинация (service.PaginationActors)
+            models.Index(
+                fields=('name', 'id'), name='movies_actor_name_id_idx'),
+        )
 
 
 class Genre(models.Model):
@@ -52,6 +61,10 @@ class Genre(models.Model):
         verbose_name = 'Жанр'
         verbose_name_plural = 'Жанры'
         ordering = ('name',)
+        indexes = (
+            # Фильтр genres__name__in в MovieFilter
+            models.Index(fields=('name',), name='movies_genre_name_idx'),
+        )
 
 
 class Movie(models.Model):
@@ -86,6 +99,8 @@ class Movie(models.Model):
         null=True)
     url = models.SlugField(max_length=160, unique=True)
     draft = models.BooleanField(verbose_name='Черновик', default=False)
+    updated_at = models.DateTimeField(
+        verbose_name='Изменено', auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
@@ -104,6 +119,17 @@ class Movie(models.Model):
         verbose_name = 'МедиаФайл'
         verbose_name_plural = 'МедиаФайлы'
         ordering = ('title',)
+        indexes = (
+            # Частичные индексы под запросы API (всегда draft=False):
+            # сортировка и курсорная пагинация (service.CursorPaginationMovies)
+            models.Index(
+                fields=('title', 'id'), name='movies_movie_pub_title_idx',
+                condition=models.Q(draft=False)),
+            # диапазон лет в MovieFilter
+            models.Index(
+                fields=('year',), name='movies_movie_pub_year_idx',
+                condition=models.Q(draft=False)),
+        )
 
 
 class MovieShots(models.Model):
@@ -146,6 +172,8 @@ class Rating(models.Model):
     movie = models.ForeignKey(
         Movie, verbose_name='Фильм', on_delete=models.CASCADE,
         related_name='ratings')
+    updated_at = models.DateTimeField(
+        verbose_name='Изменено', auto_now=True, db_index=True)
 
     def __str__(self):
         return f'{self.star} - {self.movie}'
@@ -153,6 +181,177 @@ class Rating(models.Model):
     class Meta:
         verbose_name = 'Рейтинг'
         verbose_name_plural = 'Рейтинги'
+        constraints = (
+            # Один голос с ip на фильм. Составной индекс (ip, movie) также
+            # обслуживает update_or_create и проверку 'голосовал ли клиент'
+            models.UniqueConstraint(
+                fields=('ip', 'movie'), name='movies_rating_ip_movie_uniq'),
+        )
+
+
+# Удаление голосов пачкой (MovieRating.deferred): post_delete Rating
+# не правит агрегаты по одному
+_deferred_rating_rebuild = ContextVar('deferred_rating_rebuild', default=False)
+
+
+class MovieRating(models.Model):
+    """
+    Агрегированный рейтинг фильма. Обновляется при каждом голосовании,
+    чтобы списки фильмов не считали SUM/COUNT по всем записям Rating
+    """
+    movie = models.OneToOneField(
+        Movie, verbose_name='Фильм', on_delete=models.CASCADE,
+        primary_key=True, related_name='rating_aggregate')
+    votes = models.PositiveIntegerField(
+        verbose_name='Кол-во голосов', default=0)
+    star_sum = models.IntegerField(verbose_name='Сумма звёзд', default=0)
+    middle_star = models.SmallIntegerField(
+        verbose_name='Средняя оценка', null=True, blank=True)
+    # {значение звезды: кол-во голосов}, ключи JSON - строки
+    histogram = models.JSONField(
+        verbose_name='Распределение оценок', default=dict, blank=True)
+
+    def __str__(self):
+        return f'{self.movie_id} - {self.middle_star}'
+
+    def apply_vote(self, star, previous=None):
+        """
+        Учесть голос star (значение звезды). previous - прежнее значение
+        при повторном голосовании с того же ip
+        """
+        previous_middle_star = self.middle_star
+        if previous is None:
+            self.votes += 1
+        else:
+            self.star_sum -= previous
+            self._add_to_histogram(previous, -1)
+        self.star_sum += star
+        self._add_to_histogram(star, 1)
+        self.middle_star = self.star_sum // self.votes if self.votes else None
+        # Для сброса кэша списка фильмов (movies.signals)
+        self.middle_star_changed = self.middle_star != previous_middle_star
+
+    def remove_vote(self, star):
+        """Исключить голос star (запись Rating удалена)"""
+        previous_middle_star = self.middle_star
+        self.votes -= 1
+        self.star_sum -= star
+        self._add_to_histogram(star, -1)
+        self.middle_star = self.star_sum // self.votes if self.votes else None
+        self.middle_star_changed = self.middle_star != previous_middle_star
+
+    def _add_to_histogram(self, star, count):
+        key = str(star)
+        value = self.histogram.get(key, 0) + count
+        if value > 0:
+            self.histogram[key] = value
+        else:
+            self.histogram.pop(key, None)
+
+    @classmethod
+    def register_vote(cls, movie_id, star, previous=None):
+        """Атомарно обновить агрегат фильма новым голосом"""
+        if star == previous:
+            return
+        with transaction.atomic():
+            aggregate, _ = cls.objects.select_for_update().get_or_create(
+                movie_id=movie_id)
+            aggregate.apply_vote(star, previous)
+            aggregate.save()
+
+    @classmethod
+    def unregister_vote(cls, movie_id, star):
+        """
+        Атомарно исключить голос из агрегата фильма. Агрегата может уже
+        не быть (каскадное удаление фильма)
+        """
+        with transaction.atomic():
+            aggregate = cls.objects.select_for_update().filter(
+                movie_id=movie_id).first()
+            if aggregate is None or not aggregate.votes:
+                return
+            aggregate.remove_vote(star)
+            aggregate.save()
+
+    @classmethod
+    def register_votes(cls, votes):
+        """
+        Пакетный вариант register_vote: votes - (movie_id, star, previous).
+        Сигналы не вызываются, возвращает id фильмов, у которых
+        изменилась средняя оценка
+        """
+        votes = [vote for vote in votes if vote[1] != vote[2]]
+        movie_ids = {movie_id for movie_id, _, _ in votes}
+        if not movie_ids:
+            return set()
+        with transaction.atomic():
+            existing = cls.objects.select_for_update().in_bulk(movie_ids)
+            created = {
+                movie_id: cls(movie_id=movie_id)
+                for movie_id in movie_ids if movie_id not in existing}
+            aggregates = {**existing, **created}
+            changed = set()
+            for movie_id, star, previous in votes:
+                aggregate = aggregates[movie_id]
+                aggregate.apply_vote(star, previous)
+                if aggregate.middle_star_changed:
+                    changed.add(movie_id)
+            cls.objects.bulk_create(created.values(), batch_size=500)
+            cls.objects.bulk_update(
+                existing.values(),
+                ('votes', 'star_sum', 'middle_star', 'histogram'),
+                batch_size=500)
+        return changed
+
+    @classmethod
+    def rebuild(cls, movie_ids=None):
+        """Пересчитать агрегаты по таблице Rating (всех или movie_ids)"""
+        ratings = Rating.objects.all()
+        if movie_ids is not None:
+            ratings = ratings.filter(movie_id__in=movie_ids)
+        rows = ratings.values('movie_id', 'star__value').annotate(
+            count=models.Count('id')).order_by()
+
+        aggregates = {}
+        for row in rows.iterator():
+            aggregate = aggregates.setdefault(
+                row['movie_id'], cls(movie_id=row['movie_id']))
+            aggregate.votes += row['count']
+            aggregate.star_sum += row['star__value'] * row['count']
+            aggregate.histogram[str(row['star__value'])] = row['count']
+        for aggregate in aggregates.values():
+            aggregate.middle_star = aggregate.star_sum // aggregate.votes
+
+        with transaction.atomic():
+            stale = cls.objects.all()
+            if movie_ids is not None:
+                stale = stale.filter(movie_id__in=movie_ids)
+            stale.delete()
+            cls.objects.bulk_create(aggregates.values(), batch_size=1000)
+        return len(aggregates)
+
+    @staticmethod
+    def is_deferred():
+        return _deferred_rating_rebuild.get()
+
+    @classmethod
+    @contextmanager
+    def deferred(cls, movie_ids):
+        """
+        Удаление/изменение голосов пачкой: агрегаты фильмов movie_ids
+        пересчитываются один раз (rebuild) после блока, а не по записи
+        """
+        token = _deferred_rating_rebuild.set(True)
+        try:
+            with transaction.atomic():
+                yield
+                cls.rebuild(movie_ids)
+        finally:
+            _deferred_rating_rebuild.reset(token)
+
+    class Meta:
+        verbose_name = 'Агрегированный рейтинг'
+        verbose_name_plural = 'Агрегированные рейтинги'
 
 
 class Review(models.Model):
@@ -166,6 +365,8 @@ class Review(models.Model):
     movie = models.ForeignKey(
         Movie, verbose_name='Фильм', on_delete=models.CASCADE,
         related_name='reviews')
+    updated_at = models.DateTimeField(
+        verbose_name='Изменено', auto_now=True, db_index=True)
 
     def __str__(self):
         return f'{self.name} - {self.movie}'
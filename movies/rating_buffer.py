@@ -0,0 +1,166 @@
+"""
+Буферизованный приём голосов (RATING_BUFFER_ENABLED)
+
+AddStarRatingView/AddStarRatingViewSet кладут голос в буфер процесса и
+сразу отвечают 202. Повторные голоса с того же ip за фильм схлопываются
+(остаётся последний). Фоновый поток раз в RATING_BUFFER_FLUSH_INTERVAL
+секунд записывает буфер одной транзакцией: выборка существующих голосов,
+bulk_update/bulk_create и пакетное обновление агрегатов MovieRating.
+Буфер ограничен RATING_BUFFER_MAX_SIZE - при переполнении голос
+записывается синхронно. При остановке процесса буфер сбрасывается (atexit)
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from django_movie_rest.sqlite import retry_on_locked
+
+from . import cache
+from .models import MovieRating, Rating, RatingStar
+
+logger = logging.getLogger(__name__)
+
+# Кол-во голосов в одной выборке существующих записей
+# (ip IN (...) AND movie_id IN (...) - с запасом до лимита параметров SQLite)
+FLUSH_CHUNK_SIZE = 400
+
+
+@retry_on_locked
+def flush_votes(votes):
+    """
+    Записать голоса {(ip, movie_id): star_id} одной транзакцией.
+    Возвращает кол-во записанных голосов
+    """
+    if not votes:
+        return 0
+    star_values = dict(RatingStar.objects.values_list('pk', 'value'))
+    now = timezone.now()
+    with transaction.atomic():
+        created, updated, aggregate_votes = [], [], []
+        items = list(votes.items())
+        for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+            chunk = dict(items[start:start + FLUSH_CHUNK_SIZE])
+            existing = Rating.objects.select_for_update().filter(
+                ip__in={ip for ip, _ in chunk},
+                movie_id__in={movie_id for _, movie_id in chunk})
+            ratings = {
+                (rating.ip, rating.movie_id): rating for rating in existing}
+            for (ip, movie_id), star_id in chunk.items():
+                rating = ratings.get((ip, movie_id))
+                if rating is None:
+                    created.append(Rating(
+                        ip=ip, movie_id=movie_id, star_id=star_id,
+                        updated_at=now))
+                    aggregate_votes.append(
+                        (movie_id, star_values[star_id], None))
+                elif rating.star_id != star_id:
+                    aggregate_votes.append((
+                        movie_id, star_values[star_id],
+                        star_values[rating.star_id]))
+                    # bulk_update не заполняет auto_now
+                    rating.star_id, rating.updated_at = star_id, now
+                    updated.append(rating)
+        Rating.objects.bulk_create(created, batch_size=500)
+        Rating.objects.bulk_update(
+            updated, ('star', 'updated_at'), batch_size=500)
+        changed = MovieRating.register_votes(aggregate_votes)
+        if changed:
+            # Средняя оценка выводится в списке фильмов
+            cache.invalidate(cache.MOVIES)
+    return len(created) + len(updated)
+
+
+class RatingBuffer:
+    """Ограниченный буфер голосов с фоновой записью"""
+
+    def __init__(self, max_size, interval):
+        self.max_size = max_size
+        self.interval = interval
+        self.votes = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def add(self, ip, movie_id, star_id):
+        """Положить голос в буфер. False - буфер переполнен"""
+        self.ensure_started()
+        key = (ip, movie_id)
+        with self.lock:
+            if key not in self.votes and len(self.votes) >= self.max_size:
+                return False
+            self.votes[key] = star_id
+        return True
+
+    def ensure_started(self):
+        # После fork (gunicorn --preload) поток родителя в дочернем
+        # процессе не существует - запускается свой
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.votes = {}
+            self.stopped.clear()
+            self.thread = threading.Thread(
+                target=self.run, name='rating-buffer', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+            # Поток живёт долго - соединение закрывается по CONN_MAX_AGE
+            close_old_connections()
+        connection.close()
+
+    def flush(self):
+        """Записать накопленные голоса; при ошибке вернуть их в буфер"""
+        with self.flush_lock:
+            with self.lock:
+                votes, self.votes = self.votes, {}
+            try:
+                return flush_votes(votes)
+            except Exception:
+                logger.exception(
+                    'Не удалось записать %s голосов, повтор при следующей '
+                    'записи', len(votes))
+                with self.lock:
+                    # Более новые голоса из буфера не перезаписываются
+                    for key, star_id in votes.items():
+                        if len(self.votes) >= self.max_size:
+                            break
+                        self.votes.setdefault(key, star_id)
+                return 0
+
+    def stop(self):
+        """Остановить поток и записать остаток буфера"""
+        if self.pid != os.getpid():
+            return
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(self.interval + 5)
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Буфер процесса (создаётся при первом голосе)"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = RatingBuffer(
+                    settings.RATING_BUFFER_MAX_SIZE,
+                    settings.RATING_BUFFER_FLUSH_INTERVAL)
+                atexit.register(_buffer.stop)
+    return _buffer
@@ -0,0 +1,224 @@
+"""
+Полнотекстовый поиск по фильмам (title, tagline, description) и актёрам
+(name) с ранжированием, поиском по началу слова и русской морфологией
+
+SQLite - таблицы FTS5 <таблица>_fts (rowid = id записи), в индекс и запрос
+попадают основы слов (movies.stemmer). PostgreSQL - таблицы
+<таблица>_search с tsvector (конфигурация 'russian') и GIN-индексом.
+Другие БД - icontains без ранжирования. Таблицы индекса создаёт
+миграция 0008_search_index
+
+Индекс обновляется сигналами (movies.signals); массовые операции
+(update(), bulk_create) обновляют его явно через update_index.
+Полная перестройка - команда rebuild_search_index
+"""
+import html
+import re
+
+from django.apps import apps as global_apps
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.html import strip_tags
+
+from .stemmer import stem, stem_text
+
+WORD_RE = re.compile(r'\w+')
+# Больше слов в запросе не учитывается
+MAX_QUERY_TERMS = 8
+INDEX_CHUNK_SIZE = 500
+
+
+class SearchIndex:
+    """Индексируемая модель: поля в порядке убывания веса"""
+
+    def __init__(self, model, fields, weights, published=None):
+        self.model = model
+        self.fields = fields
+        self.weights = weights
+        self.published = published or {}
+
+    def get_model(self, apps=global_apps):
+        return apps.get_model(self.model)
+
+    def get_queryset(self, apps=global_apps):
+        return self.get_model(apps)._default_manager.filter(**self.published)
+
+
+INDEXES = {
+    'movies.Movie': SearchIndex(
+        'movies.Movie', ('title', 'tagline', 'description'), (10.0, 4.0, 1.0),
+        published={'draft': False}),
+    'movies.Actor': SearchIndex('movies.Actor', ('name',), (1.0,)),
+}
+
+
+def get_index(model):
+    return INDEXES[model._meta.label]
+
+
+def clean_text(value):
+    """Текст без HTML (описания - из CKEditor)"""
+    return html.unescape(strip_tags(value or ''))
+
+
+def query_words(query):
+    return WORD_RE.findall(query.lower())[:MAX_QUERY_TERMS]
+
+
+class SqliteBackend:
+    """FTS5: rowid - id записи, колонки - основы слов полей"""
+
+    @staticmethod
+    def table(model):
+        return f'{model._meta.db_table}_fts'
+
+    def remove(self, cursor, model, pks):
+        cursor.execute(
+            f'DELETE FROM {self.table(model)} '
+            f'WHERE rowid IN ({", ".join(["%s"] * len(pks))})', pks)
+
+    def clear(self, cursor, model):
+        cursor.execute(f'DELETE FROM {self.table(model)}')
+
+    def insert(self, cursor, model, index, rows):
+        placeholders = ', '.join(['%s'] * (len(index.fields) + 1))
+        cursor.executemany(
+            f'INSERT INTO {self.table(model)} '
+            f'(rowid, {", ".join(index.fields)}) VALUES ({placeholders})',
+            [(pk, *(stem_text(clean_text(value).lower()) for value in values))
+             for pk, *values in rows])
+
+    def search(self, cursor, model, index, words, limit, offset):
+        # "основа"* - совпадение по началу основы, слова объединяются по И
+        match = ' '.join(f'"{stem(word)}"*' for word in words)
+        table = self.table(model)
+        weights = ', '.join(str(weight) for weight in index.weights)
+        cursor.execute(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s '
+            f'ORDER BY bm25({table}, {weights}) LIMIT %s OFFSET %s',
+            [match, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBackend:
+    """tsvector ('russian') с весами A, B, C... по порядку полей"""
+    config = 'russian'
+
+    @staticmethod
+    def table(model):
+        return f'{model._meta.db_table}_search'
+
+    def remove(self, cursor, model, pks):
+        cursor.execute(
+            f'DELETE FROM {self.table(model)} WHERE object_id = ANY(%s)',
+            [list(pks)])
+
+    def clear(self, cursor, model):
+        cursor.execute(f'TRUNCATE {self.table(model)}')
+
+    def insert(self, cursor, model, index, rows):
+        document = ' || '.join(
+            f"setweight(to_tsvector('{self.config}', %s), '{weight}')"
+            for weight in 'ABCD'[:len(index.fields)])
+        cursor.executemany(
+            f'INSERT INTO {self.table(model)} (object_id, document) '
+            f'VALUES (%s, {document}) ON CONFLICT (object_id) '
+            f'DO UPDATE SET document = EXCLUDED.document',
+            [(pk, *(clean_text(value) for value in values))
+             for pk, *values in rows])
+
+    def search(self, cursor, model, index, words, limit, offset):
+        table = self.table(model)
+        cursor.execute(
+            f'SELECT object_id FROM {table}, '
+            f"to_tsquery('{self.config}', %s) query "
+            f'WHERE document @@ query '
+            f'ORDER BY ts_rank_cd(document, query) DESC, object_id '
+            f'LIMIT %s OFFSET %s',
+            [' & '.join(f'{word}:*' for word in words), limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SqliteBackend(),
+    'postgresql': PostgresBackend(),
+}
+
+
+def get_backend(using):
+    return BACKENDS.get(connections[using].vendor)
+
+
+def update_index(model, pks, apps=global_apps):
+    """
+    Переиндексировать записи pks: удалить из индекса и добавить заново
+    те, что существуют и опубликованы
+    """
+    index = get_index(model)
+    using = router.db_for_write(model)
+    backend = get_backend(using)
+    pks = list(pks)
+    if backend is None or not pks:
+        return
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(pks), INDEX_CHUNK_SIZE):
+            chunk = pks[start:start + INDEX_CHUNK_SIZE]
+            backend.remove(cursor, model, chunk)
+            rows = index.get_queryset(apps).using(using).filter(
+                pk__in=chunk).values_list('pk', *index.fields)
+            backend.insert(cursor, model, index, list(rows))
+
+
+def remove_from_index(model, pks):
+    using = router.db_for_write(model)
+    backend = get_backend(using)
+    pks = list(pks)
+    if backend is None or not pks:
+        return
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(pks), INDEX_CHUNK_SIZE):
+            backend.remove(cursor, model, pks[start:start + INDEX_CHUNK_SIZE])
+
+
+def rebuild(apps=global_apps, using='default'):
+    """Перестроить индекс всех моделей. Возвращает {модель: кол-во}"""
+    backend = get_backend(using)
+    counts = {}
+    if backend is None:
+        return counts
+    with connections[using].cursor() as cursor:
+        for label, index in INDEXES.items():
+            model = index.get_model(apps)
+            backend.clear(cursor, model)
+            queryset = index.get_queryset(apps).using(using).order_by('pk')
+            last_pk, counts[label] = 0, 0
+            while True:
+                rows = list(queryset.filter(pk__gt=last_pk).values_list(
+                    'pk', *index.fields)[:INDEX_CHUNK_SIZE])
+                if not rows:
+                    break
+                backend.insert(cursor, model, index, rows)
+                last_pk = rows[-1][0]
+                counts[label] += len(rows)
+    return counts
+
+
+def search(model, query, limit=20, offset=0):
+    """id записей model по запросу query, по убыванию релевантности"""
+    words = query_words(query)
+    if not words:
+        return []
+    index = get_index(model)
+    using = router.db_for_read(model)
+    backend = get_backend(using)
+    if backend is None:
+        condition = Q()
+        for word in words:
+            condition &= Q(*(
+                Q(**{f'{field}__icontains': word}) for field in index.fields
+            ), _connector=Q.OR)
+        return list(index.get_queryset().using(using).filter(
+            condition).order_by('pk').values_list(
+            'pk', flat=True)[offset:offset + limit])
+    with connections[using].cursor() as cursor:
+        return backend.search(cursor, model, index, words, limit, offset)
@@ -0,0 +1,170 @@
+"""
+Генерация синтетических данных каталога для замеров производительности.
+Записи создаются через bulk_create пачками по batch_size
+"""
+import random
+
+from django.db.models import Max
+
+from .models import (
+    Actor, Category, Genre, Movie, MovieRating, Rating, RatingStar, Review, )
+
+GENRES = (
+    'Боевик', 'Вестерн', 'Детектив', 'Драма', 'Комедия', 'Мелодрама',
+    'Приключения', 'Триллер', 'Ужасы', 'Фантастика', 'Фэнтези', 'Мультфильм',
+)
+CATEGORIES = ('Фильмы', 'Сериалы', 'Мультфильмы', 'Документальные')
+
+
+def batched(iterable, size):
+    """Разбить последовательность на списки по size элементов"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed_dictionaries():
+    """Категории, жанры и звёзды рейтинга (создаются, если их нет)"""
+    for value in range(1, 6):
+        RatingStar.objects.get_or_create(value=value)
+    categories = [
+        Category.objects.get_or_create(
+            url=f'seed-category-{number}',
+            defaults={'name': name, 'description': name})[0]
+        for number, name in enumerate(CATEGORIES)
+    ]
+    genres = [
+        Genre.objects.get_or_create(
+            url=f'seed-genre-{number}',
+            defaults={'name': name, 'description': name})[0]
+        for number, name in enumerate(GENRES)
+    ]
+    return categories, genres
+
+
+def seed_movies(count, categories, batch_size=1000, draft_ratio=0.05,
+                rnd=random):
+    """
+    count фильмов со случайными годом, категорией и признаком черновика.
+    Возвращает id созданных фильмов
+    """
+    start = Movie.objects.filter(url__startswith='seed-movie-').count()
+    last_pk = Movie.objects.aggregate(last=Max('pk'))['last'] or 0
+    movies = (
+        Movie(
+            title=f'Фильм {number}',
+            tagline=f'Слоган фильма {number}',
+            description=f'Описание фильма {number}',
+            year=rnd.randint(1950, 2025),
+            country=rnd.choice(('США', 'Россия', 'Франция', 'Беларусь')),
+            category=rnd.choice(categories),
+            url=f'seed-movie-{number}',
+            draft=rnd.random() < draft_ratio,
+        )
+        for number in range(start, start + count)
+    )
+    for batch in batched(movies, batch_size):
+        Movie.objects.bulk_create(batch)
+    return list(Movie.objects.filter(
+        pk__gt=last_pk).values_list('pk', flat=True))
+
+
+def seed_actors(count, batch_size=1000, rnd=random):
+    """count актёров/режиссёров. Возвращает id созданных записей"""
+    last_pk = Actor.objects.aggregate(last=Max('pk'))['last'] or 0
+    actors = (
+        Actor(
+            name=f'Актёр {number}',
+            age=rnd.randint(18, 90),
+            description=f'Биография актёра {number}',
+        )
+        for number in range(count)
+    )
+    for batch in batched(actors, batch_size):
+        Actor.objects.bulk_create(batch)
+    return list(Actor.objects.filter(
+        pk__gt=last_pk).values_list('pk', flat=True))
+
+
+def seed_movie_people(movie_ids, actor_ids, actors_per_movie=8,
+                      directors_per_movie=1, batch_size=5000, rnd=random):
+    """Связи M2M фильмов с актёрами и режиссёрами (через through-таблицы)"""
+    for relation, per_movie in ((Movie.actors, actors_per_movie),
+                                (Movie.directors, directors_per_movie)):
+        through = relation.through
+        links = (
+            through(movie_id=movie_id, actor_id=actor_id)
+            for movie_id in movie_ids
+            for actor_id in rnd.sample(
+                actor_ids, min(per_movie, len(actor_ids)))
+        )
+        for batch in batched(links, batch_size):
+            through.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def seed_movie_genres(movie_ids, genres, per_movie=2, batch_size=5000,
+                      rnd=random):
+    through = Movie.genres.through
+    links = (
+        through(movie_id=movie_id, genre_id=genre.pk)
+        for movie_id in movie_ids
+        for genre in rnd.sample(genres, min(per_movie, len(genres)))
+    )
+    for batch in batched(links, batch_size):
+        through.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def seed_ratings(movie_ids, count, batch_size=5000, rnd=random):
+    """
+    count голосов по случайным фильмам (ip уникален в пределах фильма),
+    затем пересчёт агрегатов MovieRating
+    """
+    stars = list(RatingStar.objects.values_list('pk', flat=True))
+    ratings = (
+        Rating(
+            ip=f'10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}',
+            star_id=rnd.choice(stars),
+            movie_id=rnd.choice(movie_ids),
+        )
+        for number in range(count)
+    )
+    for batch in batched(ratings, batch_size):
+        Rating.objects.bulk_create(batch, ignore_conflicts=True)
+    MovieRating.rebuild()
+
+
+def seed_reviews(movie_ids, roots_per_movie=5, depth=5, replies=2,
+                 batch_size=5000, rnd=random):
+    """
+    Ветки отзывов: roots_per_movie корневых отзывов на фильм, на каждый
+    отзыв replies ответов, и так depth уровней. Уровни создаются по очереди:
+    bulk_create в Django 3.2 не возвращает id для SQLite
+    """
+    def create(level):
+        last_pk = Review.objects.aggregate(last=Max('pk'))['last'] or 0
+        for batch in batched(level, batch_size):
+            Review.objects.bulk_create(batch)
+        return list(Review.objects.filter(
+            pk__gt=last_pk).values_list('pk', 'movie_id'))
+
+    def review(movie_id, parent_id=None):
+        number = rnd.randint(0, 10 ** 6)
+        return Review(
+            email=f'user{number}@example.com', name=f'Зритель {number}',
+            text=f'Отзыв {number}', movie_id=movie_id, parent_id=parent_id)
+
+    level = create(
+        review(movie_id)
+        for movie_id in movie_ids for _ in range(roots_per_movie))
+    total = len(level)
+    for _ in range(depth - 1):
+        level = create(
+            review(movie_id, parent_id)
+            for parent_id, movie_id in level for _ in range(replies))
+        total += len(level)
+    return total
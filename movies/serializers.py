@@ -1,27 +1,36 @@
-from rest_framework import serializers
+import re
+from abc import ABC, abstractmethod
 
-from .models import Review, Movie, Rating, Actor
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models, transaction
 
+from rest_framework import serializers
 
-class FilterReviewListSerializer(serializers.ListSerializer):
-    """Фильтр комментариев, только parents"""
+from django_movie_rest.sqlite import retry_on_locked
 
-    def to_representation(self, data):
-        # data - кверисет => получить все родительские отзывы
-        data = data.filter(parent=None)
-        return super().to_representation(data)
+from . import cache, images
+from .models import Review, Movie, Rating, Actor, MovieRating
+from .rating_buffer import flush_votes
+from .service import get_rated_movie_ids, build_review_tree
 
 
-class RecursiveSerializer(serializers.Serializer):
+class ReviewTreeListSerializer(serializers.ListSerializer):
     """
-    Получение всех записей завязанных на parent.
-    Рекурсивный вывод children - дочерних отзывов
+    Дерево отзывов фильма: все отзывы одним запросом, вложенность
+    children собирается в памяти (см. service.build_review_tree)
     """
 
-    def to_representation(self, instance):
-        serializer = self.parent.parent.__class__(
-            instance, context=self.context)
-        return serializer.data
+    def to_representation(self, data):
+        reviews = data.all() if isinstance(data, models.Manager) else data
+        if isinstance(reviews, models.QuerySet) and not reviews.ordered:
+            reviews = reviews.order_by('pk')
+        max_nodes = settings.REVIEW_TREE_MAX_NODES
+        if max_nodes is not None:
+            reviews = reviews[:max_nodes]
+        return build_review_tree(
+            reviews, self.child.to_representation,
+            max_depth=settings.REVIEW_TREE_MAX_DEPTH)
 
 
 class ReviewCreateSerializer(serializers.ModelSerializer):
@@ -33,46 +42,225 @@ class ReviewCreateSerializer(serializers.ModelSerializer):
 
 
 class ReviewSerializer(serializers.ModelSerializer):
-    """Вывод отзыва"""
-    # Рекурсивный вывод отзывов
-    children = RecursiveSerializer(many=True)
+    """Вывод отзыва (поле children добавляет ReviewTreeListSerializer)"""
 
     class Meta:
-        # Фильтрация ответа - вывод только родительских отзывов
-        list_serializer_class = FilterReviewListSerializer
+        # Вывод родительских отзывов с вложенными дочерними
+        list_serializer_class = ReviewTreeListSerializer
         model = Review
-        fields = ('id', 'name', 'text', 'children')
+        fields = ('id', 'name', 'text')
+
 
+class SparseFieldsMixin:
+    """
+    Только поля context['sparse_fields'] (заполняет
+    mixins.SparseFieldsetMixin по ?fields= и ?expand=). Применяется к
+    корневому сериализатору ответа, вложенные выводятся полностью
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('sparse_fields')
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if selected is None or parent is not None:
+            return fields
+        return type(fields)(
+            (name, field) for name, field in fields.items()
+            if name in selected)
 
-class ActorListSerializer(serializers.ModelSerializer):
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    URL уменьшенных копий изображения (movies.images):
+    {вариант: {формат: url}} или None, если изображения нет
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        urls = images.variant_urls(value.name, value.storage)
+        request = self.context.get('request', None)
+        if request is not None:
+            for formats in urls.values():
+                for image_format, url in formats.items():
+                    formats[image_format] = request.build_absolute_uri(url)
+        return urls
+
+
+class ActorListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Вывод списка актёров или режиссёров"""
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = Actor
-        fields = ('id', 'name', 'image')
+        fields = ('id', 'name', 'image', 'image_variants')
 
 
-class ActorDetailSerializer(serializers.ModelSerializer):
+class ActorDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Вывод полного описания актёра или режиссёра"""
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = Actor
         fields = '__all__'
 
 
-class MovieListSerializer(serializers.ModelSerializer):
+class RatedMovieListSerializer(serializers.ListSerializer):
+    """
+    Список фильмов с отметкой 'голосовал ли клиент'. Отметка определяется
+    одним запросом по индексу (ip, movie) только для фильмов текущей страницы
+    """
+
+    def to_representation(self, data):
+        movies = data.all() if isinstance(data, models.Manager) else data
+        movies = list(movies)
+        request = self.context.get('request')
+        rated = set()
+        if request is not None:
+            rated = get_rated_movie_ids(request, [movie.pk for movie in movies])
+        self.context['rated_movie_ids'] = rated
+        return super().to_representation(movies)
+
+
+class MovieListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Список фильмов"""
-    # Доп. поле. Логика выполнения определяется во views
-    rating_user = serializers.BooleanField()
+    # Доп. поля. rating_user - по id страницы, middle_star - во views
+    rating_user = serializers.SerializerMethodField()
     middle_star = serializers.IntegerField()
+    poster_variants = ImageVariantsField(source='poster')
 
     class Meta:
+        list_serializer_class = RatedMovieListSerializer
         model = Movie
         fields = ('id', 'title', 'tagline', 'category', 'rating_user',
-                  'middle_star', 'poster')
+                  'middle_star', 'poster', 'poster_variants')
+
+    def get_rating_user(self, obj):
+        rated = self.context.get('rated_movie_ids')
+        if rated is None:
+            # Сериализация одного объекта, без списка
+            return bool(getattr(obj, 'rating_user', False))
+        return obj.pk in rated
+
+
+# Путь URL, который не меняют build_absolute_uri и iri_to_uri
+PLAIN_URL_PATH = re.compile(r"[\w\-.~/%=:;$&()+,!*@']*\Z", re.ASCII)
+
+
+class FastListSerializer(ABC):
+    """
+    Быстрый вывод списка без механизма полей DRF: строки .values()
+    (колонки columns) -> dict с полями и порядком model_serializer_class.
+    Вывод совпадает побайтно (проверяет команда benchmark_serializers).
+    Используется FastListMixin вместо сериализатора с many=True
+    """
+    model_serializer_class = None
+    columns = ()
+    # Поле изображения модели: URL файла и его копий (movies.images)
+    image_field = None
+
+    def __init__(self, instance=None, context=None, **kwargs):
+        self.instance = instance
+        self.context = context or {}
+        self.request = self.context.get('request')
+        self.url_prefix = None
+        if self.request is not None:
+            self.url_prefix = self.request.build_absolute_uri('/')[:-1]
+        model = self.model_serializer_class.Meta.model
+        self.storage = model._meta.get_field(self.image_field).storage
+
+    @classmethod
+    def prepare_queryset(cls, queryset):
+        return queryset.prefetch_related(None).values(*cls.columns)
+
+    @property
+    def data(self):
+        data = self.to_representation(list(self.instance))
+        selected = self.context.get('sparse_fields')
+        if selected is not None:
+            data = [
+                {name: value for name, value in item.items()
+                 if name in selected}
+                for item in data]
+        return data
+
+    @abstractmethod
+    def to_representation(self, rows):
+        """Строки .values() (колонки columns) -> список dict ответа"""
+
+    def absolute_url(self, url):
+        """
+        request.build_absolute_uri(url) без разбора URL для путей от корня
+        из символов, которые iri_to_uri не меняет (обычный случай)
+        """
+        if self.request is None:
+            return url
+        if (url.startswith('/') and not url.startswith('//')
+                and '/.' not in url and PLAIN_URL_PATH.match(url)):
+            return self.url_prefix + url
+        return self.request.build_absolute_uri(url)
+
+    def image_url(self, name):
+        """Как serializers.ImageField"""
+        if not name:
+            return None
+        return self.absolute_url(self.storage.url(name))
+
+    def image_variant_urls(self, name):
+        """Как ImageVariantsField"""
+        if not name:
+            return None
+        urls = images.variant_urls(name, self.storage)
+        for formats in urls.values():
+            for image_format, url in formats.items():
+                formats[image_format] = self.absolute_url(url)
+        return urls
+
+
+class MovieFastListSerializer(FastListSerializer):
+    """MovieListSerializer для FastListMixin"""
+    model_serializer_class = MovieListSerializer
+    columns = ('id', 'title', 'tagline', 'category_id', 'middle_star',
+               'poster')
+    image_field = 'poster'
+
+    def to_representation(self, rows):
+        request = self.context.get('request')
+        rated = set()
+        if request is not None:
+            rated = get_rated_movie_ids(request, [row['id'] for row in rows])
+        image_url, variant_urls = self.image_url, self.image_variant_urls
+        return [{
+            'id': row['id'],
+            'title': row['title'],
+            'tagline': row['tagline'],
+            'category': row['category_id'],
+            'rating_user': row['id'] in rated,
+            'middle_star': row['middle_star'],
+            'poster': image_url(row['poster']),
+            'poster_variants': variant_urls(row['poster']),
+        } for row in rows]
 
 
-class MovieDetailSerializer(serializers.ModelSerializer):
+class ActorFastListSerializer(FastListSerializer):
+    """ActorListSerializer для FastListMixin"""
+    model_serializer_class = ActorListSerializer
+    columns = ('id', 'name', 'image')
+    image_field = 'image'
+
+    def to_representation(self, rows):
+        image_url, variant_urls = self.image_url, self.image_variant_urls
+        return [{
+            'id': row['id'],
+            'name': row['name'],
+            'image': image_url(row['image']),
+            'image_variants': variant_urls(row['image']),
+        } for row in rows]
+
+
+class MovieDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Полный вывод фильма"""
     # Вывести данные полей, а не их id
     category = serializers.SlugRelatedField(slug_field='name', read_only=True)
@@ -83,10 +271,38 @@ class MovieDetailSerializer(serializers.ModelSerializer):
 
     # Доп. поля
     reviews = ReviewSerializer(many=True)
+    poster_variants = ImageVariantsField(source='poster')
 
     class Meta:
         model = Movie
         exclude = ('draft',)
+        # Связи для построения запроса во views (см. mixins.optimize_queryset).
+        # reviews не догружаются: дерево отзывов - один запрос с лимитом
+        select_related = ('category',)
+        prefetch_related = ('directors', 'actors', 'genres')
+
+
+class FacetCountSerializer(serializers.Serializer):
+    """Значение фасета и кол-во фильмов"""
+    name = serializers.CharField()
+    url = serializers.SlugField()
+    count = serializers.IntegerField()
+
+
+class YearCountSerializer(serializers.Serializer):
+    year = serializers.IntegerField()
+    count = serializers.IntegerField()
+
+
+class MovieFacetsSerializer(serializers.Serializer):
+    """
+    Ответ действия facets (movies.facets.get_facets). Ответ строится без
+    сериализатора, этот - описание схемы для документации
+    """
+    total = serializers.IntegerField()
+    genres = FacetCountSerializer(many=True)
+    years = YearCountSerializer(many=True)
+    categories = FacetCountSerializer(many=True)
 
 
 class CreateRatingSerializer(serializers.ModelSerializer):
@@ -96,12 +312,126 @@ class CreateRatingSerializer(serializers.ModelSerializer):
         model = Rating
         fields = ('star', 'movie')
 
+    @retry_on_locked
     def create(self, validated_data):
         # validated_data - данные с клиента
-        rating, _ = Rating.objects.update_or_create(
-            ip=validated_data.get('ip', None),
-            movie=validated_data.get('movie', None),
-            # Обновляем/создаём поле star
-            defaults={'star': validated_data.get('star')}
-        )
+        ip = validated_data.get('ip', None)
+        movie = validated_data.get('movie', None)
+        star = validated_data.get('star')
+        with transaction.atomic():
+            # Прежняя оценка с этого ip (при повторном голосовании)
+            previous = Rating.objects.select_for_update(of=('self',)).filter(
+                ip=ip, movie=movie).values_list('star__value', flat=True).first()
+            rating, _ = Rating.objects.update_or_create(
+                ip=ip,
+                movie=movie,
+                # Обновляем/создаём поле star
+                defaults={'star': star}
+            )
+            # Инкрементальное обновление агрегата рейтинга фильма
+            MovieRating.register_vote(movie.pk, star.value, previous)
         return rating
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Связь по id, которая берёт объект из context['preloaded'][модель]
+    (заполняет BulkCreateListSerializer), а не запросом на каждое значение
+    """
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {})
+        model = self.get_queryset().model
+        if model not in preloaded:
+            return super().to_internal_value(data)
+        try:
+            pk = model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if isinstance(data, bool) or pk not in preloaded[model]:
+            self.fail('does_not_exist', pk_value=data)
+        return preloaded[model][pk]
+
+
+class BulkCreateListSerializer(serializers.ListSerializer):
+    """
+    Пакетное создание: связи всех элементов проверяются одним IN-запросом
+    на модель, ошибки возвращаются по каждому элементу, запись - методом
+    bulk_create дочернего сериализатора
+    """
+
+    def preload_related(self, items):
+        preloaded = self._context.setdefault('preloaded', {})
+        for field in self.child.fields.values():
+            if field.read_only or not isinstance(
+                    field, PreloadedPrimaryKeyRelatedField):
+                continue
+            model = field.get_queryset().model
+            pks = set()
+            for item in items:
+                if isinstance(item, dict):
+                    try:
+                        pks.add(model._meta.pk.to_python(
+                            item.get(field.field_name)))
+                    except (TypeError, ValueError, DjangoValidationError):
+                        pass
+            pks.discard(None)
+            preloaded[model] = {
+                **preloaded.get(model, {}),
+                **field.get_queryset().in_bulk(pks),
+            }
+
+    def validate_items(self):
+        """(валидные данные, [{'index': ..., 'errors': ...}])"""
+        items = self.initial_data
+        self.preload_related(items)
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                valid.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+        return valid, errors
+
+    def bulk_create(self, validated_data):
+        return self.child.bulk_create(validated_data)
+
+
+class ReviewBulkCreateSerializer(serializers.ModelSerializer):
+    """Пакетное добавление отзывов (импорт, модерация)"""
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    class Meta:
+        list_serializer_class = BulkCreateListSerializer
+        model = Review
+        fields = ('email', 'name', 'text', 'parent', 'movie')
+
+    @retry_on_locked
+    def bulk_create(self, validated_data):
+        reviews = [Review(**item) for item in validated_data]
+        with transaction.atomic():
+            Review.objects.bulk_create(
+                reviews, batch_size=settings.BULK_CREATE_BATCH_SIZE)
+        # bulk_create не вызывает сигналы (см. movies.signals)
+        cache.invalidate_objects(
+            cache.MOVIES, {review.movie_id for review in reviews})
+        return len(reviews)
+
+
+class RatingBulkCreateSerializer(serializers.ModelSerializer):
+    """
+    Пакетное добавление голосов с явным ip. Повторный голос с того же ip
+    заменяет прежний, агрегаты MovieRating обновляются пачкой
+    """
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    class Meta:
+        list_serializer_class = BulkCreateListSerializer
+        model = Rating
+        fields = ('ip', 'star', 'movie')
+
+    def bulk_create(self, validated_data):
+        votes = {
+            (item['ip'], item['movie'].pk): item['star'].pk
+            for item in validated_data}
+        return flush_votes(votes)
@@ -1,9 +1,23 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode
+from functools import reduce
+from urllib import parse
+
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from django_filters import rest_framework as filters
 
-from .models import Movie
+from .models import Movie, Rating
 
 
 def get_client_ip(request):
@@ -16,6 +30,49 @@ def get_client_ip(request):
     return ip
 
 
+def get_rated_movie_ids(request, movie_ids):
+    """
+    id фильмов из movie_ids, за которые голосовал клиент.
+    Один запрос по индексу (ip, movie)
+    """
+    if not movie_ids:
+        return set()
+    return set(Rating.objects.filter(
+        ip=get_client_ip(request), movie_id__in=movie_ids,
+    ).values_list('movie_id', flat=True))
+
+
+def build_review_tree(reviews, represent, max_depth=None):
+    """
+    Собрать дерево отзывов из плоского списка за O(n), без рекурсии.
+    represent(review) - словарь полей отзыва, поле children добавляется здесь.
+    Отзывы глубже max_depth и отзывы без загруженного родителя отбрасываются
+    """
+    nodes = {}
+    for review in reviews:
+        node = represent(review)
+        node['children'] = []
+        nodes[review.pk] = (review.parent_id, node)
+
+    roots = []
+    for parent_id, node in nodes.values():
+        if parent_id is None:
+            roots.append(node)
+        elif parent_id in nodes:
+            nodes[parent_id][1]['children'].append(node)
+
+    if max_depth is not None:
+        level, depth = roots, 1
+        while level:
+            if depth >= max_depth:
+                for node in level:
+                    node['children'] = []
+                break
+            level = [child for node in level for child in node['children']]
+            depth += 1
+    return roots
+
+
 class CharFilterInFilter(filters.BaseInFilter, filters.CharFilter):
     """
     Для объединения разных фильтров.
@@ -48,3 +105,189 @@ class PaginationMovies(PageNumberPagination):
             'count': self.page.paginator.count,
             'results': data
         })
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация: WHERE по ключу сортировки вместо OFFSET.
+    Ответ - как у PaginationMovies (links, count, results); подсчёт count
+    отключается параметром ?count=false.
+
+    CursorPagination сравнивает только первое поле ordering, повторы его
+    значений пропускает через OFFSET. Здесь позиция курсора - значения
+    всех полей ordering, условие - сравнение кортежей:
+    (title, id) > (x, y) -> title >= x AND (title > x OR id > y).
+    Поля ordering - NOT NULL, последнее - уникальное (id)
+    """
+    count_query_param = 'count'
+    include_count = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if self.get_include_count(request):
+            self.count = queryset.count()
+
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering)
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(ordering, current_position))
+
+        # Лишняя запись - признак следующей страницы
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+        following_position = None
+        if has_following:
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        started = current_position is not None or offset > 0
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = started, has_following
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next, self.has_previous = has_following, started
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    @staticmethod
+    def get_keyset_filter(ordering, position):
+        """Записи после position в порядке ordering (сравнение кортежей)"""
+        fields = [
+            (name.lstrip('-'), 'lt' if name.startswith('-') else 'gt')
+            for name in ordering]
+        branches = []
+        for index, (name, lookup) in enumerate(fields):
+            equal = {
+                field: value
+                for (field, _), value in zip(fields[:index], position)}
+            branches.append(Q(**equal, **{
+                f'{name}__{lookup}': position[index]}))
+        # Условие по первому полю - диапазон индекса (title, id)
+        first, lookup = fields[0]
+        return Q(**{f'{first}__{lookup}e': position[0]}) & reduce(
+            Q.__or__, branches)
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        encoded = request.query_params[self.cursor_query_param]
+        try:
+            tokens = parse.parse_qs(
+                b64decode(encoded.encode('ascii')).decode('ascii'),
+                keep_blank_values=True)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        position = tuple(tokens['p'])
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def encode_cursor(self, cursor):
+        # Позиция - список значений: параметр p повторяется (doseq)
+        if cursor.position is not None:
+            cursor = cursor._replace(position=list(cursor.position))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            values = (instance[name.lstrip('-')] for name in ordering)
+        else:
+            values = (getattr(instance, name.lstrip('-')) for name in ordering)
+        return tuple(str(value) for value in values)
+
+    def get_include_count(self, request):
+        value = request.query_params.get(self.count_query_param)
+        if value is None:
+            return self.include_count
+        return value.lower() not in ('0', 'false', 'no')
+
+    def get_paginated_response(self, data):
+        response = {
+            'links': {
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link()
+            },
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+
+class CursorPaginationMovies(KeysetPagination):
+    # Порядок Movie.Meta.ordering + id для однозначности (индекс title, id)
+    ordering = ('title', 'id')
+    page_size = 2
+    max_page_size = 1000
+
+
+class PaginationActors(KeysetPagination):
+    # Порядок Actor.Meta.ordering + id (индекс name, id)
+    ordering = ('name', 'id')
+    page_size = 5
+
+
+class PaginationReviews(KeysetPagination):
+    ordering = ('id',)
+    page_size = 20
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Первый парсер/рендерер без учёта Accept - для views, которые сами
+    формируют ответ (выгрузки), иначе Accept: text/csv даёт 406
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer через orjson (если установлен) для ответов из строк,
+    чисел, bool и None - например, списков FastListSerializer.
+    Вывод совпадает с JSONRenderer (компактный, UTF-8, с экранированием
+    U+2028/U+2029); типы, которых нет в orjson, - через encoder_class
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,139 @@
+"""
+Сигналы моделей: сброс кэша ответов каталога (см. movies.cache),
+обновление поискового индекса (movies.search), копии изображений
+(movies.images) и сброс кэша проверки учётных данных (movies.authentication).
+Подключаются в MoviesConfig.ready
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.signals import (
+    post_save, post_delete, pre_delete, m2m_changed, )
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from . import authentication, cache, images, search
+from .models import (
+    Actor, Category, Genre, Movie, MovieRating, MovieShots, Rating, Review, )
+
+
+@receiver((post_save, post_delete), sender=Movie)
+def movie_changed(sender, instance, **kwargs):
+    cache.invalidate(cache.MOVIES, [instance.pk])
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Actor)
+def search_index_changed(sender, instance, **kwargs):
+    """Черновики фильмов удаляются из индекса"""
+    search.update_index(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=Actor)
+def search_index_deleted(sender, instance, **kwargs):
+    search.remove_from_index(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Actor)
+@receiver(post_save, sender=MovieShots)
+def image_saved(sender, instance, **kwargs):
+    """Готовые копии пропускаются (имя нового файла всегда новое)"""
+    field = images.IMAGE_FIELDS[sender._meta.label]
+    images.schedule([getattr(instance, field).name])
+
+
+# Для связанных моделей удаление обрабатывается в pre_delete,
+# пока связи с фильмами ещё существуют
+@receiver((post_save, pre_delete), sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """Категории - в фасетах списка и в детальном выводе фильмов"""
+    pks = Movie.objects.filter(category=instance).values_list('pk', flat=True)
+    cache.invalidate(cache.MOVIES, pks)
+
+
+@receiver((post_save, pre_delete), sender=Genre)
+def genre_changed(sender, instance, **kwargs):
+    """Жанры - в фильтре списка и в детальном выводе фильмов"""
+    pks = Movie.objects.filter(genres=instance).values_list('pk', flat=True)
+    cache.invalidate(cache.MOVIES, pks)
+
+
+def invalidate_actors(pks):
+    """Актёры и режиссёры выводятся в детальном выводе фильмов"""
+    cache.invalidate(cache.ACTORS, pks)
+    movie_pks = Movie.objects.filter(
+        Q(actors__in=pks) | Q(directors__in=pks)
+    ).distinct().values_list('pk', flat=True)
+    cache.invalidate_objects(cache.MOVIES, movie_pks)
+
+
+@receiver((post_save, pre_delete), sender=Actor)
+def actor_changed(sender, instance, **kwargs):
+    invalidate_actors([instance.pk])
+
+
+@receiver(images.variants_generated)
+def image_variants_generated(sender, names, **kwargs):
+    """URL копий - в ответах с этими изображениями (кадры не выводятся)"""
+    movie_pks = list(
+        Movie.objects.filter(poster__in=names).values_list('pk', flat=True))
+    if movie_pks:
+        cache.invalidate(cache.MOVIES, movie_pks)
+    actor_pks = list(
+        Actor.objects.filter(image__in=names).values_list('pk', flat=True))
+    if actor_pks:
+        invalidate_actors(actor_pks)
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.directors.through)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def movie_relations_changed(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            cache.invalidate(cache.MOVIES, [instance.pk])
+    elif action == 'pre_clear':
+        # clear со стороны актёра/жанра: pk_set не передаётся - id фильмов
+        # до удаления связей (версии увеличиваются после фиксации)
+        cache.invalidate(cache.MOVIES, sender.objects.filter(
+            **{instance._meta.model_name: instance},
+        ).values_list('movie_id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        # Изменение со стороны актёра/жанра: pk_set - id фильмов
+        cache.invalidate(cache.MOVIES, pk_set)
+
+
+@receiver((post_save, post_delete), sender=Review)
+def review_changed(sender, instance, **kwargs):
+    cache.invalidate_objects(cache.MOVIES, [instance.movie_id])
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    """
+    Удаление голоса (в т.ч. каскадом от фильма или звезды) - вычесть его
+    из агрегата. Пачка удалений - MovieRating.deferred
+    """
+    if not MovieRating.is_deferred():
+        MovieRating.unregister_vote(instance.movie_id, instance.star.value)
+
+
+@receiver(post_save, sender=MovieRating)
+def movie_rating_changed(sender, instance, **kwargs):
+    """Средняя оценка выводится в списке фильмов"""
+    if getattr(instance, 'middle_star_changed', True):
+        cache.invalidate(cache.MOVIES)
+
+
+@receiver((post_save, post_delete), sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    """Смена пароля, is_active, прав - сброс проверенных учётных данных"""
+    authentication.invalidate_user(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Token)
+def token_changed(sender, instance, **kwargs):
+    authentication.invalidate_user(instance.user_id)
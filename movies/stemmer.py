@@ -0,0 +1,123 @@
+"""
+Стеммер русского языка (алгоритм Snowball, snowballstem.org/algorithms/russian)
+
+Используется поиском (movies.search) для SQLite FTS5: в индекс и в запрос
+попадают основы слов, поэтому 'терминатора' находит 'Терминатор'.
+Для PostgreSQL то же делает встроенная конфигурация 'russian'
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+     'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+     'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'),
+)
+DERIVATIONAL = ((), ('ост', 'ость'))
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _regions(word):
+    """Начала областей RV и R2"""
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _remove_ending(word, groups, start):
+    """
+    Удалить самое длинное окончание из groups, лежащее в word[start:].
+    Окончания первой группы удаляются, только если перед ними 'а' или 'я'
+    (тоже в области). Возвращает новое слово или None
+    """
+    found = None
+    for number, endings in enumerate(groups):
+        for ending in endings:
+            position = len(word) - len(ending)
+            if (position >= start and word.endswith(ending)
+                    and (found is None or len(ending) > len(found[0]))):
+                found = (ending, number)
+    if found is None:
+        return None
+    ending, number = found
+    position = len(word) - len(ending)
+    if number == 0 and (
+            position - 1 < start or word[position - 1] not in 'ая'):
+        return None
+    return word[:position]
+
+
+def stem(word):
+    """Основа слова (слово в нижнем регистре, 'ё' заменяется на 'е')"""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+
+    # Шаг 1
+    result = _remove_ending(word, PERFECTIVE_GERUND, rv)
+    if result is None:
+        word = _remove_ending(word, REFLEXIVE, rv) or word
+        result = _remove_ending(word, ADJECTIVE, rv)
+        if result is not None:
+            result = _remove_ending(result, PARTICIPLE, rv) or result
+        else:
+            result = (_remove_ending(word, VERB, rv)
+                      or _remove_ending(word, NOUN, rv))
+    word = result if result is not None else word
+
+    # Шаг 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    word = _remove_ending(word, DERIVATIONAL, r2) or word
+
+    # Шаг 4: превосходная степень, 'нн' -> 'н', мягкий знак
+    superlative = _remove_ending(word, ((), ('ейш', 'ейше')), rv)
+    if superlative is not None:
+        word = superlative
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    elif superlative is None and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def stem_text(text):
+    """Текст -> основы слов через пробел"""
+    return ' '.join(stem(word) for word in WORD_RE.findall(text))
@@ -0,0 +1,734 @@
+"""
+Бюджеты SQL-запросов API views (QueryBudgetMixin.max_queries).
+При ASSERT_MAX_QUERIES превышение бюджета - AssertionError в view.
+Данных столько, чтобы N+1 по связям (актёры, жанры, отзывы, голоса)
+вышел за бюджет
+"""
+import base64
+import json
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from django.urls import reverse
+
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from . import authentication, cache, images
+from .checks import check_shared_cache
+from .models import Actor, Movie, MovieRating, Rating, RatingStar, Review
+from .seed import (
+    seed_dictionaries, seed_movies, seed_actors, seed_movie_people,
+    seed_movie_genres, seed_ratings, seed_reviews, )
+from .service import CursorPaginationMovies, PaginationActors
+
+
+@override_settings(ASSERT_MAX_QUERIES=True)
+class QueryBudgetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        categories, genres = seed_dictionaries()
+        movie_ids = seed_movies(12, categories, draft_ratio=0, rnd=rnd)
+        actor_ids = seed_actors(30, rnd=rnd)
+        seed_movie_people(
+            movie_ids, actor_ids, actors_per_movie=5, directors_per_movie=2,
+            rnd=rnd)
+        seed_movie_genres(movie_ids, genres, per_movie=3, rnd=rnd)
+        seed_ratings(movie_ids, 200, rnd=rnd)
+        seed_reviews(movie_ids[:2], roots_per_movie=3, depth=3, rnd=rnd)
+        cls.movie = Movie.objects.get(pk=movie_ids[0])
+        cls.actor = Actor.objects.get(pk=actor_ids[0])
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        # Ответ из кэша каталога не обращается к БД
+        cache.get_cache().clear()
+        # Все записи на одной странице: N+1 - запрос на каждую строку
+        for pagination in (CursorPaginationMovies, PaginationActors):
+            patcher = mock.patch.object(pagination, 'page_size', 20)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, name, pk=None, **params):
+        kwargs = {'pk': pk} if pk is not None else {}
+        response = self.client.get(reverse(name, kwargs=kwargs), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_movie_list(self):
+        response = self.get('movies:movie-list')
+        self.assertEqual(len(response.data['results']), 12)
+
+    @override_settings(FAST_LIST_SERIALIZATION=False)
+    def test_movie_list_drf_serializer(self):
+        self.get('movies:movie-list')
+
+    def test_movie_list_sparse_fields(self):
+        self.get('movies:movie-list', fields='id,title', expand='category')
+
+    def test_movie_detail(self):
+        response = self.get('movies:movie-detail', self.movie.pk)
+        self.assertEqual(len(response.data['actors']), 5)
+        self.assertEqual(len(response.data['reviews']), 3)
+
+    def test_movie_facets(self):
+        response = self.get('movies:movie-facets')
+        self.assertEqual(response.data['total'], 12)
+
+    def test_actor_list(self):
+        self.client.force_authenticate(self.admin)
+        response = self.get('movies:actor-list')
+        self.assertEqual(len(response.data['results']), 20)
+
+    @override_settings(FAST_LIST_SERIALIZATION=False)
+    def test_actor_list_drf_serializer(self):
+        self.client.force_authenticate(self.admin)
+        self.get('movies:actor-list')
+
+    def test_actor_detail(self):
+        self.client.force_authenticate(self.admin)
+        self.get('movies:actor-detail', self.actor.pk)
+
+    def test_review_bulk(self):
+        parent = Review.objects.filter(movie=self.movie).first()
+        movies = Movie.objects.values_list('pk', flat=True)
+        data = [
+            {'email': f'bulk{number}@example.com', 'name': 'Зритель',
+             'text': 'Отзыв', 'movie': movie_id,
+             'parent': parent.pk if number % 2 else None}
+            for number, movie_id in enumerate(movies)
+        ]
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            reverse('movies:review-bulk'), data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['saved'], len(data))
+
+
+class MovieAdminActionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categories, _ = seed_dictionaries()
+        cls.movie_ids = seed_movies(
+            3, categories, draft_ratio=1, rnd=random.Random(0))
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def test_publish_filtered_by_draft(self):
+        # Выборка списка изменений по draft после update() пуста: кэш
+        # и индекс поиска - по pk, собранным до обновления
+        self.client.force_login(self.admin)
+        url = reverse('admin:movies_movie_changelist') + '?draft__exact=1'
+        with mock.patch.object(cache, 'invalidate') as invalidate:
+            response = self.client.post(url, {
+                'action': 'publish', '_selected_action': self.movie_ids})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(
+            Movie.objects.filter(pk__in=self.movie_ids, draft=True).exists())
+        invalidate.assert_called_once_with(cache.MOVIES, self.movie_ids)
+
+
+class ActorCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.actor_ids = seed_actors(3, rnd=random.Random(0))
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.client.force_authenticate(self.admin)
+
+    def test_list_cached_for_authenticated(self):
+        url = reverse('movies:actor-list')
+        self.client.get(url)
+        # Из БД - только Last-Modified (ConditionalGetMixin)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_detail_invalidated_on_change(self):
+        actor = Actor.objects.get(pk=self.actor_ids[0])
+        url = reverse('movies:actor-detail', kwargs={'pk': actor.pk})
+        self.client.get(url)
+        actor.name = 'Новое имя'
+        # Версия кэша сбрасывается после фиксации транзакции
+        with self.captureOnCommitCallbacks(execute=True):
+            actor.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data['name'], 'Новое имя')
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categories, _ = seed_dictionaries()
+        movie_ids = seed_movies(
+            9, categories, draft_ratio=0, rnd=random.Random(0))
+        # Повторы title: страницы различаются только по id
+        for number, movie_id in enumerate(movie_ids):
+            Movie.objects.filter(pk=movie_id).update(
+                title=('Б', 'А', 'В')[number % 3])
+        cls.expected = list(Movie.objects.order_by(
+            'title', 'id').values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append([movie['id'] for movie in response.data['results']])
+            url = response.data['links'][link]
+        return pages
+
+    def test_forward_and_back(self):
+        pages = self.walk(reverse('movies:movie-list'), 'next')
+        self.assertEqual(len(pages), 5)
+        self.assertEqual(sum(pages, []), self.expected)
+
+        response = self.client.get(reverse('movies:movie-list'))
+        url = self.client.get(response.data['links']['next']).data[
+            'links']['next']
+        back = self.walk(url, 'previous')
+        self.assertEqual(back[1:], pages[1::-1])
+
+    def test_cursor_filters_by_title_and_id(self):
+        response = self.client.get(reverse('movies:movie-list'))
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(response.data['links']['next'])
+        sql = [query['sql'] for query in context.captured_queries]
+        self.assertTrue(any(
+            '"title" >= ' in query and '"id" > ' in query for query in sql))
+        self.assertFalse(any('OFFSET' in query for query in sql))
+
+
+class MovieRatingTests(APITestCase):
+    """Агрегат MovieRating совпадает с пересчётом по таблице Rating"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        categories, _ = seed_dictionaries()
+        cls.movie_ids = seed_movies(3, categories, draft_ratio=0, rnd=rnd)
+        seed_ratings(cls.movie_ids, 60, rnd=rnd)
+        cls.stars = {star.value: star for star in RatingStar.objects.all()}
+
+    def assertAggregates(self):
+        expected = {}
+        for movie_id, value in Rating.objects.values_list(
+                'movie_id', 'star__value'):
+            row = expected.setdefault(
+                movie_id, {'votes': 0, 'star_sum': 0, 'histogram': {}})
+            row['votes'] += 1
+            row['star_sum'] += value
+            row['histogram'][str(value)] = (
+                row['histogram'].get(str(value), 0) + 1)
+        actual = {
+            row.pop('movie_id'): row for row in MovieRating.objects.filter(
+                votes__gt=0).values(
+                'movie_id', 'votes', 'star_sum', 'middle_star', 'histogram')}
+        for movie_id, row in expected.items():
+            row['middle_star'] = row['star_sum'] // row['votes']
+        self.assertEqual(actual, expected)
+
+    def vote(self, movie_id, value, ip='192.168.0.1'):
+        response = self.client.post(
+            reverse('movies:rating-create'),
+            {'movie': movie_id, 'star': self.stars[value].pk},
+            REMOTE_ADDR=ip)
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_first_vote_and_revote(self):
+        movie_id = self.movie_ids[0]
+        votes = MovieRating.objects.get(movie_id=movie_id).votes
+        self.vote(movie_id, 5)
+        self.assertAggregates()
+        self.vote(movie_id, 1)
+        self.assertAggregates()
+        self.assertEqual(
+            MovieRating.objects.get(movie_id=movie_id).votes, votes + 1)
+
+    def test_first_vote_creates_aggregate(self):
+        MovieRating.objects.filter(movie_id=self.movie_ids[0]).delete()
+        Rating.objects.filter(movie_id=self.movie_ids[0]).delete()
+        self.vote(self.movie_ids[0], 4)
+        aggregate = MovieRating.objects.get(movie_id=self.movie_ids[0])
+        self.assertEqual(
+            (aggregate.votes, aggregate.middle_star, aggregate.histogram),
+            (1, 4, {'4': 1}))
+
+    def test_delete_vote(self):
+        # post_delete Rating (signals.rating_deleted)
+        Rating.objects.filter(movie_id=self.movie_ids[0]).first().delete()
+        self.assertAggregates()
+
+    def test_cascade_delete(self):
+        # Голоса всех фильмов удаляются каскадом от звезды
+        self.stars[5].delete()
+        self.assertAggregates()
+        Movie.objects.get(pk=self.movie_ids[1]).delete()
+        self.assertFalse(
+            MovieRating.objects.filter(movie_id=self.movie_ids[1]).exists())
+        self.assertAggregates()
+
+    def test_deferred_rebuild(self):
+        movie_ids = self.movie_ids[:2]
+        with mock.patch.object(
+                MovieRating, 'unregister_vote') as unregister_vote, \
+                MovieRating.deferred(movie_ids):
+            for rating in Rating.objects.filter(
+                    movie_id__in=movie_ids, star__value__gte=3):
+                rating.delete()
+        unregister_vote.assert_not_called()
+        self.assertAggregates()
+
+    def test_rebuild(self):
+        MovieRating.objects.update(votes=0, star_sum=0, histogram={})
+        MovieRating.rebuild(movie_ids=self.movie_ids[:1])
+        self.assertEqual(
+            MovieRating.objects.filter(votes=0).count(),
+            len(self.movie_ids) - 1)
+        MovieRating.rebuild()
+        self.assertAggregates()
+
+
+class LegacyReviewListSerializer(serializers.ListSerializer):
+    """Прежний вывод отзывов: только корневые, children - рекурсивно"""
+
+    def to_representation(self, data):
+        return super().to_representation(data.filter(parent=None))
+
+
+class LegacyRecursiveSerializer(serializers.Serializer):
+
+    def to_representation(self, instance):
+        return self.parent.parent.__class__(
+            instance, context=self.context).data
+
+
+class LegacyReviewSerializer(serializers.ModelSerializer):
+    children = LegacyRecursiveSerializer(many=True)
+
+    class Meta:
+        list_serializer_class = LegacyReviewListSerializer
+        model = Review
+        fields = ('id', 'name', 'text', 'children')
+
+
+class ReviewTreeTests(APITestCase):
+    """Дерево отзывов из одного запроса - как прежний рекурсивный вывод"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        categories, _ = seed_dictionaries()
+        movie_ids = seed_movies(2, categories, draft_ratio=0, rnd=rnd)
+        seed_reviews(movie_ids, roots_per_movie=3, depth=4, rnd=rnd)
+        cls.movie = Movie.objects.get(pk=movie_ids[0])
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def get_reviews(self):
+        response = self.client.get(
+            reverse('movies:movie-detail', kwargs={'pk': self.movie.pk}))
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(json.dumps(response.data['reviews']))
+
+    def test_same_as_recursive_serializer(self):
+        expected = LegacyReviewSerializer(
+            self.movie.reviews.order_by('pk'), many=True).data
+        self.assertEqual(self.get_reviews(), json.loads(json.dumps(expected)))
+
+    @override_settings(REVIEW_TREE_MAX_DEPTH=2)
+    def test_max_depth(self):
+        for root in self.get_reviews():
+            self.assertTrue(root['children'])
+            for child in root['children']:
+                self.assertEqual(child['children'], [])
+
+
+class CatalogueCacheTests(APITestCase):
+    """
+    Ответы из кэша: изменение через update() (без сигналов) не видно,
+    сигналы моделей сбрасывают версии после фиксации транзакции
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        categories, genres = seed_dictionaries()
+        movie_ids = seed_movies(2, categories, draft_ratio=0, rnd=rnd)
+        actor_ids = seed_actors(4, rnd=rnd)
+        seed_movie_people(
+            movie_ids, actor_ids, actors_per_movie=2, directors_per_movie=1,
+            rnd=rnd)
+        cls.movie, cls.other = Movie.objects.filter(pk__in=movie_ids)
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def detail(self, movie):
+        return self.client.get(
+            reverse('movies:movie-detail', kwargs={'pk': movie.pk})).data
+
+    def titles(self):
+        response = self.client.get(reverse('movies:movie-list'))
+        return {movie['id']: movie['title']
+                for movie in response.data['results']}
+
+    def test_detail_cached_until_saved(self):
+        self.detail(self.movie)
+        Movie.objects.filter(pk=self.movie.pk).update(title='Без сигнала')
+        self.assertEqual(self.detail(self.movie)['title'], self.movie.title)
+
+        self.movie.title = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.save()
+        self.assertEqual(self.detail(self.movie)['title'], 'Новое название')
+
+    def test_list_invalidated_by_movie(self):
+        self.titles()
+        self.other.title = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.save()
+        self.assertEqual(self.titles()[self.other.pk], 'Новое название')
+
+    def test_detail_keeps_other_movies(self):
+        self.detail(self.other)
+        Movie.objects.filter(pk=self.other.pk).update(title='Без сигнала')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.save()
+        self.assertEqual(self.detail(self.other)['title'], self.other.title)
+
+    def test_review_invalidates_detail(self):
+        self.detail(self.movie)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                email='user@example.com', name='Зритель', text='Отзыв',
+                movie=self.movie)
+        self.assertEqual(len(self.detail(self.movie)['reviews']), 1)
+
+    def test_actor_invalidates_detail(self):
+        self.detail(self.movie)
+        actor = self.movie.actors.first()
+        actor.name = 'Новое имя'
+        with self.captureOnCommitCallbacks(execute=True):
+            actor.save()
+        self.assertIn(
+            'Новое имя',
+            [item['name'] for item in self.detail(self.movie)['actors']])
+
+    def test_authenticated_list_not_cached(self):
+        self.client.force_authenticate(self.admin)
+        self.titles()
+        Movie.objects.filter(pk=self.movie.pk).update(title='Без сигнала')
+        self.assertEqual(self.titles()[self.movie.pk], 'Без сигнала')
+
+
+class ConditionalGetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        categories, _ = seed_dictionaries()
+        movie_ids = seed_movies(2, categories, draft_ratio=0, rnd=rnd)
+        actor_ids = seed_actors(4, rnd=rnd)
+        seed_movie_people(
+            movie_ids, actor_ids, actors_per_movie=2, directors_per_movie=1,
+            rnd=rnd)
+        cls.movie, cls.other = Movie.objects.filter(pk__in=movie_ids)
+        # Время изменения - в прошлом: новое изменение заметно в Last-Modified
+        past = timezone.now() - timedelta(days=1)
+        Movie.objects.update(updated_at=past)
+        Actor.objects.update(updated_at=past)
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def get(self, movie, **headers):
+        return self.client.get(
+            reverse('movies:movie-detail', kwargs={'pk': movie.pk}),
+            **headers)
+
+    def test_detail_last_modified_per_object(self):
+        last_modified = self.get(self.movie)['Last-Modified']
+        # Изменения другого фильма и его отзывов не меняют ответ
+        Review.objects.create(
+            email='user@example.com', name='Зритель', text='Отзыв',
+            movie=self.other)
+        self.other.save()
+        self.assertEqual(self.get(self.movie)['Last-Modified'], last_modified)
+        response = self.get(
+            self.movie, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        Review.objects.create(
+            email='user@example.com', name='Зритель', text='Отзыв',
+            movie=self.movie)
+        self.assertNotEqual(
+            self.get(self.movie)['Last-Modified'], last_modified)
+
+    def test_etag_not_modified(self):
+        response = self.get(self.movie)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        # 304 без сериализации: только запрос свежести и версия кэша
+        with self.assertNumQueries(1):
+            response = self.get(self.movie, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+
+    def test_etag_changes_after_save(self):
+        etag = self.get(self.movie)['ETag']
+        self.movie.title = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.save()
+        response = self.get(self.movie, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_depends_on_client(self):
+        # rating_user в списке зависит от ip клиента
+        url = reverse('movies:movie-list')
+        etag = self.client.get(url, REMOTE_ADDR='10.0.0.1')['ETag']
+        response = self.client.get(
+            url, REMOTE_ADDR='10.0.0.1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            url, REMOTE_ADDR='10.0.0.2', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class BulkCreateTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categories, _ = seed_dictionaries()
+        cls.movie_ids = seed_movies(
+            2, categories, draft_ratio=0, rnd=random.Random(0))
+        cls.stars = dict(RatingStar.objects.values_list('value', 'pk'))
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def review(self, number, **fields):
+        return {'email': f'bulk{number}@example.com', 'name': 'Зритель',
+                'text': 'Отзыв', 'movie': self.movie_ids[0], **fields}
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, format='json')
+
+    def test_all_saved(self):
+        response = self.post(
+            'movies:review-bulk', [self.review(number) for number in range(3)])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(
+            (response.data['saved'], response.data['errors']), (3, []))
+        self.assertEqual(Review.objects.count(), 3)
+
+    def test_partially_saved(self):
+        data = [self.review(0), self.review(1, movie=0),
+                self.review(2, email='не почта'), self.review(3)]
+        response = self.post('movies:review-bulk', data)
+        self.assertEqual(response.status_code, 207, response.content)
+        self.assertEqual(response.data['received'], 4)
+        self.assertEqual(response.data['saved'], 2)
+        errors = response.data['errors']
+        self.assertEqual([error['index'] for error in errors], [1, 2])
+        self.assertIn('movie', errors[0]['errors'])
+        self.assertIn('email', errors[1]['errors'])
+        self.assertEqual(Review.objects.count(), 2)
+
+    def test_nothing_saved(self):
+        response = self.post(
+            'movies:review-bulk', [self.review(0, movie='x'), {}])
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.data['saved'], 0)
+        self.assertFalse(Review.objects.exists())
+
+    @override_settings(BULK_CREATE_MAX_ITEMS=2)
+    def test_not_a_list_or_too_long(self):
+        response = self.post('movies:review-bulk', self.review(0))
+        self.assertEqual(response.status_code, 400)
+        response = self.post(
+            'movies:review-bulk', [self.review(number) for number in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Review.objects.exists())
+
+    def test_admin_only(self):
+        user = get_user_model().objects.create_user('user', password='pw')
+        self.client.force_authenticate(user)
+        response = self.post('movies:review-bulk', [self.review(0)])
+        self.assertEqual(response.status_code, 403)
+
+    def test_ratings(self):
+        # Повторный голос с того же ip заменяет прежний
+        data = [
+            {'ip': '10.1.0.1', 'movie': self.movie_ids[0],
+             'star': self.stars[2]},
+            {'ip': '10.1.0.2', 'movie': self.movie_ids[0],
+             'star': self.stars[5]},
+            {'ip': '10.1.0.1', 'movie': self.movie_ids[0],
+             'star': self.stars[4]},
+            {'ip': '10.1.0.1', 'movie': self.movie_ids[1], 'star': 0},
+        ]
+        response = self.post('movies:rating-bulk', data)
+        self.assertEqual(response.status_code, 207, response.content)
+        self.assertEqual(response.data['errors'][0]['index'], 3)
+        aggregate = MovieRating.objects.get(movie_id=self.movie_ids[0])
+        self.assertEqual(
+            (aggregate.votes, aggregate.star_sum, aggregate.histogram),
+            (2, 9, {'4': 1, '5': 1}))
+
+
+class CredentialCacheTests(APITestCase):
+    """Проверенные учётные данные сбрасываются сигналами пользователя"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'viewer', password='password')
+        cls.token = Token.objects.create(user=cls.user)
+        # delete() сбрасывает pk (key) объекта
+        cls.token_key = cls.token.key
+
+    def setUp(self):
+        cache.get_cache().clear()
+        authentication.get_verification_cache().clear()
+        self.url = reverse('movies:actor-list')
+
+    def basic(self, password='password'):
+        credentials = base64.b64encode(f'viewer:{password}'.encode())
+        return self.client.get(
+            self.url, HTTP_AUTHORIZATION=f'Basic {credentials.decode()}')
+
+    def token_auth(self):
+        return self.client.get(
+            self.url, HTTP_AUTHORIZATION=f'Token {self.token_key}')
+
+    def test_basic_verified_once(self):
+        with mock.patch.object(
+                get_user_model(), 'check_password',
+                autospec=True, return_value=True) as check_password:
+            self.assertEqual(self.basic().status_code, 200)
+            self.assertEqual(self.basic().status_code, 200)
+        check_password.assert_called_once()
+
+    def test_password_change(self):
+        self.assertEqual(self.basic().status_code, 200)
+        self.user.set_password('changed')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.basic().status_code, 401)
+        self.assertEqual(self.basic('changed').status_code, 200)
+
+    def test_deactivated(self):
+        self.assertEqual(self.basic().status_code, 200)
+        self.assertEqual(self.token_auth().status_code, 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.basic().status_code, 401)
+        self.assertEqual(self.token_auth().status_code, 401)
+
+    def test_token_deleted(self):
+        self.assertEqual(self.token_auth().status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.token_auth().status_code, 401)
+
+    def test_locmem_cache_warning(self):
+        self.assertEqual(
+            [error.id for error in check_shared_cache(None)], ['movies.W001'])
+        memcached = {'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.'
+                       'PyMemcacheCache'}}
+        with override_settings(CACHES=memcached):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+@override_settings(
+    IMAGE_VARIANTS={'small': 16}, IMAGE_VARIANT_FORMATS=('webp',),
+    IMAGE_VARIANT_WORKERS=0)
+class ImageVariantTests(APITestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.get_cache().clear()
+        self.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_authenticate(self.admin)
+
+    def create_actor(self, filename, image_format):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), 'red').save(buffer, format=image_format)
+        actor = Actor(name=filename, description='Актёр')
+        actor.image.save(filename, ContentFile(buffer.getvalue()), save=False)
+        actor.save()
+        return actor
+
+    def variants(self, actor):
+        response = self.client.get(
+            reverse('movies:actor-detail', kwargs={'pk': actor.pk}))
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data['image_variants']
+
+    def test_names_keep_extension(self):
+        self.assertNotEqual(
+            images.variant_name('actors/a.jpg', 'small', 'webp'),
+            images.variant_name('actors/a.png', 'small', 'webp'))
+
+    def test_only_generated_variants(self):
+        # Копии создаются после фиксации транзакции
+        actor = self.create_actor('photo.png', 'PNG')
+        self.assertEqual(self.variants(actor), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            actor.save()
+        url = self.variants(actor)['small']['webp']
+        self.assertTrue(url.endswith('/actors/variants/photo.png.small.webp'))
+        path = images.variant_name(actor.image.name, 'small', 'webp')
+        with actor.image.storage.open(path, 'rb') as file:
+            self.assertEqual(Image.open(file).size, (16, 12))
+
+    def test_cache_reset_when_generated(self):
+        actor = self.create_actor('late.jpg', 'JPEG')
+        self.assertEqual(self.variants(actor), {})
+        # Копии записаны (команда generate_image_variants): ответ в кэше
+        # сбрасывает сигнал variants_generated
+        images.generate_variants(actor.image.name)
+        self.assertEqual(self.variants(actor), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            images.variants_generated.send(
+                sender=None, names=[actor.image.name])
+        self.assertIn('small', self.variants(actor))
@@ -8,9 +8,10 @@ from .views import (
     ReviewCreateView, ReviewDestroyView, AddStarRatingView, )
 
 from .views_set import (
-    MovieViewSet, ActorsViewSet, ReviewCreateViewSet, AddStarRatingViewSet)
+    MovieViewSet, ReviewCreateViewSet, AddStarRatingViewSet,
+    MovieExportView, SearchView, )
 
-from . import api
+from . import api, views_async
 
 app_name = 'movies'
 # # Из views
@@ -28,8 +29,6 @@ app_name = 'movies'
 # urlpatterns = format_suffix_patterns([
 #     path('movie/<int:pk>/', MovieViewSet.as_view({'get': 'retrieve'})),
 #     path('movie/', MovieViewSet.as_view({'get': 'list'})),
-#     path('actor/<int:pk>/', ActorsViewSet.as_view({'get': 'retrieve'})),
-#     path('actor/', ActorsViewSet.as_view({'get': 'list'})),
 #     path('review/', ReviewCreateViewSet.as_view({'post': 'create'})),
 #     path('rating/', AddStarRatingViewSet.as_view({'post': 'create'})),
 # ])
@@ -65,9 +64,36 @@ urlpatterns = format_suffix_patterns([
     path('actor/<int:pk>/example/', actor_example, name='actor-example'),
     path('actor/<int:pk>/', actor_detail, name='actor-detail'),
     path('actor/', actor_list, name='actor-list'),
-    path('actor-my/', actor_my_list, name='actor-detail')
+    path('actor-my/', actor_my_list, name='actor-detail'),
+
+    # Фильмы, отзывы и рейтинг из views_set
+    path('movie/<int:pk>/', MovieViewSet.as_view({'get': 'retrieve'}),
+         name='movie-detail'),
+    path('movie/', MovieViewSet.as_view({'get': 'list'}), name='movie-list'),
+    path('movie/facets/', MovieViewSet.as_view({'get': 'facets'}),
+         name='movie-facets'),
+    path('movie/export/', MovieExportView.as_view(), name='movie-export'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('review/', ReviewCreateViewSet.as_view({'post': 'create'}),
+         name='review-create'),
+    path('review/bulk/', ReviewCreateViewSet.as_view({'post': 'bulk'}),
+         name='review-bulk'),
+    path('rating/', AddStarRatingViewSet.as_view({'post': 'create'}),
+         name='rating-create'),
+    path('rating/bulk/', AddStarRatingViewSet.as_view({'post': 'bulk'}),
+         name='rating-bulk'),
 ])
 
+# Асинхронные варианты чтения для ASGI (views_async)
+urlpatterns += [
+    path('async/movie/<int:pk>/', views_async.movie_detail,
+         name='movie-detail-async'),
+    path('async/movie/', views_async.movie_list, name='movie-list-async'),
+    path('async/actor/<int:pk>/', views_async.actor_detail,
+         name='actor-detail-async'),
+    path('async/actor/', views_async.actor_list, name='actor-list-async'),
+]
+
 # Автоматическое генерирование уров через экземпляр DefaultRouter()
 router = DefaultRouter()
 # router.register(r'actor-set', api.ActorViewSet, basename='actor')
@@ -9,14 +9,19 @@ from rest_framework.permissions import (
 
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Movie, Actor, Review
+from . import cache
+from .conditional import ConditionalGetMixin
+from .models import Movie, Actor, Review, Rating
 from .serializers import (
     MovieListSerializer, MovieDetailSerializer, ReviewCreateSerializer,
     CreateRatingSerializer, ActorListSerializer, ActorDetailSerializer,
 )
 
+from .mixins import (
+    OptimizedQuerysetMixin, QueryBudgetMixin, BufferedRatingMixin, )
 from .permissions import IsSuperUser
-from .service import get_client_ip, MovieFilter
+from .service import (
+    get_client_ip, MovieFilter, CursorPaginationMovies, PaginationActors, )
 
 
 # # Через базовый APIView
@@ -80,34 +85,50 @@ from .service import get_client_ip, MovieFilter
 
 #########################################################################
 # То же через generic классы: ListAPIView, RetrieveAPIView, CreateAPIView
-class MovieListView(ListAPIView):
+class MovieListView(ConditionalGetMixin, OptimizedQuerysetMixin,
+                    QueryBudgetMixin, ListAPIView):
     """Вывод списка фильмов"""
 
+    # Логика добавления поля middle_star - из агрегата MovieRating, без
+    # JOIN к movies_rating. rating_user - в RatedMovieListSerializer
+    queryset = Movie.objects.filter(draft=False).annotate(
+        middle_star=models.F('rating_aggregate__middle_star')
+    )
     serializer_class = MovieListSerializer
     # Подключение фильтрации
     filter_backends = (DjangoFilterBackend,)
     filterset_class = MovieFilter
+    pagination_class = CursorPaginationMovies
     # Права доступа
     permission_classes = (IsAuthenticated,)
+    # свежесть (ETag), count, страница фильмов, голоса клиента
+    max_queries = 4
+    # ETag / Last-Modified
+    cache_namespace = cache.MOVIES
+    conditional_models = (Movie, Rating)
 
     # authentication_classes = []
 
-    # Логика добавление двух полей: rating_user, middle_star
-    def get_queryset(self):
-        movies = Movie.objects.filter(draft=False).annotate(
-            rating_user=models.Count('ratings', filter=models.Q(ratings__ip=get_client_ip(self.request)))
-        ).annotate(
-            middle_star=models.Sum(models.F('ratings__star')) / models.Count(models.F('ratings'))
-        )
-        return movies
+    def get_etag_extra(self, request):
+        # rating_user зависит от ip клиента
+        return get_client_ip(request)
 
 
-class MovieDetailView(RetrieveAPIView):
+class MovieDetailView(ConditionalGetMixin, OptimizedQuerysetMixin,
+                      QueryBudgetMixin, RetrieveAPIView):
     """Вывод фильма"""
 
     queryset = Movie.objects.filter(draft=False)
     serializer_class = MovieDetailSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    # свежесть (ETag), фильм с категорией, режиссёры, актёры, жанры, отзывы
+    max_queries = 6
+    cache_namespace = cache.MOVIES
+    # Фильм, его актёры, режиссёры и отзывы
+    conditional_models = (
+        (Movie, 'pk'), (Actor, 'film_actor'), (Actor, 'film_director'),
+        (Review, 'movie'),
+    )
 
 
 class ReviewCreateView(CreateAPIView):
@@ -123,7 +144,7 @@ class ReviewDestroyView(DestroyAPIView):
     permission_classes = (IsSuperUser,)  # только суперпользователь
 
 
-class AddStarRatingView(CreateAPIView):
+class AddStarRatingView(BufferedRatingMixin, CreateAPIView):
     """Добавление рейтинга к фильму"""
 
     serializer_class = CreateRatingSerializer
@@ -133,13 +154,22 @@ class AddStarRatingView(CreateAPIView):
         serializer.save(ip=get_client_ip(self.request))
 
 
-class ActorsListView(ListAPIView):
+class ActorsListView(ConditionalGetMixin, OptimizedQuerysetMixin,
+                     QueryBudgetMixin, ListAPIView):
     """Вывод всех актёров или режиссёров"""
     queryset = Actor.objects.all()
     serializer_class = ActorListSerializer
+    pagination_class = PaginationActors
+    max_queries = 3
+    cache_namespace = cache.ACTORS
+    conditional_models = (Actor,)
 
 
-class ActorsDetailView(RetrieveAPIView):
+class ActorsDetailView(ConditionalGetMixin, OptimizedQuerysetMixin,
+                       QueryBudgetMixin, RetrieveAPIView):
     """Вывод актёра или режиссёра"""
     queryset = Actor.objects.all()
     serializer_class = ActorDetailSerializer
+    max_queries = 2
+    cache_namespace = cache.ACTORS
+    conditional_models = ((Actor, 'pk'),)
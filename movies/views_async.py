@@ -0,0 +1,127 @@
+"""
+Асинхронные варианты чтения каталога для ASGI: /api/v1/async/...
+
+Под ASGI синхронные views выполняются через sync_to_async с
+thread_sensitive=True, то есть в одном потоке на процесс - запросы
+клиентов ждут друг друга. Здесь работа с БД идёт в общем пуле потоков
+(database_sync_to_async), а независимые запросы детального вывода
+фильма (связи Meta.prefetch_related сериализатора и отзывы) выполняются
+параллельно через asyncio.gather.
+
+В Django 3.2 нет асинхронного интерфейса ORM, поэтому запросы - те же
+синхронные, но не в общем потоке. Ответы совпадают с синхронными
+views побайтно: те же сериализаторы и JSONRenderer
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+
+from . import api, cache
+from .mixins import get_serializer_relations
+from .models import Movie, Review
+from .serializers import MovieDetailSerializer
+from .views_set import MovieViewSet
+
+
+def database_sync_to_async(func):
+    """
+    sync_to_async в пуле потоков (thread_sensitive=False). Соединение
+    потока с БД закрывается по CONN_MAX_AGE, как в конце запроса
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+def async_view(view):
+    """
+    Синхронный view -> асинхронный: view и рендеринг ответа в пуле потоков.
+    Для выводов, запросы которых зависят друг от друга (страница списка,
+    затем голоса клиента по её id) - параллелить нечего, но запросы разных
+    клиентов выполняются одновременно. Права, кэш и ETag - как у view
+    """
+    def call(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        return response
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await database_sync_to_async(call)(request, *args, **kwargs)
+
+    return wrapper
+
+
+def render(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status,
+        content_type='application/json')
+
+
+def related_queryset(model, name, pk):
+    """Объекты связи name (M2M или обратный FK) записи model с id pk"""
+    field = model._meta.get_field(name)
+    if field.many_to_many and not field.auto_created:
+        return field.related_model._default_manager.filter(
+            **{field.related_query_name(): pk})
+    return field.related_model._default_manager.filter(
+        **{field.field.name: pk})
+
+
+def get_cached(request, pk):
+    key = cache.get_response_key(cache.MOVIES, request, (), pk)
+    return key, cache.get_cache().get(key)
+
+
+def serialize_movie(request, key, movie, related):
+    """Связи из related кладутся в кэш prefetch, как после prefetch_related"""
+    movie._prefetched_objects_cache = related
+    data = MovieDetailSerializer(movie, context={'request': request}).data
+    cache.get_cache().set(key, data, cache.get_timeout())
+    return data
+
+
+async def movie_detail(request, pk, **kwargs):
+    """
+    Полный вывод фильма: фильм, связи сериализатора и отзывы - параллельно.
+    Ответ кэшируется для всех клиентов (не зависит от пользователя)
+    """
+    key, data = await database_sync_to_async(get_cached)(request, pk)
+    if data is None:
+        select, prefetch = get_serializer_relations(MovieDetailSerializer)
+        movie_query = Movie.objects.filter(
+            draft=False, pk=pk).select_related(*select)
+        querysets = {
+            name: related_queryset(Movie, name, pk) for name in prefetch}
+        # Дерево отзывов - как в ReviewTreeListSerializer
+        reviews = Review.objects.filter(movie_id=pk).order_by('pk')
+        if settings.REVIEW_TREE_MAX_NODES is not None:
+            reviews = reviews[:settings.REVIEW_TREE_MAX_NODES]
+        querysets['reviews'] = reviews
+
+        run = database_sync_to_async(list)
+        movies, *results = await asyncio.gather(
+            run(movie_query), *(run(qs) for qs in querysets.values()))
+        if not movies:
+            return render({'detail': NotFound.default_detail}, status=404)
+        data = await database_sync_to_async(serialize_movie)(
+            request, key, movies[0], dict(zip(querysets, results)))
+    return render(data)
+
+
+movie_list = async_view(MovieViewSet.as_view({'get': 'list'}))
+actor_list = async_view(api.ActorModelViewSet.as_view({'get': 'list'}))
+actor_detail = async_view(api.ActorModelViewSet.as_view({'get': 'retrieve'}))
@@ -2,68 +2,192 @@
 ReadOnlyModelViewSet - вывод списка и одной записи
 """
 from django.db import models
+from django.http import StreamingHttpResponse
 
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import (ReadOnlyModelViewSet, ModelViewSet)
 
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+from drf_yasg.utils import swagger_auto_schema
 
-from .models import Movie, Actor
+from .models import Movie, Actor, Rating, Review
 from .serializers import (
     MovieListSerializer, MovieDetailSerializer, ReviewCreateSerializer,
-    CreateRatingSerializer, ActorListSerializer, ActorDetailSerializer,
+    CreateRatingSerializer, ActorListSerializer, ReviewBulkCreateSerializer,
+    RatingBulkCreateSerializer, MovieFastListSerializer, MovieFacetsSerializer,
 )
-from .service import get_client_ip, MovieFilter, PaginationMovies
+from . import cache, export, search
+from .conditional import ConditionalGetMixin
+from .facets import get_facets
+from .mixins import (
+    OptimizedQuerysetMixin, QueryBudgetMixin, BufferedRatingMixin,
+    BulkCreateMixin, FastListMixin, SparseFieldsetMixin, )
+from .service import (
+    get_client_ip, get_rated_movie_ids, MovieFilter, CursorPaginationMovies,
+    PaginationReviews, IgnoreClientContentNegotiation, )
 
 
 # То же через viewsets классы: ReadOnlyModelViewSet, ModelViewSet ...
-class ActorsViewSet(ReadOnlyModelViewSet):
-    """Вывод всех актёров или режиссёров"""
-    queryset = Actor.objects.all()
-
-    def get_serializer_class(self):
-        # self.action - HTTP запросы
-        if self.action == 'list':
-            return ActorListSerializer
-        elif self.action == 'retrieve':
-            return ActorDetailSerializer
-
-
-class MovieViewSet(ReadOnlyModelViewSet):
+class MovieViewSet(ConditionalGetMixin, SparseFieldsetMixin,
+                   cache.CachedResponseMixin, FastListMixin,
+                   OptimizedQuerysetMixin, QueryBudgetMixin,
+                   ReadOnlyModelViewSet):
     """Вывод списка фильмов"""
 
+    # middle_star - из агрегата MovieRating, без JOIN к movies_rating.
+    # rating_user - в RatedMovieListSerializer, только для id страницы
+    queryset = Movie.objects.filter(draft=False).annotate(
+        middle_star=models.F('rating_aggregate__middle_star')
+    )
     # Подключение фильтрации
     filter_backends = (DjangoFilterBackend,)
     filterset_class = MovieFilter
-    pagination_class = PaginationMovies
+    pagination_class = CursorPaginationMovies
+    fast_list_serializer_class = MovieFastListSerializer
+    max_queries = {'list': 4, 'retrieve': 6, 'facets': 5}
+    cache_namespace = cache.MOVIES
+    cached_actions = ('list', 'retrieve', 'facets')
+    shared_cached_actions = ('facets',)
+    conditional_models = {
+        'list': (Movie, Rating),
+        # Фильм, его актёры, режиссёры и отзывы
+        'retrieve': (
+            (Movie, 'pk'), (Actor, 'film_actor'), (Actor, 'film_director'),
+            (Review, 'movie'),
+        ),
+    }
 
     # permission_classes = (IsAuthenticated,)
 
-    def get_queryset(self):
-        movies = Movie.objects.filter(draft=False).annotate(
-            rating_user=models.Count('ratings', filter=models.Q(ratings__ip=get_client_ip(self.request)))
-        ).annotate(
-            middle_star=models.Sum(models.F('ratings__star')) / models.Count(models.F('ratings'))
-        )
-        return movies
+    def get_etag_extra(self, request):
+        # rating_user в списке зависит от ip клиента
+        if self.action == 'list':
+            return get_client_ip(request)
+        return ''
+
+    def stitch_response_data(self, request, data):
+        """rating_user зависит от клиента - не берётся из кэша"""
+        if self.action == 'list':
+            movies = data['results'] if isinstance(data, dict) else data
+            rated = get_rated_movie_ids(
+                request, [movie['id'] for movie in movies])
+            for movie in movies:
+                movie['rating_user'] = movie['id'] in rated
+        return data
 
     def get_serializer_class(self):
         if self.action == 'list':
             return MovieListSerializer
         elif self.action == 'retrieve':
             return MovieDetailSerializer
-
-
-class ReviewCreateViewSet(ModelViewSet):
-    """Добавление отзыва к фильму"""
-
+        elif self.action == 'facets':
+            return MovieFacetsSerializer
+
+    # Не список: без пагинации в схеме (drf-yasg), ответ - один объект
+    @swagger_auto_schema(responses={200: MovieFacetsSerializer})
+    @action(detail=False)
+    def facets(self, request):
+        """Кол-во фильмов по жанрам, годам и категориям (movies.facets)"""
+        return self.cached_response(self.get_facets_response, request)
+
+    def get_facets_response(self, request):
+        filterset = self.filterset_class(
+            request.query_params, queryset=Movie.objects.filter(draft=False),
+            request=request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return Response(get_facets(filterset))
+
+
+class MovieExportView(APIView):
+    """
+    Выгрузка всех опубликованных фильмов потоком (movies.export):
+    ?output=ndjson (по умолчанию) или ?output=csv
+    """
+    permission_classes = (IsAuthenticated,)
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request):
+        output_format = request.query_params.get('output', 'ndjson')
+        if output_format not in export.CONTENT_TYPES:
+            raise ValidationError(
+                {'output': f'Допустимо: {", ".join(export.CONTENT_TYPES)}'})
+        response = StreamingHttpResponse(
+            export.export_lines(output_format),
+            content_type=export.CONTENT_TYPES[output_format])
+        response['Content-Disposition'] = (
+            f'attachment; filename="movies.{output_format}"')
+        return response
+
+
+class SearchView(APIView):
+    """
+    Полнотекстовый поиск (movies.search): ?q=запрос&type=movies|actors
+    (по умолчанию - оба), ?limit= (до 50) и ?offset=. Результаты - по
+    убыванию релевантности
+    """
+    max_limit = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        kind = request.query_params.get('type')
+        if kind not in (None, 'movies', 'actors'):
+            raise ValidationError({'type': 'Допустимо: movies, actors'})
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)),
+                               self.max_limit))
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            raise ValidationError({'detail': 'limit и offset - числа'})
+
+        data = {}
+        context = self.get_serializer_context()
+        if kind in (None, 'movies'):
+            pks = search.search(Movie, query, limit, offset)
+            movies = Movie.objects.filter(pk__in=pks).annotate(
+                middle_star=models.F('rating_aggregate__middle_star'))
+            data['movies'] = MovieListSerializer(
+                self.in_order(movies, pks), many=True, context=context).data
+        if kind in (None, 'actors'):
+            pks = search.search(Actor, query, limit, offset)
+            data['actors'] = ActorListSerializer(
+                self.in_order(Actor.objects.filter(pk__in=pks), pks),
+                many=True, context=context).data
+        return Response(data)
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self}
+
+    @staticmethod
+    def in_order(queryset, pks):
+        """Записи в порядке релевантности"""
+        objects = {obj.pk: obj for obj in queryset}
+        return [objects[pk] for pk in pks if pk in objects]
+
+
+class ReviewCreateViewSet(BulkCreateMixin, QueryBudgetMixin, ModelViewSet):
+    """Добавление отзыва к фильму (bulk - списком)"""
+
+    queryset = Review.objects.all()
     serializer_class = ReviewCreateSerializer
+    bulk_serializer_class = ReviewBulkCreateSerializer
+    pagination_class = PaginationReviews
+    # bulk: по запросу на связь (фильмы, родительские отзывы), запись
+    # пачками по BULK_CREATE_BATCH_SIZE в точке сохранения
+    max_queries = {'bulk': 5}
 
 
-class AddStarRatingViewSet(ModelViewSet):
-    """Добавление рейтинга к фильму"""
+class AddStarRatingViewSet(BufferedRatingMixin, BulkCreateMixin,
+                           ModelViewSet):
+    """Добавление рейтинга к фильму (bulk - списком, с явным ip)"""
 
     serializer_class = CreateRatingSerializer
+    bulk_serializer_class = RatingBulkCreateSerializer
 
     def perform_create(self, serializer):
         """Добавить при сериализации"""